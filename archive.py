@@ -0,0 +1,256 @@
+"""
+Indexed binary archive of puzzles
+
+A corpus of millions of puzzles is slow to keep as one text file per
+puzzle. An archive holds them in one file:
+
+- a header: MAGIC, the version, the number of puzzles and the offset of
+  the index (HEADER)
+- the records of the puzzles, one after the other: the size n of the
+  board, the length of the fleet and the width of the counts (RECORD),
+  then the n row counts, the n column counts and the fleet as 8 bit
+  integers, or 16 bit ones if some count is larger than 255, then the
+  hints packed 3 bits per cell (HINT_SYMBOLS), 8 cells in 3 bytes, row by
+  row
+- the index: the offset of each record as a 64 bit integer, so puzzle k
+  is found without reading the ones before it
+
+All integers are little endian. Archive maps the file in memory; record k
+is a view of the mapping, and puzzle k is decoded from it only when asked
+for, as read_puzzle would parse its text.
+
+python3 archive.py pack corpus.bsa inputs/*.txt      # text to archive
+python3 archive.py unpack corpus.bsa --outdir DIR     # archive to text
+python3 battle.py --inputfile corpus.bsa --puzzle 42 --outputfile out.txt
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+
+from battle import read_puzzle, format_puzzle, split_puzzles, ARCHIVE_MAGIC
+
+MAGIC = ARCHIVE_MAGIC
+VERSION = 1
+# magic, version, number of puzzles, offset of the index
+HEADER = struct.Struct("<4sHxxQQ")
+# size of the board, length of the fleet, bytes per count
+RECORD = struct.Struct("<HHB")
+COUNT_FORMATS = {1: "B", 2: "H"}
+OFFSET = struct.Struct("<Q")
+
+# the code of each hint symbol is its position
+HINT_SYMBOLS = "0.S<>^vM"
+HINT_CODES = {symbol: code for code, symbol in enumerate(HINT_SYMBOLS)}
+# the symbols of each 2 codes (6 bits) and 4 codes (12 bits), the first
+# code in the low bits
+HINT_PAIRS = [low + high for high in HINT_SYMBOLS for low in HINT_SYMBOLS]
+HINT_QUADS = [low + high for high in HINT_PAIRS for low in HINT_PAIRS]
+
+
+def hint_bytes(size):
+    """
+    The number of bytes of the packed hints of a board
+    """
+    return (size * size + 7) // 8 * 3
+
+
+def pack_hints(hints):
+    """
+    Pack the hint rows, 3 bits per cell
+    """
+    try:
+        codes = [HINT_CODES[c] for row in hints for c in row]
+    except KeyError as e:
+        raise ValueError("unknown hint {!r}".format(e.args[0]))
+    codes += [0] * (-len(codes) % 8)
+    out = bytearray()
+    for k in range(0, len(codes), 8):
+        v = 0
+        for shift in range(8):
+            v |= codes[k + shift] << 3 * shift
+        out += v.to_bytes(3, 'little')
+    return bytes(out)
+
+
+def unpack_hints(data, size):
+    """
+    The hint rows of a board from its packed hints
+    """
+    cells = []
+    for k in range(0, len(data), 3):
+        v = data[k] | data[k + 1] << 8 | data[k + 2] << 16
+        cells.append(HINT_QUADS[v & 4095])
+        cells.append(HINT_QUADS[v >> 12])
+    cells = "".join(cells)
+    return [cells[i * size:(i + 1) * size] for i in range(size)]
+
+
+def pack_puzzle(row_constraint, col_constraint, ship_count, hints):
+    """
+    The record of a puzzle
+    """
+    n = len(row_constraint)
+    counts = list(row_constraint) + list(col_constraint) + list(ship_count)
+    width = 1 if max(counts, default=0) <= 255 else 2
+    try:
+        counts = struct.pack("<{}{}".format(len(counts), COUNT_FORMATS[width]), *counts)
+        return RECORD.pack(n, len(ship_count), width) + counts + pack_hints(hints)
+    except struct.error as e:
+        raise ValueError("puzzle does not fit in an archive record: {}".format(e))
+
+
+def unpack_puzzle(record):
+    """
+    The (row_constraint, col_constraint, ship_count, hints) of a record, as
+    read_puzzle returns them
+    """
+    n, fleet, width = RECORD.unpack_from(record)
+    counts = struct.unpack_from("<{}{}".format(2 * n + fleet, COUNT_FORMATS[width]),
+                                record, RECORD.size)
+    start = RECORD.size + width * len(counts)
+    hints = unpack_hints(record[start:start + hint_bytes(n)], n)
+    return list(counts[:n]), list(counts[n:2 * n]), list(counts[2 * n:]), hints
+
+
+class ArchiveWriter:
+    """
+    Write puzzles to a new archive, the index is written on close. Use as
+    a context manager
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb', buffering=1 << 16)
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+        self.offsets = []
+        self.offset = HEADER.size
+
+    def add(self, row_constraint, col_constraint, ship_count, hints):
+        record = pack_puzzle(row_constraint, col_constraint, ship_count, hints)
+        self.offsets.append(self.offset)
+        self.file.write(record)
+        self.offset += len(record)
+
+    def add_text(self, text):
+        """
+        Add the puzzles of text, in the format of read_puzzle, separated by
+        blank lines
+        """
+        for puzzle in split_puzzles(text):
+            self.add(*read_puzzle(puzzle))
+
+    def close(self):
+        index = self.offset
+        self.file.write(b"".join(OFFSET.pack(offset) for offset in self.offsets))
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(self.offsets), index))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Archive:
+    """
+    Read-only access to the puzzles of an archive, mapped in memory.
+    archive[k] is puzzle k as read_puzzle returns it, ready for build_csp
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        magic, version, self.count, self.index = HEADER.unpack_from(self.view)
+        if magic != MAGIC:
+            raise ValueError("{} is not a puzzle archive".format(path))
+        if version != VERSION:
+            raise ValueError("{} is an archive of version {}, not {}".format(
+                path, version, VERSION))
+
+    def __len__(self):
+        return self.count
+
+    def record(self, k):
+        """
+        The bytes of record k, a view of the mapping (no copy)
+        """
+        if not 0 <= k < self.count:
+            raise IndexError("puzzle {} is not in the archive".format(k))
+        start = OFFSET.unpack_from(self.view, self.index + 8 * k)[0]
+        if k + 1 < self.count:
+            end = OFFSET.unpack_from(self.view, self.index + 8 * (k + 1))[0]
+        else:
+            end = self.index
+        return self.view[start:end]
+
+    def __getitem__(self, k):
+        return unpack_puzzle(self.record(k))
+
+    def __iter__(self):
+        for k in range(self.count):
+            yield self[k]
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert between puzzle text files and indexed archives.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="Write text puzzles to an archive.")
+    pack.add_argument("archive", help="The archive to write.")
+    pack.add_argument("inputs", nargs="+",
+                      help="Puzzle files, several puzzles in a file separated "
+                           "by blank lines, - for stdin.")
+    unpack = commands.add_parser("unpack", help="Write the puzzles of an archive as text.")
+    unpack.add_argument("archive", help="The archive to read.")
+    unpack.add_argument("--outdir", type=str, default=None,
+                        help="Write puzzle k to input<k>.txt in this directory "
+                             "instead of streaming them to stdout separated by "
+                             "blank lines.")
+    info = commands.add_parser("info", help="Print the number of puzzles of an archive.")
+    info.add_argument("archive", help="The archive to read.")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        with ArchiveWriter(args.archive) as out:
+            for path in args.inputs:
+                if path == '-':
+                    out.add_text(sys.stdin.read())
+                else:
+                    with open(path) as file:
+                        out.add_text(file.read())
+        print("{} puzzles".format(len(out.offsets)))
+        return
+
+    with Archive(args.archive) as archive:
+        if args.command == "info":
+            print("{} puzzles".format(len(archive)))
+            return
+        if args.outdir:
+            os.makedirs(args.outdir, exist_ok=True)
+        for k, puzzle in enumerate(archive):
+            text = format_puzzle(*puzzle)
+            if args.outdir:
+                with open(os.path.join(args.outdir, "input{}.txt".format(k)), "w") as file:
+                    file.write(text)
+            else:
+                if k:
+                    sys.stdout.write("\n")
+                sys.stdout.write(text)
+
+
+if __name__ == '__main__':
+    main()
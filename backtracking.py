@@ -1,6 +1,53 @@
-from csp import Constraint, Variable, CSP
+from csp import Variable
 from constraints import *
-import random
+import instrument
+import collections
+import itertools
+import sys
+import time
+
+
+class SearchLimit(Exception):
+    '''raised inside the search when its deadline or node budget is
+       exhausted, caught by bt_search'''
+
+
+class Search:
+    '''the limits and the progress of one call of bt_search. It is passed
+       down the search, so that nothing of a search is kept outside of it
+       and searches can run inside one another or side by side'''
+
+    def __init__(self, deadline=None, maxNodes=None):
+        self.deadline = deadline
+        self.maxNodes = maxNodes
+        self.nodesExplored = 0
+        # the leaves add the solutions they find here, so the ones found
+        # before a limit is hit are kept
+        self.found = []
+        # the values fixed at the root, see bt_search
+        self.partial = None
+
+    def limited(self):
+        return self.deadline is not None or self.maxNodes is not None
+
+    def checkLimits(self):
+        '''raise SearchLimit if the search is past its deadline or has
+           explored all the nodes its budget allows. Called before each
+           new node'''
+        if self.maxNodes is not None and self.nodesExplored >= self.maxNodes:
+            raise SearchLimit()
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchLimit()
+
+
+# what bt_search returns: status is 'solved' (some solution was found and
+# the search was not cut short), 'unsat' (there is no solution) or
+# 'timeout' (a limit was hit); solutions the solutions found; nodes and
+# propagations the nodes explored and the calls to GacEnforce (or unit
+# propagations of the SAT solver); partial the values fixed at the root
+# when a limit was given, else None
+SearchResult = collections.namedtuple(
+    'SearchResult', ['status', 'solutions', 'nodes', 'propagations', 'partial'])
 
 
 class UnassignedVars:
@@ -28,10 +75,20 @@ class UnassignedVars:
             self.unassigned.reverse()
 
     def extract(self):
+        if instrument.enabled:
+            t0 = instrument.clock()
+            nxtvar = self._extract()
+            instrument.add_time("UnassignedVars.extract", instrument.clock() - t0)
+            return nxtvar
+        return self._extract()
+
+    def _extract(self):
         if not self.unassigned:
             pass  # print "Warning, extracting from empty unassigned list"
             return None
         if self._select == 'random':
+            # only this heuristic needs random, keep it out of the startup
+            import random
             i = random.randint(0, len(self.unassigned) - 1)
             nxtvar = self.unassigned[i]
             self.unassigned[i] = self.unassigned[-1]
@@ -48,29 +105,56 @@ class UnassignedVars:
         return len(self.unassigned) == 0
 
     def insert(self, var):
-        if not var in self.csp.variables():
+        if not self.csp.hasVariable(var):
             pass  # print "Error, trying to insert variable {} in unassigned that is not in the CSP problem".format(var.name())
         else:
             self.unassigned.append(var)
 
 
-def bt_search(algo, csp, variableHeuristic, allSolutions, trace):
+def bt_search(algo, csp, variableHeuristic, allSolutions, trace,
+              deadline=None, maxNodes=None, keepDomains=False, probeBudget=None):
     '''Main interface routine for calling different forms of backtracking search
-       algorithm is one of ['BT', 'FC', 'GAC']
+       algorithm is one of ['BT', 'FC', 'GAC', 'SAT']
        csp is a CSP object specifying the csp problem to solve
        variableHeuristic is one of ['random', 'fixed', 'mrv']
        allSolutions True or False. True means we want to find all solutions.
        trace True of False. True means turn on tracing of the algorithm
 
-       bt_search returns a list of solutions. Each solution is itself a list
-       of pairs (var, value). Where var is a Variable object, and value is
-       a value from its domain.
+       bt_search returns a SearchResult. Its solutions are a list; with
+       'BT' each solution is a list of pairs (var, value), where var is a
+       Variable object and value is a value from its domain. With 'GAC'
+       each solution is
+       (board, coord, dir) as ShipCountConstraint.compact makes it: board
+       holds the values of the cells as bytes, and coord and dir are tuples of the top left cells and the
+       orientations of the ships of each type. 'FC' enforces GAC at the
+       root, then searches with forward checking; its solutions are those
+       of 'GAC'. 'SAT' compiles the CSP
+       into CNF and solves it with the CDCL solver of sat.py (the variable
+       heuristic is not used); its solutions are the same as those of
+       'GAC', and nodes counts its decisions.
+
+       deadline (a time.monotonic() value) and maxNodes bound the search.
+       When either is exhausted the search stops and returns the solutions
+       found so far, with status 'timeout'. When a limit is given, partial
+       holds the value of each variable fixed by propagation at the root,
+       in the order of csp.variables(), None for the undetermined ones.
+       These values hold in every solution.
+
+       keepDomains True means search from the current domains of the
+       variables, already made consistent by the caller (e.g. a Session),
+       instead of resetting them and enforcing GAC at the root. They are
+       left as they were when the search returns.
+
+       probeBudget, a number of seconds, means strengthen the root GAC of
+       'GAC' and 'FC' by probing (see probe) for at most that long, or
+       until deadline, before searching. None means no probing. It is not
+       done with keepDomains, whose domains must be left as they were.
     '''
     varHeuristics = ['random', 'fixed', 'mrv']
-    algorithms = ['BT', 'FC', 'GAC']
+    algorithms = ['BT', 'FC', 'GAC', 'SAT']
 
-    # statistics
-    bt_search.nodesExplored = 0
+    search = Search(deadline, maxNodes)
+    propagations = bt_search.propagations
 
     if variableHeuristic not in varHeuristics:
         pass  # print "Error. Unknown variable heursitics {}. Must be one of {}.".format(
@@ -79,19 +163,151 @@ def bt_search(algo, csp, variableHeuristic, allSolutions, trace):
         pass  # print "Error. Unknown algorithm heursitics {}. Must be one of {}.".format(
         # algo, algorithms)
 
+    # the search recurses once per variable, make room for large boards
+    sys.setrecursionlimit(max(sys.getrecursionlimit(),
+                              len(csp.variables()) + 1000))
+
     uv = UnassignedVars(variableHeuristic, csp)
+    if not keepDomains:
+        Variable.clearUndoDict()
+        for v in csp.variables():
+            v.reset()
+    try:
+        if algo == 'BT':
+            if search.limited():
+                search.partial = [None] * len(csp.variables())
+            solutions = BT(uv, csp, allSolutions, trace, search)
+        elif algo == 'GAC':
+            if not keepDomains:
+                rootEnforce(csp, deadline, probeBudget)
+            if search.limited():
+                search.partial = [var.curDomain()[0] if var.curDomainSize() == 1
+                                  else None for var in csp.variables()]
+            solutions = None
+            parts = components(csp)
+            if len(parts) > 1:
+                solutions = decomposedGAC(parts, csp, variableHeuristic,
+                                          allSolutions, trace, search)
+            if solutions is None:
+                solutions = GAC(uv, csp, allSolutions, trace, search)
+        elif algo == 'FC':
+            if not keepDomains:
+                rootEnforce(csp, deadline, probeBudget)
+            if search.limited():
+                search.partial = [var.curDomain()[0] if var.curDomainSize() == 1
+                                  else None for var in csp.variables()]
+            solutions = FC(uv, csp, allSolutions, trace, search)
+        elif algo == 'SAT':
+            solutions = SAT(csp, allSolutions, search)
+        status = 'solved' if solutions else 'unsat'
+    except SearchLimit:
+        status = 'timeout'
+        solutions = search.found
+        # GAC and FC undo their assignments as they unwind, BT does not
+        for v in csp.variables():
+            v.unAssign()
+    return SearchResult(status, solutions, search.nodesExplored,
+                        bt_search.propagations - propagations, search.partial)
+
+# the number of calls to GacEnforce (and unit propagations of the SAT
+# solver) since the start, in and out of searches; a SearchResult has those
+# of its search
+bt_search.propagations = 0
+
+
+def rootEnforce(csp, deadline, probeBudget):
+    '''enforce GAC at the root, then probe for at most probeBudget
+       seconds (None for no probing) and no later than deadline'''
+    if GacEnforce(csp.constraints(), csp, None, None) == "DWO":
+        return
+    if probeBudget is not None:
+        probeDeadline = time.monotonic() + probeBudget
+        if deadline is not None:
+            probeDeadline = min(probeDeadline, deadline)
+        probe(csp, probeDeadline)
+
+
+def count_solutions(csp, limit=None, cache=True):
+    '''Count the solutions of csp that satisfy its ship count constraint,
+       without keeping the solutions. Counting stops once limit solutions
+       are found (limit=2 is enough to tell whether a puzzle has a unique
+       solution); the count returned is then limit.
+
+       Variables are assigned in the order of the CSP, so the search passes
+       through the end of every row of the board. There the residual
+       subproblem is summarized by csp.ship_count_constraint().residual_key
+       and, if cache is True, the number of its solutions is remembered and
+       reused whenever another branch reaches an equal subproblem.
+    '''
+    # the search recurses once per variable, make room for large boards
+    sys.setrecursionlimit(max(sys.getrecursionlimit(),
+                              len(csp.variables()) + 1000))
+
+    uv = UnassignedVars('fixed', csp)
     Variable.clearUndoDict()
     for v in csp.variables():
         v.reset()
-    if algo == 'BT':
-        solutions = BT(uv, csp, allSolutions, trace)
-    elif algo == 'GAC':
-        GacEnforce(csp.constraints(), csp, None, None)  # GAC at the root
-        solutions = GAC(uv, csp, trace)
-    return solutions, bt_search.nodesExplored
+    if GacEnforce(csp.constraints(), csp, None, None) == "DWO":
+        return 0
+    count, exact = countGAC(uv, csp, limit, dict() if cache else None)
+    return count
+
+
+def countGAC(unAssignedVars, csp, limit, cache):
+    '''GAC search counting solutions. Returns (count, exact) where count
+       is at most limit, and exact is False when counting stopped at limit.
+       cache maps residual subproblem keys to the (count, exact) found for
+       them, None to disable caching'''
+    # if there are no unassigned variables, check the ship count constraint
+    if unAssignedVars.empty():
+        if instrument.enabled:
+            instrument.count("search.leaves")
+        result, coord, dir = csp.ship_count_constraint().check(
+            [var.getValue() for var in csp.variables()])
+        return (1 if result else 0), True
+
+    key = None
+    if cache is not None:
+        key = csp.ship_count_constraint().residual_key(
+            csp.variables(), len(csp.variables()) - len(unAssignedVars.unassigned))
+        if key is not None and key in cache:
+            count, exact = cache[key]
+            # a count that stopped at a limit is only good for smaller limits
+            if exact or (limit is not None and count >= limit):
+                if instrument.enabled:
+                    instrument.count("count.cache.hit")
+                return (count if limit is None else min(count, limit)), \
+                    exact and (limit is None or count < limit)
+            if instrument.enabled:
+                instrument.count("count.cache.miss")
+
+    count = 0
+    exact = True
+    nxtvar = unAssignedVars.extract()
+    if instrument.enabled:
+        instrument.count("search.nodes")
+    for val in nxtvar.curDomain():
+        nxtvar.setValue(val)
+        if GacEnforce(csp.constraintsOf(nxtvar), csp, nxtvar, val) != "DWO" \
+                and csp.ship_count_constraint().check_partial(csp.variables()):
+            n, e = countGAC(unAssignedVars, csp,
+                            None if limit is None else limit - count, cache)
+            count += n
+            exact = exact and e
+        Variable.restoreValues(nxtvar, val)
+        # stop once limit solutions have been found
+        if limit is not None and count >= limit:
+            exact = False
+            break
+    nxtvar.unAssign()
+    unAssignedVars.insert(nxtvar)
 
+    if key is not None:
+        cache[key] = (count, exact)
+    return count, exact
 
-def BT(unAssignedVars, csp, allSolutions, trace):
+
+def BT(unAssignedVars, csp, allSolutions, trace, search):
     '''Backtracking Search. unAssignedVars is the current set of
        unassigned variables.  csp is the csp problem, allSolutions is
        True if you want all solutionss trace if you want some tracing
@@ -112,8 +328,10 @@ def BT(unAssignedVars, csp, allSolutions, trace):
         soln = []
         for v in csp.variables():
             soln.append((v, v.getValue()))
+        search.found.append(soln)
         return [soln]  # each call returns a list of solutions found
-    bt_search.nodesExplored += 1
+    search.checkLimits()
+    search.nodesExplored += 1
     solns = []  # so far we have no solutions recursive calls
     nxtvar = unAssignedVars.extract()
     if trace:
@@ -131,7 +349,7 @@ def BT(unAssignedVars, csp, allSolutions, trace):
                         pass  # print "<==falsified constraint\n"
                     break
         if constraintsOK:
-            new_solns = BT(unAssignedVars, csp, allSolutions, trace)
+            new_solns = BT(unAssignedVars, csp, allSolutions, trace, search)
             if new_solns:
                 solns.extend(new_solns)
             if len(solns) > 0 and not allSolutions:
@@ -142,66 +360,482 @@ def BT(unAssignedVars, csp, allSolutions, trace):
     return solns
 
 
+def fleetLeaf(csp, search):
+    '''check the ship count constraint once every variable is assigned.
+       Return the solution in a list, in the compact form of
+       ShipCountConstraint as all solutions may be kept, or an empty list
+       if the ships on the board are not the fleet'''
+    # the value of each variable, indexed by variable
+    sol = [var.getValue() for var in csp.variables()]
+    if instrument.enabled:
+        instrument.count("search.leaves")
+    result, coord, dir = csp.ship_count_constraint().check(sol)
+    if not result:
+        return []
+    sol = csp.ship_count_constraint().compact(sol, coord, dir)
+    search.found.append(sol)
+    return [sol]
+
+
 # GAC and GACEnforce from lecture slides
-def GAC(unAssignedVars, csp, trace):
-    sol = []
+def GAC(unAssignedVars, csp, allSolutions, trace, search, leaf=None):
     # if there are no unassigned variables
     if unAssignedVars.empty():
-        # get all variable, value pairs
-        for var in csp.variables():
-            sol.append((var, var.getValue()))
-        # check for ship count constraint
-        result, coord, dir = csp.ship_count_constraint().check(sol)
-        # if the ship count constraint is met, then return the solution
-        if result:
-            return [(sol, coord, dir)]
-        # else return empty list
-        else:
-            return []
+        # a component of the board searched on its own, see decomposedGAC
+        if leaf is not None:
+            return leaf()
+        return fleetLeaf(csp, search)
 
+    sol = []
+    search.checkLimits()
     # if there are unassigned variables
     # assign an unassigned variable
     nxtvar = unAssignedVars.extract()
-    bt_search.nodesExplored += 1
-    # check each value in variable's domain
-    for val in nxtvar.curDomain():
-        nxtvar.setValue(val)
-        noDWO = True
-        # if domain wipe out after pruning
-        if GacEnforce(csp.constraintsOf(nxtvar), csp, nxtvar, val) == "DWO":
-            noDWO = False
-        # if domain was not wiped out
-        if noDWO:
-            # GAC again to get solution
-            sol.extend(GAC(unAssignedVars, csp, trace))
-        # restore the values pruned by assignment
-        Variable.restoreValues(nxtvar, val)
-    # unassign variable
-    nxtvar.unAssign()
-    # add to list of unassigned variables
-    unAssignedVars.insert(nxtvar)
+    search.nodesExplored += 1
+    if instrument.enabled:
+        instrument.count("search.nodes")
+        instrument.maximum("search.depth", len(csp.variables()) - len(unAssignedVars.unassigned))
+    # the finally clauses undo the assignment and its prunings even when a
+    # limit stops the search, so it always leaves the domains as it found them
+    try:
+        # check each value in variable's domain
+        for val in nxtvar.curDomain():
+            nxtvar.setValue(val)
+            try:
+                noDWO = True
+                # if domain wipe out after pruning
+                if GacEnforce(csp.constraintsOf(nxtvar), csp, nxtvar, val) == "DWO":
+                    noDWO = False
+                # if the ships completed so far do not fit in the fleet
+                elif not csp.ship_count_constraint().check_partial(csp.variables()):
+                    noDWO = False
+                # if domain was not wiped out
+                if noDWO:
+                    # GAC again to get solution
+                    sol.extend(GAC(unAssignedVars, csp, allSolutions, trace, search, leaf))
+            finally:
+                # restore the values pruned by assignment
+                Variable.restoreValues(nxtvar, val)
+            # stop at the first solution unless all solutions are wanted
+            if sol and not allSolutions:
+                break
+    finally:
+        # unassign variable
+        nxtvar.unAssign()
+        # add to list of unassigned variables
+        unAssignedVars.insert(nxtvar)
+    return sol
+
+
+def FC(unAssignedVars, csp, allSolutions, trace, search):
+    '''Forward Checking search. After each assignment only the
+       constraints of the assigned variable left with a single
+       unassigned variable are enforced (see FCCheck), which makes a node
+       much cheaper than with GacEnforce but prunes less. The leaves are
+       checked by the ship count constraint and the solutions kept as
+       GAC keeps them'''
+    if unAssignedVars.empty():
+        return fleetLeaf(csp, search)
+
+    sol = []
+    search.checkLimits()
+    nxtvar = unAssignedVars.extract()
+    search.nodesExplored += 1
+    if instrument.enabled:
+        instrument.count("search.nodes")
+        instrument.maximum("search.depth", len(csp.variables()) - len(unAssignedVars.unassigned))
+    try:
+        for val in nxtvar.curDomain():
+            nxtvar.setValue(val)
+            try:
+                noDWO = True
+                bt_search.propagations += 1
+                for cnstr in csp.constraintsOf(nxtvar):
+                    if cnstr.numUnassigned() == 1:
+                        if FCCheck(cnstr, cnstr.unAssignedVars()[0], nxtvar, val) == "DWO":
+                            noDWO = False
+                            break
+                # if the ships completed so far do not fit in the fleet
+                if noDWO and not csp.ship_count_constraint().check_partial(csp.variables()):
+                    noDWO = False
+                if noDWO:
+                    sol.extend(FC(unAssignedVars, csp, allSolutions, trace, search))
+            finally:
+                # restore the values pruned by assignment
+                Variable.restoreValues(nxtvar, val)
+            if sol and not allSolutions:
+                break
+    finally:
+        nxtvar.unAssign()
+        unAssignedVars.insert(nxtvar)
+    return sol
+
+
+def FCCheck(constraint, var, assignedVar, assignedVal):
+    '''prune the values of var, the only unassigned variable of the
+       constraint, that falsify the constraint. With every other variable
+       of the scope assigned hasSupport(var, val) is the same test as
+       assigning val and calling check, without assigning and unassigning
+       var for each value (and the cached counts of NValuesConstraint
+       make it constant time). Return "DWO" if var has no value left'''
+    for val in var.curDomain():
+        if not constraint.hasSupport(var, val):
+            var.pruneValue(val, assignedVar, assignedVal)
+            if instrument.enabled:
+                instrument.count("fc.prune " + constraint.name())
+    if var.curDomainSize() == 0:
+        if instrument.enabled:
+            instrument.count("fc.dwo " + constraint.name())
+        return "DWO"
+    return "OK"
+
+
+def SAT(csp, allSolutions, search):
+    '''solve the CSP with the CDCL solver of sat.py, from the current
+       domains of the variables. The solutions are checked by the ship
+       count constraint and kept in the compact form of GAC'''
+    from sat import encode, SatSolver
+
+    variables = csp.variables()
+    cnf = encode(csp)
+    solver = SatSolver(cnf.nvars)
+    # the solver keeps its own copy of the clauses, free the CNF's as they
+    # are added
+    cnf.clauses.reverse()
+    while cnf.clauses:
+        if not solver.add_clause(cnf.clauses.pop()):
+            break
+    if search.limited():
+        # the clauses are propagated as they are added
+        search.partial = [None if solver.lit_value(k + 1) is None
+                          else int(solver.lit_value(k + 1))
+                          for k in range(len(variables))]
+
+    def onDecision():
+        search.checkLimits()
+        search.nodesExplored += 1
+
+    sol = []
+    try:
+        while solver.solve(onDecision):
+            values = [1 if solver.model[k + 1] else 0 for k in range(len(variables))]
+            result, coord, dir = csp.ship_count_constraint().check(values)
+            if not result:
+                raise ValueError("the SAT model does not have the right fleet")
+            found = csp.ship_count_constraint().compact(values, coord, dir)
+            search.found.append(found)
+            sol.append(found)
+            if not allSolutions:
+                break
+            # look for a board that differs in some cell
+            solver.add_clause([-(k + 1) if values[k] else k + 1
+                               for k in range(len(variables))])
+    finally:
+        bt_search.propagations += solver.propagations
+        if instrument.enabled:
+            instrument.count("sat.conflicts", solver.conflicts)
+            instrument.count("sat.decisions", solver.decisions)
+            instrument.count("sat.learnts", solver.learnts)
+    return sol
+
+
+def probe(csp, deadline=None):
+    '''singleton arc consistency presolve (failed literal probing), from
+       domains already made GAC. Each value of each undecided variable is
+       tried in turn: the variable is assigned it and GAC is enforced
+       from its constraints, with the ship count check_partial as in
+       GAC. A value that wipes out some domain is in no solution and is
+       pruned for good, under the root reason (None, None), then GAC is
+       enforced again from it. Passes over the variables repeat until one
+       prunes nothing or deadline (a time.monotonic() value) is reached.
+       Return the number of values pruned, None if some domain was wiped
+       out (the CSP has no solution)'''
+    pruned = 0
+    changed = True
+    while changed:
+        changed = False
+        for var in csp.variables():
+            if var.curDomainSize() < 2:
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                return pruned
+            for val in var.curDomain():
+                if instrument.enabled:
+                    instrument.count("probe.probes")
+                var.setValue(val)
+                try:
+                    failed = GacEnforce(csp.constraintsOf(var), csp, var, val) == "DWO" \
+                        or not csp.ship_count_constraint().check_partial(csp.variables())
+                finally:
+                    Variable.restoreValues(var, val)
+                    var.unAssign()
+                if failed:
+                    var.pruneValue(val, None, None)
+                    pruned += 1
+                    changed = True
+                    if instrument.enabled:
+                        instrument.count("probe.pruned")
+                    if var.curDomainSize() == 0 or \
+                            GacEnforce(csp.constraintsOf(var), csp, None, None) == "DWO":
+                        return None
+                    # the other values may have been pruned by GAC
+                    if var.curDomainSize() < 2:
+                        break
+    return pruned
+
+
+def components(csp):
+    '''group the undecided variables of the CSP (those with more than one
+       value in their current domain) into independent components: two
+       of them are in the same component if some constraint has both in
+       its scope, or links them through other undecided variables. Return
+       the components as lists of variables, none if some domain is empty'''
+    parent = {}
+
+    def find(var):
+        while parent[var] is not var:
+            parent[var] = parent[parent[var]]
+            var = parent[var]
+        return var
+
+    for var in csp.variables():
+        if var.curDomainSize() == 0:
+            return []
+        if var.curDomainSize() > 1:
+            parent[var] = var
+    for c in csp.constraints():
+        free = [var for var in c.scope() if var in parent]
+        for var in free[1:]:
+            a, b = find(free[0]), find(var)
+            if a is not b:
+                parent[a] = b
+    parts = {}
+    for var in csp.variables():
+        if var in parent:
+            parts.setdefault(find(var), []).append(var)
+    return list(parts.values())
+
+
+def decomposedGAC(parts, csp, variableHeuristic, allSolutions, trace, search):
+    '''solve a CSP whose undecided variables split into independent
+       components (see components) one component at a time, joining them
+       on the fleet: the components only share the number of ships of
+       each type (usage of ShipCountConstraint).
+       When one solution is wanted, the components are searched one
+       inside the other: each solution of a component that fits in the
+       ships left starts the search of the next component with the ships
+       it leaves, and the search stops at the first combination using the
+       whole fleet. The ships left for which the components after a given
+       one have no solution are remembered, so no two solutions of a
+       component search the rest again for the same ships.
+       When all solutions are wanted, each component is searched with GAC
+       to the end and its solutions are grouped by the ships they use; a
+       knapsack over these usage vectors picks one vector per component
+       adding up to the fleet.
+       Return the solutions as GAC does, None if the ships of some
+       component depend on another one, the caller then searches the
+       whole board'''
+    if instrument.enabled:
+        instrument.count("decompose.components", len(parts))
+    fleet = csp.ship_count_constraint()
+    variables = csp.variables()
+    position = {var: k for k, var in enumerate(variables)}
+    # the values fixed before the search, None for the undecided cells
+    board = [var.curDomain()[0] if var.curDomainSize() == 1 else None
+             for var in variables]
+    fixed = fleet.usage(board, range(len(board)), strict=False)
+    if fixed is None:
+        return []
+    target = tuple(fleet.ship_count)
+
+    def partUsage(part, cells, left):
+        '''the ships used by the current values of the variables of a
+           component, None if they are not ships of the fleet or more than
+           the ships left'''
+        values = list(board)
+        for k, var in zip(cells, part):
+            values[k] = var.getValue()
+        used = fleet.usage(values, cells)
+        if used is None or any(a > b for a, b in zip(used, left)):
+            return None
+        return tuple(used)
+
+    def searchPart(k, leaf):
+        '''search the k-th component with GAC, leaf judging each of its
+           solutions'''
+        uv = UnassignedVars(variableHeuristic, csp)
+        uv.unassigned = [var for var in uv.unassigned if var in parts[k]]
+        return GAC(uv, csp, allSolutions, trace, search, leaf)
+
+    def join(values):
+        '''the solution of the board with values, in the compact form of
+           ShipCountConstraint'''
+        result, coord, dir = fleet.check(values)
+        if not result:
+            raise ValueError("the components do not join into a valid board")
+        solution = fleet.compact(values, coord, dir)
+        search.found.append(solution)
+        return solution
+
+    # for each component, the ships left for which it and the components
+    # after it have no solution
+    failed = [set() for part in parts]
+
+    def first(k, left):
+        '''the first solution of the components from the k-th on using
+           exactly the ships left, None if there is none'''
+        if k == len(parts):
+            if any(left):
+                return None
+            values = list(board)
+            for var in itertools.chain(*parts):
+                values[position[var]] = var.getValue()
+            return join(values)
+        if left in failed[k]:
+            return None
+        cells = [position[var] for var in parts[k]]
+
+        def leaf():
+            used = partUsage(parts[k], cells, left)
+            if used is None:
+                return []
+            solution = first(k + 1, tuple(b - a for a, b in zip(used, left)))
+            return [] if solution is None else [solution]
+
+        sol = searchPart(k, leaf)
+        if not sol:
+            failed[k].add(left)
+            return None
+        return sol[0]
+
+    def allUsages(k):
+        '''the usage vectors of the solutions of the k-th component, each
+           with the values of its variables giving it'''
+        cells = [position[var] for var in parts[k]]
+        left = tuple(b - a for a, b in zip(fixed, target))
+        usages = {}
+
+        def leaf():
+            used = partUsage(parts[k], cells, left)
+            if used is None:
+                return []
+            usages.setdefault(used, []).append([var.getValue() for var in parts[k]])
+            return [used]
+
+        searchPart(k, leaf)
+        return cells, usages
+
+    try:
+        if not allSolutions:
+            solution = first(0, tuple(b - a for a, b in zip(fixed, target)))
+            return [] if solution is None else [solution]
+        found = [allUsages(k) for k in range(len(parts))]
+    except UndeterminedShip:
+        if instrument.enabled:
+            instrument.count("decompose.fallback")
+        return None
+    if any(not usages for cells, usages in found):
+        return []
+
+    # the knapsack: the sums of usage vectors reachable with the first
+    # components, and how each was reached
+    reached = [{tuple(fixed): None}]
+    for cells, usages in found:
+        step = {}
+        for total in reached[-1]:
+            for used in usages:
+                new = tuple(a + b for a, b in zip(total, used))
+                if all(a <= b for a, b in zip(new, target)):
+                    step.setdefault(new, []).append((total, used))
+        reached.append(step)
+    if target not in reached[-1]:
+        return []
+
+    def combine(k, total):
+        '''the ways of reaching total with the first k components, as
+           lists of (usage vector of each component)'''
+        if k == 0:
+            yield []
+            return
+        for previous, used in reached[k][total]:
+            for rest in combine(k - 1, previous):
+                yield rest + [used]
+
+    sol = []
+    for choice in combine(len(found), target):
+        # every solution of each component with the chosen usage
+        options = [found[k][1][used] for k, used in enumerate(choice)]
+        for values in itertools.product(*options):
+            full = list(board)
+            for (cells, usages), part in zip(found, values):
+                for k, val in zip(cells, part):
+                    full[k] = val
+            sol.append(join(full))
     return sol
 
 
 def GacEnforce(constraints, csp, assignedVar, assignedVal):
+    bt_search.propagations += 1
+    # look the flag up once, GacEnforce is the hottest loop of the solver
+    on = instrument.enabled
+    if on:
+        t0 = instrument.clock()
+        for cnstr in constraints:
+            instrument.count("gac.push " + cnstr.name())
+    # constraints currently on the queue, for constant time membership tests
+    queued = set(constraints)
     # while there are constraints
     while constraints != []:
         # extract constraint
         constraint = constraints.pop()
+        queued.discard(constraint)
+        if on:
+            instrument.count("gac.pop " + constraint.name())
+        # results of hasSupport still valid for the current domains of
+        # the scope, from earlier revisions of the constraint
+        cache = constraint.supportCache()
+        # every value of the scope was supported when the scope last was
+        # as it is now
+        if cache.get(None):
+            if on:
+                instrument.count("gac.skipped " + constraint.name())
+            continue
+        pruned = False
         # for each variable in the constraint's scope
         for var in constraint.scope():
             # for each value in the variable's domain
             for val in var.curDomain():
+                supported = cache.get((var, val))
+                if supported is None:
+                    supported = constraint.hasSupport(var, val)
+                    cache[(var, val)] = supported
+                elif on:
+                    instrument.count("gac.cached " + constraint.name())
                 # if variable does not have support, prune
-                if not constraint.hasSupport(var, val):
+                if not supported:
                     var.pruneValue(val, assignedVar, assignedVal)
+                    pruned = True
+                    # the pruning changed the scope
+                    cache = constraint.supportCache()
+                    if on:
+                        instrument.count("gac.prune " + constraint.name())
                     # if there are no domain values left
                     if var.curDomainSize() == 0:
+                        if on:
+                            instrument.count("gac.dwo " + constraint.name())
+                            instrument.add_time("GacEnforce", instrument.clock() - t0)
                         return "DWO"
                     # iterate through constraints of var
                     for cnstr in csp.constraintsOf(var):
                         # add each constraint of var if:
                         # not extracted constraint or not in given constraints
-                        if cnstr != constraint and cnstr not in constraints:
+                        if cnstr != constraint and cnstr not in queued:
                             constraints.append(cnstr)
+                            queued.add(cnstr)
+                            if on:
+                                instrument.count("gac.push " + cnstr.name())
+        if not pruned:
+            cache[None] = True
+    if on:
+        instrument.add_time("GacEnforce", instrument.clock() - t0)
     return "OK"
@@ -1,13 +1,23 @@
-from csp import Constraint, Variable, CSP
-from constraints import *
-from backtracking import bt_search
+from csp import Variable, CSP
+from constraints import (TableConstraint, NValuesConstraint, ShipCountConstraint,
+                         SubmarineHintConstraint, ShipEndHintConstraint,
+                         MiddleHintConstraint)
+from backtracking import bt_search, count_solutions
+import instrument
 import sys
 import argparse
+import os
 import time
 
+# cache (sqlite3, hashlib, json), symmetry and pickle are imported where
+# they are used, so the modes that do not need them start faster
+
 # # ./S/</>/v/^/M symbols for ship parts
 ship_types = ['S', '<', '>', 'v', '^', 'M']
 
+# first bytes of an indexed archive of puzzles, see archive.py
+ARCHIVE_MAGIC = b"BSAR"
+
 
 def get_coords(i, j, length, dir, solution):
     """
@@ -57,294 +67,594 @@ def get_coords(i, j, length, dir, solution):
             solution[i][j + (dir[1] * l)] = ship_types[5]
 
 
-def print_sol(s, size, coord, orient):
+def board_text(s, size, coord, orient):
     """
-    Print the solution board
-    s: solution
+    Render the solution board as text, a line per row
+    s: solution, the values of the cells as bytes, row by row
     size: the size of board
-    coord: dictionary of each type of ship showing
-    the top left cell each ship of that type starts at
+    coord: for each type of ship, the index in s of the top left cell
+    each ship of that type starts at
     orient: the direction in each ship is oriented towards
     """
-    # keep track of the number of each type of ship that has been looked at
-    # index for dir
-    index = [0, 0, 0, 0, 0]
-    # dictionary to keep variable, value pairs
-    s_ = {}
+    # the type and orientation of the ship starting at each top left cell
+    starts = {}
+    for type in range(len(coord)):
+        for k in range(len(coord[type])):
+            starts[coord[type][k]] = (type, orient[type][k])
     # list representing the solution board
-    sol = []
+    sol = [['.'] * size for i in range(size)]
+
+    # go through the top left cells of the ships
+    for index in sorted(starts):
+        i, j = divmod(index, size)
+        type, dir = starts[index]
+        # if 1x1 submarine
+        if type == 0:
+            # cell (i, j) = 'S'
+            sol[i][j] = ship_types[0]
+        # ship of length type + 1
+        else:
+            # update sol
+            get_coords(i, j, type + 1, dir, sol)
 
-    for (var, val) in s:
-        s_[int(var.name())] = val
+    # join the cells of each row, the board is built as one string
+    return "".join("".join(row) + "\n" for row in sol)
 
-    # create array to store the board
+
+def render_partial(values, size):
+    """
+    Render a partially solved board as text, as board_text renders a
+    solution, with '?' for the cells not known yet and 'X' for ship parts
+    whose shape depends on unknown cells
+    values: the value of each variable indexed by variable, None if unknown
+    size: the size of board
+    """
+    rows = []
     for i in range(size):
         row = []
         for j in range(size):
-            row.append('.')
-        sol.append(row)
-
-    # go through each cell on board
-    for i in range(1, size - 1):
-        for j in range(1, size - 1):
-            # if 1x1 submarine
-            if -1 - (i * size + j) in coord[0]:
-                # cell (i, j) = 'S'
-                sol[i][j] = ship_types[0]
-
-            # if 1x2 destroyer
-            elif -1 - (i * size + j) in coord[1]:
-                # get orientation of ship
-                dir = orient[1][index[1]]
-                # update sol
-                get_coords(i, j, 2, dir, sol)
-                # increase count of destroyer ships
-                index[1] += 1
-
-            # if 1x3 cruiser
-            elif -1 - (i * size + j) in coord[2]:
-                # get orientation of ship
-                dir = orient[2][index[2]]
-                # update sol
-                get_coords(i, j, 3, dir, sol)
-                # increase count of cruiser ships
-                index[2] += 1
-
-            # if 1x4 battleship
-            elif -1 - (i * size + j) in coord[3]:
-                # get orientation of ship
-                dir = orient[3][index[3]]
-                # update sol
-                get_coords(i, j, 4, dir, sol)
-                # increase count of battleship ships
-                index[3] += 1
-
-            # if 1x5 carrier
-            elif -1 - (i * size + j) in coord[4]:
-                # get orientation of ship
-                dir = orient[4][index[4]]
-                # update sol
-                get_coords(i, j, 5, dir, sol)
-                # increase count of carrier ships
-                index[4] += 1
-
-    # iterate through list representation and print each cell of the board
-    for i in range(1, size - 1):
-        for j in range(1, size - 1):
-            print(sol[i][j], end="")
-        print('')
-
-
-# parse board and ships info
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "--inputfile",
-    type=str,
-    required=True,
-    help="The input file that contains the puzzles."
-)
-parser.add_argument(
-    "--outputfile",
-    type=str,
-    required=True,
-    help="The output file that contains the solution."
-)
-args = parser.parse_args()
-file = open(args.inputfile, 'r')
-
-# t0 = time.time()
-
-b = file.read()
-b2 = b.split()
-size = len(b2[0])
-size = size + 2
-b3 = []
-b3 += ['0' + b2[0] + '0']
-b3 += ['0' + b2[1] + '0']
-b3 += [b2[2] + ('0' if len(b2[2]) == 3 else '')]
-b3 += ['0' * size]
-for i in range(3, len(b2)):
-    b3 += ['0' + b2[i] + '0']
-b3 += ['0' * size]
-board = "\n".join(b3)
-
-varlist = []
-varn = {}
-conslist = []
-
-# make 1/0 variables
-for i in range(0, size):
-    for j in range(0, size):
-        v = None
-        if i == 0 or i == size - 1 or j == 0 or j == size - 1:
-            v = Variable(str(-1 - (i * size + j)), [0])
+            val = values[i * size + j]
+            if val is None:
+                row.append('?')
+            elif val == 0:
+                row.append('.')
+            else:
+                row.append(partial_symbol(values, size, i, j))
+        rows.append("".join(row) + "\n")
+    return "".join(rows)
+
+
+def partial_symbol(values, size, i, j):
+    """
+    The symbol of the ship part in cell (i, j) of a partially solved board,
+    as far as the known neighbouring cells tell (water beyond the edges)
+    """
+    up = values[(i - 1) * size + j] if i > 0 else 0
+    down = values[(i + 1) * size + j] if i < size - 1 else 0
+    left = values[i * size + j - 1] if j > 0 else 0
+    right = values[i * size + j + 1] if j < size - 1 else 0
+    if up == 0 and down == 0 and left == 0 and right == 0:
+        return ship_types[0]
+    if left == 0 and right == 1:
+        return ship_types[1]
+    if left == 1 and right == 0:
+        return ship_types[2]
+    if up == 1 and down == 0:
+        return ship_types[3]
+    if up == 0 and down == 1:
+        return ship_types[4]
+    if (left == 1 and right == 1) or (up == 1 and down == 1):
+        return ship_types[5]
+    return 'X'
+
+
+def render_solutions(solutions, size):
+    """
+    Render the solutions with board_text, one board after the other
+    """
+    return "".join(board_text(s[0], size, s[1], s[2]) for s in solutions)
+
+
+def parse_counts(line, extended):
+    """
+    Parse a line of row, column or fleet counts
+    line: the whitespace separated tokens of the line
+    extended: whether the counts are whitespace separated integers
+    instead of one digit per character
+    """
+    if extended:
+        return [int(i) for i in line]
+    return [int(i) for i in "".join(line)]
+
+
+def read_puzzle(text):
+    """
+    Parse the puzzle text into its row counts, column counts, fleet and hints
+    The original format has one digit per row/column/ship type. The extended
+    format has whitespace separated integers on the first three lines so
+    boards larger than 9 and fleets with 10 or more ships of a type can be
+    given, e.g.
+
+        10 2 4 ...       <--- ship parts in each row
+        3 11 0 ...       <--- ship parts in each column
+        8 6 4 2 1 1      <--- number of ships of length 1, 2, 3, ...
+        0000S000...      <--- hint rows, one character per cell
+
+    Return (row_constraint, col_constraint, ship_count, hints) where hints
+    is a list of strings, one per row of the board
+    """
+    lines = [line.split() for line in text.splitlines() if line.strip()]
+    if len(lines) < 3:
+        raise ValueError("puzzle must have row, column and fleet lines")
+    # the extended format is recognised by its whitespace separated row counts
+    extended = len(lines[0]) > 1
+    row_constraint = parse_counts(lines[0], extended)
+    col_constraint = parse_counts(lines[1], extended)
+    ship_count = parse_counts(lines[2], extended)
+    hints = ["".join(line) for line in lines[3:]]
+
+    n = len(row_constraint)
+    if len(col_constraint) != n or len(hints) != n or \
+            any(len(row) != n for row in hints):
+        raise ValueError("puzzle is not a {0}x{0} board".format(n))
+    return row_constraint, col_constraint, ship_count, hints
+
+
+def split_puzzles(text):
+    """
+    Split text holding several puzzles, separated by blank lines (a
+    request body of server.py, the output of generator.py), into the text
+    of each puzzle
+    """
+    puzzles = []
+    lines = []
+    for line in text.splitlines():
+        if line.strip():
+            lines.append(line)
+        elif lines:
+            puzzles.append("\n".join(lines) + "\n")
+            lines = []
+    if lines:
+        puzzles.append("\n".join(lines) + "\n")
+    return puzzles
+
+
+def format_puzzle(row_constraint, col_constraint, ship_count, hints):
+    """
+    Write the puzzle in the format read_puzzle parses
+    The original one digit per count format is used when every count fits in
+    a digit, the extended format otherwise
+    """
+    counts = [row_constraint, col_constraint, ship_count]
+    if all(0 <= i <= 9 for line in counts for i in line):
+        lines = ["".join(str(i) for i in line) for line in counts]
+    else:
+        lines = [" ".join(str(i) for i in line) for line in counts]
+    return "\n".join(lines + list(hints)) + "\n"
+
+
+class ModelTemplate:
+    """
+    The parts of the battleship CSP that only depend on the size of the
+    board: the variables, the row, column and diagonal constraints and,
+    for each length of the longest ship, the length constraints. They are
+    built once and shared by every puzzle of that size, which only patches
+    in the row and column counts and adds its hint constraints
+    """
+
+    def __init__(self, n):
+        """
+        n: the size of the board
+        """
+        size = n
+        self.size = size
+        # variable of cell (i, j) is varlist[i * size + j], its index
+        varlist = []
+
+        # make 1/0 variables
+        for i in range(0, size):
+            for j in range(0, size):
+                v = Variable(str(-1 - (i * size + j)), [0, 1], i * size + j, (i, j))
+                varlist.append(v)
+        self.varlist = varlist
+
+        # row and column constraints on 1/0 variables, their bounds are set
+        # by each puzzle
+        self.rows = []
+        for row in range(0, size):
+            self.rows.append(NValuesConstraint('row',
+                                               [varlist[row * size + col] for
+                                                col in range(0, size)], [1], 0, 0))
+        self.cols = []
+        for col in range(0, size):
+            self.cols.append(NValuesConstraint('col',
+                                               [varlist[col + row * size] for
+                                                row in range(0, size)], [1], 0, 0))
+
+        # diagonal constraints on 1/0 variables, between the cells of the
+        # board that touch diagonally
+        self.diags = []
+        for i in range(1, size):
+            for j in range(0, size):
+                if j > 0:
+                    self.diags.append(NValuesConstraint('diag',
+                                                        [varlist[i * size + j],
+                                                         varlist[(i - 1) * size + (j - 1)]], [1], 0,
+                                                        1))
+                if j < size - 1:
+                    self.diags.append(NValuesConstraint('diag',
+                                                        [varlist[i * size + j],
+                                                         varlist[(i - 1) * size + (j + 1)]], [1], 0,
+                                                        1))
+
+        # longest ship -> CSP of the constraints above and the length
+        # constraints, without hints
+        self.bases = {}
+
+    def base(self, longest):
+        """
+        The CSP of the template for fleets whose longest ship has the given
+        length, built the first time it is asked for
+        """
+        if longest not in self.bases:
+            size = self.size
+            varlist = self.varlist
+            # length constraints on 1/0 variables: no run of ship parts in a
+            # row or column is longer than the longest ship in the fleet
+            lengths = []
+            for i in range(0, size):
+                for j in range(0, size - longest):
+                    lengths.append(NValuesConstraint('len',
+                                                     [varlist[i * size + j + k]
+                                                      for k in range(longest + 1)],
+                                                     [1], 0, longest))
+                    lengths.append(NValuesConstraint('len',
+                                                     [varlist[(j + k) * size + i]
+                                                      for k in range(longest + 1)],
+                                                     [1], 0, longest))
+            self.bases[longest] = CSP('battleship', self.varlist,
+                                      self.rows + self.cols + self.diags + lengths,
+                                      None)
+        return self.bases[longest]
+
+
+# size of the board -> its ModelTemplate
+model_templates = {}
+
+# bump when ModelTemplate changes, so older pickles are not loaded
+TEMPLATE_VERSION = 4
+
+
+def get_template(n, directory=None):
+    """
+    The model template of boards of size n, built once per process
+    directory: if given, templates are also pickled to this directory and
+    loaded from it by later runs
+    """
+    template = model_templates.get(n)
+    if template is None and directory:
+        import pickle
+        path = os.path.join(directory, "model{}.v{}.pickle".format(n, TEMPLATE_VERSION))
+        try:
+            with open(path, 'rb') as file:
+                template = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            template = None
+    if template is None:
+        template = ModelTemplate(n)
+    model_templates[n] = template
+    return template
+
+
+def save_template(n, directory):
+    """
+    Pickle the model template of boards of size n, with the bases built so
+    far, to the directory
+    """
+    import pickle
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "model{}.v{}.pickle".format(n, TEMPLATE_VERSION))
+    # write to a temporary file first so readers never see a partial pickle
+    with open(path + ".tmp", 'wb') as file:
+        pickle.dump(model_templates[n], file, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def hint_constraints(varlist, size, ii, jj, symbol, lengths):
+    """
+    The constraints a hint puts on the CSP
+    varlist: the variables of the board, cell (i, j) is varlist[i * size + j]
+    size: the size of the board
+    ii, jj: the cell of the hint
+    symbol: the hint, '.' for water or one of ship_types, '0' for none
+    lengths: the lengths of the ships in the fleet
+    A ship part is one constraint on the whole ship through the cell: where
+    it can be placed given the ship lengths, with water around it
+    Return the list of constraints
+    """
+    conslist = []
+    # 'S'
+    if symbol == ship_types[0]:
+        conslist.append(SubmarineHintConstraint(varlist, size, ii, jj, lengths))
+    # '<', '>', 'v', '^'
+    elif symbol in ship_types[1:5]:
+        conslist.append(ShipEndHintConstraint(varlist, size, ii, jj, symbol, lengths))
+    # 'M'
+    elif symbol == ship_types[5]:
+        conslist.append(MiddleHintConstraint(varlist, size, ii, jj, lengths))
+    # if the cell is water
+    elif symbol == '.':
+        conslist.append(TableConstraint('boolean_match', [varlist[ii * size + jj]], [[0]]))
+    return conslist
+
+
+def fleet_lengths(ship_count):
+    """
+    The lengths of the ships in the fleet
+    """
+    return [k + 1 for k in range(len(ship_count)) if ship_count[k] > 0]
+
+
+def build_csp(row_constraint, col_constraint, ship_count, hints, template_dir=None):
+    """
+    Build the battleship CSP of the puzzle
+    The variables and the row, column, diagonal and length constraints come
+    from the model template of the size of the board, so the CSP shares them
+    with every puzzle of that size and is only valid until the next one is
+    built
+    template_dir: a directory the templates are pickled to, see get_template
+    Return the CSP and the size of the board
+    """
+    size = len(row_constraint)
+    lengths = fleet_lengths(ship_count)
+    longest = max(lengths, default=0)
+    template = get_template(size, template_dir)
+    known = longest in template.bases
+    base = template.base(longest)
+    if template_dir and not known:
+        save_template(size, template_dir)
+
+    varlist = template.varlist
+    conslist = []
+
+    # make 1/0 variables match board info
+    ii = 0
+    for i in hints:
+        jj = 0
+        for j in i:
+            conslist.extend(hint_constraints(varlist, size, ii, jj, j, lengths))
+            jj += 1
+        ii += 1
+
+    # row and column counts
+    for row in range(0, size):
+        template.rows[row].setBounds(row_constraint[row], row_constraint[row])
+    for col in range(0, size):
+        template.cols[col].setBounds(col_constraint[col], col_constraint[col])
+
+    # initialize ship count constraint
+    ship_count = ShipCountConstraint(list(ship_count), size)
+
+    return base.extend(conslist, ship_count), size
+
+
+def solve(csp, all_solutions=False, deadline=None, max_nodes=None, algorithm='GAC',
+          probe=None):
+    """
+    Find the solutions of the CSP which have the right number of each ship
+    deadline: a time.monotonic() value the search stops at
+    max_nodes: the number of nodes the search stops after
+    algorithm: 'GAC' or 'FC' for the backtracking search, 'SAT' for the SAT
+    solver
+    probe: the number of seconds to spend probing at the root before
+    searching, None for none (see backtracking.probe)
+    Return the SearchResult of bt_search: how the search ended, the
+    solutions, the nodes explored and the cells fixed at the root
+    """
+    return bt_search(algorithm, csp, 'mrv', all_solutions, False, deadline, max_nodes,
+                     probeBudget=probe)
+
+
+def main():
+    # parse board and ships info
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--inputfile",
+        type=str,
+        required=True,
+        help="The input file that contains the puzzles, as text or an "
+             "archive made by archive.py."
+    )
+    parser.add_argument(
+        "--puzzle",
+        type=int,
+        default=0,
+        metavar="N",
+        help="The puzzle of an archive to solve, from 0."
+    )
+    parser.add_argument(
+        "--outputfile",
+        type=str,
+        default=None,
+        help="The output file that contains the solution, - for stdout."
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "json", "binary"],
+        default="text",
+        help="The format of the output file: the board as text, a JSON "
+             "object per board, or 2 bits per cell (see writer.py)."
+    )
+    parser.add_argument(
+        "--unique",
+        action="store_true",
+        help="Instead of solving, print whether the puzzle has a unique "
+             "solution ('unique', 'none' or 'multiple'); the exit status "
+             "is 0 only if it is unique."
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=None,
+        metavar="LIMIT",
+        help="Instead of solving, print the number of solutions, counting "
+             "at most LIMIT of them (0 for no limit)."
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="The database of solutions of puzzles solved before "
+             "(default: ~/.cache/battleship/solutions.sqlite3)."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=64,
+        help="The size of the cache in MiB, least recently used solutions "
+             "are evicted beyond it."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always solve the puzzle, without reading or writing the cache."
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Stop searching after this many seconds and write the cells "
+             "known so far, '?' for the others; the exit status is then 3."
+    )
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=None,
+        help="Stop searching after this many nodes, as --timeout does."
+    )
+    parser.add_argument(
+        "--algorithm",
+        choices=["GAC", "FC", "SAT"],
+        default="GAC",
+        help="Search with backtracking and GAC, or with forward checking "
+             "(for small, easy boards only: much slower than GAC on hard "
+             "ones), or compile the puzzle to CNF and use the SAT solver "
+             "(default: GAC)."
+    )
+    parser.add_argument(
+        "--probe",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Before searching, try each value of each undecided cell and "
+             "remove the ones propagation refutes, for at most this many "
+             "seconds (GAC and FC only). Only worth it on puzzles that take "
+             "GAC seconds, it slows down easy ones."
+    )
+    parser.add_argument(
+        "--model-cache",
+        type=str,
+        default=None,
+        metavar="DIR",
+        help="Pickle the parts of the CSP that only depend on the size of "
+             "the board to this directory, and reuse them in later runs."
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print counters and timers of the solver to stderr."
+    )
+    parser.add_argument(
+        "--stats-json",
+        type=str,
+        default=None,
+        help="Write counters and timers of the solver as JSON to this file."
+    )
+    args = parser.parse_args()
+    if args.outputfile is None and not args.unique and args.count is None:
+        parser.error("--outputfile is required unless --unique or --count is given")
+    if args.stats or args.stats_json:
+        instrument.enable()
+    file = open(args.inputfile, 'rb')
+    if file.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC:
+        # an indexed archive of puzzles, only the record of the puzzle is read
+        from archive import Archive
+        with Archive(args.inputfile) as archive:
+            if not 0 <= args.puzzle < len(archive):
+                parser.error("the archive has {} puzzles".format(len(archive)))
+            puzzle = archive[args.puzzle]
+    else:
+        file.seek(0)
+        puzzle = read_puzzle(file.read().decode())
+    file.close()
+    counting = args.unique or args.count is not None
+
+    deadline = None
+    if args.timeout is not None:
+        deadline = time.monotonic() + args.timeout
+    timed_out = False
+
+    # look the puzzle up before building the CSP. Mirrored and transposed
+    # variants of a puzzle share one entry, keyed and stored in their
+    # canonical form
+    cache = None
+    text = None
+    if not counting and not args.no_cache:
+        from cache import SolutionCache, puzzle_key, DEFAULT_PATH
+        from symmetry import canonical, inverse, transform_boards
+        cache = SolutionCache(args.cache or DEFAULT_PATH, args.cache_size * 1024 * 1024)
+        canonical_puzzle, symmetry = canonical(*puzzle)
+        key = puzzle_key(*canonical_puzzle)
+        entry = cache.get(key)
+        if entry is not None:
+            text = transform_boards(entry[0], len(puzzle[0]), inverse(symmetry))
+
+    if text is None:
+        t0 = time.perf_counter()
+        csp, size = build_csp(*puzzle, template_dir=args.model_cache)
+        if counting:
+            # count the solutions without keeping them
+            num = count_solutions(csp, 2 if args.unique else (args.count or None))
         else:
-            v = Variable(str(-1 - (i * size + j)), [0, 1])
-        varlist.append(v)
-        varn[str(-1 - (i * size + j))] = v
-
-# make 1/0 variables match board info
-ii = 0
-for i in board.split()[3:]:
-    jj = 0
-    for j in i:
-        # if not padding or water
-        if j != '0' and j != '.':
-            conslist.append(TableConstraint('boolean_match',
-                                            [varn[str(-1 - (ii * size + jj))]],
-                                            [[1]]))
-            # add constraints for given ship parts in input
-            # 'S'
-            if j == ship_types[0]:
-                # constraint to make sure that only 'S' is a ship part
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii + 1) * size + jj))],
-                         varn[str(-1 - ((ii - 1) * size + jj))],
-                         varn[str(-1 - (ii * size + (jj - 1)))],
-                         varn[str(-1 - (ii * size + (jj + 1)))]
-                         ]
-                conslist.append(NValuesConstraint('S', scope, [1], 1, 1))
-                # constraint to make sure that all cells surrounding 'S' is water
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii + 1) * size + jj))],
-                         varn[str(-1 - ((ii - 1) * size + jj))],
-                         varn[str(-1 - (ii * size + (jj - 1)))],
-                         varn[str(-1 - (ii * size + (jj + 1)))]
-                         ]
-                conslist.append(NValuesConstraint('S', scope, [0], 4, 4))
-
-            # '<'
-            if j == ship_types[1]:
-                # constraint to make sure that cell on right of '<' is a ship part
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - (ii * size + (jj + 1)))],
-                         ]
-                conslist.append(NValuesConstraint('<', scope, [1], 2, 2))
-                # constraint to make sure that cell on left of '<' is water
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - (ii * size + (jj - 1)))],
-                         ]
-                conslist.append(NValuesConstraint('<', scope, [0], 1, 1))
-
-            # '>'
-            elif j == ship_types[2]:
-                # constraint to make sure that cell on left of '>' is a ship part
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - (ii * size + (jj - 1)))],
-                         ]
-                conslist.append(NValuesConstraint('>', scope, [1], 2, 2))
-                # constraint to make sure that cell on right of '>' is water
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - (ii * size + (jj + 1)))],
-                         ]
-                conslist.append(NValuesConstraint('>', scope, [0], 1, 1))
-
-            # 'v'
-            elif j == ship_types[3]:
-                # constraint to make sure that cell above 'v' is a ship part
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii - 1) * size + jj))]
-                         ]
-                conslist.append(NValuesConstraint('^', scope, [1], 2, 2))
-                # constraint to make sure that cell below 'v' is water
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii + 1) * size + jj))]
-                         ]
-                conslist.append(NValuesConstraint('^', scope, [0], 1, 1))
-
-            # '^'
-            elif j == ship_types[4]:
-                # constraint to make sure that cell below of '^' is a ship part
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii + 1) * size + jj))]
-                         ]
-                conslist.append(NValuesConstraint('v', scope, [1], 2, 2))
-                # constraint to make sure that cell above of '^' is water
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii - 1) * size + jj))]
-                         ]
-                conslist.append(NValuesConstraint('v', scope, [0], 1, 1))
-            # 'M'
-            elif j == ship_types[5]:
-                # constraint to make sure either top and bottom or left and right
-                # are ship parts from 'M'
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii + 1) * size + jj))],
-                         varn[str(-1 - ((ii - 1) * size + jj))],
-                         varn[str(-1 - (ii * size + (jj - 1)))],
-                         varn[str(-1 - (ii * size + (jj + 1)))]
-                         ]
-                conslist.append(NValuesConstraint('M', scope, [1], 3, 3))
-                # constraint to make sure either top and bottom or left and right
-                # of 'M' are water
-                scope = [varn[str(-1 - (ii * size + jj))],
-                         varn[str(-1 - ((ii + 1) * size + jj))],
-                         varn[str(-1 - ((ii - 1) * size + jj))],
-                         varn[str(-1 - (ii * size + (jj - 1)))],
-                         varn[str(-1 - (ii * size + (jj + 1)))]
-                         ]
-                conslist.append(NValuesConstraint('M', scope, [0], 2, 2))
-
-        # if the cell is water
-        elif j == '.':
-            conslist.append(TableConstraint('boolean_match',
-                                            [varn[str(-1 - (ii * size + jj))]],
-                                            [[0]]))
-        jj += 1
-    ii += 1
-
-# row and column constraints on 1/0 variables
-row_constraint = []
-for i in board.split()[0]:
-    row_constraint += [int(i)]
-
-for row in range(0, size):
-    conslist.append(NValuesConstraint('row',
-                                      [varn[str(-1 - (row * size + col))] for
-                                       col in range(0, size)], [1],
-                                      row_constraint[row], row_constraint[row]))
-
-col_constraint = []
-for i in board.split()[1]:
-    col_constraint += [int(i)]
-
-for col in range(0, size):
-    conslist.append(NValuesConstraint('col',
-                                      [varn[str(-1 - (col + row * size))] for
-                                       row in range(0, size)], [1],
-                                      col_constraint[col], col_constraint[col]))
-
-# diagonal constraints on 1/0 variables
-for i in range(1, size - 1):
-    for j in range(1, size - 1):
-        for k in range(9):
-            conslist.append(NValuesConstraint('diag',
-                                              [varn[str(-1 - (i * size + j))],
-                                               varn[str(-1 - ((i - 1) * size + (
-                                                       j - 1)))]], [1], 0,
-                                              1))
-            conslist.append(NValuesConstraint('diag',
-                                              [varn[str(-1 - (i * size + j))],
-                                               varn[str(-1 - ((i - 1) * size + (
-                                                       j + 1)))]], [1], 0,
-                                              1))
-
-# ship count constraint
-ship_count = []
-# iterate through the line containing the number of each type of ships
-for i in board.split()[2]:
-    # save it as an integer value
-    ship_count += [int(i)]
-# initialize ship count constraint
-ship_count = ShipCountConstraint(ship_count, size)
-
-# find all solutions and check which one has right ship #'s
-csp = CSP('battleship', varlist, conslist, ship_count)
-solutions, num_nodes = bt_search('GAC', csp, 'mrv', False, False)
-sys.stdout = open(args.outputfile, 'w')
-# print the solutions
-for i in range(len(solutions)):
-    print_sol(solutions[i][0], size, solutions[i][1], solutions[i][2])
-
-# t1 = time.time()
-# print(f"{t1 - t0} seconds")
+            # find all solutions and check which one has right ship #'s
+            result = solve(csp, False, deadline, args.max_nodes,
+                           args.algorithm, args.probe)
+            if result.status == 'timeout':
+                timed_out = True
+                text = render_partial(result.partial, size)
+            else:
+                text = render_solutions(result.solutions, size)
+            # a partial board is not worth keeping
+            if cache is not None and not timed_out:
+                # the search order depends on the orientation of the board,
+                # so the puzzle is solved as given and only stored canonically
+                cache.put(key, transform_boards(text, size, symmetry),
+                          {"nodes": result.nodes,
+                           "seconds": time.perf_counter() - t0})
+    if cache is not None:
+        cache.close()
+    instrument.disable()
+    if args.stats:
+        print(instrument.summary(), file=sys.stderr)
+    if args.stats_json:
+        instrument.dump(args.stats_json)
+
+    if args.unique:
+        print(["none", "unique", "multiple"][num])
+        sys.exit(0 if num == 1 else 1)
+    if counting:
+        print(num)
+        return
+
+    from writer import open_writer
+    with open_writer(args.outputfile, args.format, len(puzzle[0])) as out:
+        out.write(text, partial=timed_out)
+    if timed_out:
+        print("search stopped after {} nodes, the board is partial".format(result.nodes),
+              file=sys.stderr)
+        sys.exit(3)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+from battle import read_puzzle, build_csp, render_solutions
+from backtracking import bt_search
+from generator import random_puzzle, scaled_fleet
+from verify import verify
+import instrument
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# directory of the repository, the inputs/ and outputs/ corpus live here
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def solve_once(text, heuristic, algorithm='GAC'):
+    """
+    Parse, build and solve the puzzle once, with bt_search's 'GAC', 'FC' or
+    'SAT'
+    Return the wall time, nodes explored, propagation calls and the
+    rendered solutions
+    """
+    t0 = time.perf_counter()
+    csp, size = build_csp(*read_puzzle(text))
+    result = bt_search(algorithm, csp, heuristic, False, False)
+    t1 = time.perf_counter()
+    return t1 - t0, result.nodes, result.propagations, render_solutions(result.solutions, size)
+
+
+def peak_memory(text, heuristic, algorithm='GAC'):
+    """
+    Peak memory in bytes allocated while solving the puzzle
+    This is measured on a separate run since tracing slows the solver down
+    """
+    tracemalloc.start()
+    try:
+        solve_once(text, heuristic, algorithm)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def instrumented(text, heuristic, algorithm='GAC'):
+    """
+    Counters and timers of the instrumented solver on the puzzle
+    This is measured on a separate run since instrumentation slows the
+    solver down
+    """
+    instrument.enable()
+    try:
+        solve_once(text, heuristic, algorithm)
+        return instrument.report()
+    finally:
+        instrument.disable()
+
+
+def expected_output(input_path):
+    """
+    Find the expected output of an input file of the corpus,
+    outputs/solution<name>gc.txt (written by the GAC solver) if it exists,
+    else outputs/solution<name>.txt. Return None if there is neither
+    """
+    name = os.path.basename(input_path)[len("input"):-len(".txt")]
+    for candidate in ["solution" + name + "gc.txt", "solution" + name + ".txt"]:
+        path = os.path.join(ROOT, "outputs", candidate)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def corpus():
+    """
+    The puzzles of the inputs/ corpus as (name, text, expected output path)
+    """
+    puzzles = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "inputs", "input*.txt"))):
+        with open(path) as file:
+            text = file.read()
+        name = os.path.basename(path)[:-len(".txt")]
+        puzzles.append((name, text, expected_output(path)))
+    return puzzles
+
+
+def generated(sizes, reveal, seed):
+    """
+    Random puzzles of the given sizes as (name, text, None), reproducible
+    from the seed
+    """
+    rng = random.Random(seed)
+    return [("random{}_seed{}".format(size, seed),
+             random_puzzle(size, scaled_fleet(size), reveal, rng), None)
+            for size in sizes]
+
+
+def benchmark(name, text, expected, repeat, heuristic, instrument_run,
+              algorithm='GAC'):
+    """
+    Solve the puzzle repeat times and return its record for the report
+    """
+    times = []
+    for k in range(repeat):
+        seconds, nodes, propagations, output = solve_once(text, heuristic, algorithm)
+        times.append(seconds)
+
+    # the board is checked against the puzzle itself, so generated puzzles
+    # are verified too, then against the golden output of the corpus if
+    # there is one (blank lines are not significant in it)
+    if not output.split():
+        status = "no solution"
+    elif verify(text, output):
+        status = "invalid"
+    elif expected is not None:
+        with open(expected) as file:
+            status = "ok" if file.read().split() == output.split() else "mismatch"
+    else:
+        status = "ok"
+
+    result = {
+        "name": name,
+        "size": len(read_puzzle(text)[0]),
+        "times": times,
+        "min": min(times),
+        "mean": sum(times) / len(times),
+        "nodes": nodes,
+        "propagations": propagations,
+        "peak_memory": peak_memory(text, heuristic, algorithm),
+        "status": status,
+        "expected": os.path.relpath(expected, ROOT) if expected else None,
+    }
+    if instrument_run:
+        result["instrumentation"] = instrumented(text, heuristic, algorithm)
+    return result
+
+
+def import_times():
+    """
+    Import time of the battle module as `python -X importtime` reports it
+    Return its total in microseconds and the list of the modules it
+    imports, itself included, as (name, self microseconds, cumulative
+    microseconds)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import battle"],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    # modules are listed once imported, a module after the modules it
+    # imports, which are indented one level deeper
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            own, cumulative = int(fields[0]), int(fields[1])
+        except ValueError:
+            # the header line
+            continue
+        name = fields[2].strip()
+        nested = len(fields[2]) - len(fields[2].lstrip()) > 1
+        if name == "battle" and not nested:
+            # the modules imported by battle are the nested ones before it,
+            # the ones before those were imported by the interpreter
+            start = len(modules)
+            while start > 0 and modules[start - 1][3]:
+                start -= 1
+            return cumulative, [(name, own, cumulative)] + \
+                [module[:3] for module in modules[start:]]
+        modules.append((name, own, cumulative, nested))
+    return None, []
+
+
+def wall_time(command, runs):
+    """
+    Median wall time in seconds of running the command in a new process
+    """
+    times = []
+    for k in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def startup(runs):
+    """
+    Startup cost of the command line solver: the wall time of the bare
+    interpreter, of solving inputs/input_easy1.txt with battle.py (without
+    the solution cache) and the import time of its modules
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        interpreter = wall_time([sys.executable, "-c", "pass"], runs)
+        easy = wall_time([sys.executable, os.path.join(ROOT, "battle.py"),
+                          "--inputfile", os.path.join(ROOT, "inputs", "input_easy1.txt"),
+                          "--outputfile", os.path.join(directory, "solution.txt"),
+                          "--no-cache"], runs)
+    total, modules = import_times()
+    return {
+        "interpreter": interpreter,
+        "easy1": easy,
+        # time on top of the interpreter's own startup
+        "overhead": easy - interpreter,
+        "import": total / 1e6 if total is not None else None,
+        "modules": [{"name": name, "self": own / 1e6, "cumulative": cumulative / 1e6}
+                    for (name, own, cumulative) in modules],
+    }
+
+
+def print_startup(result, top=10):
+    print("\nstartup: interpreter {:.1f} ms, battle.py on input_easy1 {:.1f} ms "
+          "(+{:.1f} ms), import battle {:.1f} ms".format(
+              1e3 * result["interpreter"], 1e3 * result["easy1"],
+              1e3 * result["overhead"], 1e3 * (result["import"] or 0)))
+    print("{:<32} {:>10} {:>12}".format("slowest imports", "self (ms)", "total (ms)"))
+    for module in sorted(result["modules"], key=lambda module: -module["self"])[:top]:
+        print("{:<32} {:>10.2f} {:>12.2f}".format(
+            module["name"], 1e3 * module["self"], 1e3 * module["cumulative"]))
+
+
+def git_commit():
+    """
+    The commit of the working tree, None outside a git checkout
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """
+    Compare the report against a baseline report
+    Return the list of regressions: puzzles that got slower by more than
+    threshold (a fraction of the baseline time) or lost a correct output
+    """
+    old = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    print("\ncompared to {}".format(baseline["meta"].get("label")))
+    print("{:<22} {:>10} {:>10} {:>8} {:>10} {:>10}".format(
+        "puzzle", "old (s)", "new (s)", "ratio", "old nodes", "new nodes"))
+    for result in report["results"]:
+        if result["name"] not in old:
+            continue
+        before = old[result["name"]]
+        ratio = result["min"] / before["min"] if before["min"] else float("inf")
+        flags = []
+        # differences of a few milliseconds are timer noise
+        if ratio > 1 + threshold and result["min"] - before["min"] > 0.01:
+            flags.append("slower")
+        if before["status"] == "ok" and result["status"] != "ok":
+            flags.append(result["status"])
+        if flags:
+            regressions.append((result["name"], flags))
+        print("{:<22} {:>10.3f} {:>10.3f} {:>8.2f} {:>10} {:>10} {}".format(
+            result["name"], before["min"], result["min"], ratio,
+            before["nodes"], result["nodes"], " ".join(flags)))
+
+    if report.get("startup") and baseline.get("startup"):
+        before = baseline["startup"]["overhead"]
+        after = report["startup"]["overhead"]
+        ratio = after / before if before > 0 else float("inf")
+        # process startup is noisier than solving, ignore a few milliseconds
+        flags = ["slower"] if ratio > 1 + threshold and after - before > 0.005 else []
+        if flags:
+            regressions.append(("startup", flags))
+        print("{:<22} {:>10.3f} {:>10.3f} {:>8.2f} {:>10} {:>10} {}".format(
+            "startup", before, after, ratio, "", "", " ".join(flags)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the solver on the inputs/ corpus and on random "
+                    "puzzles of increasing size, verifying the outputs.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="The number of times each puzzle is solved.")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[20, 30],
+                        help="The sizes of the random puzzles to add to the corpus.")
+    parser.add_argument("--reveal", type=float, default=0.8,
+                        help="The fraction of cells given as hints in random puzzles.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="The seed of the random puzzles.")
+    parser.add_argument("--heuristic", choices=['random', 'fixed', 'mrv'],
+                        default='mrv', help="The variable ordering heuristic.")
+    parser.add_argument("--algorithm", choices=['GAC', 'FC', 'SAT'], default='GAC',
+                        help="Solve with backtracking and GAC, with forward "
+                             "checking or with the SAT solver.")
+    parser.add_argument("--match", type=str, default="",
+                        help="Only run the puzzles whose name contains this.")
+    parser.add_argument("--instrument", action="store_true",
+                        help="Add the solver's counters and timers to the report.")
+    parser.add_argument("--label", type=str, default=None,
+                        help="A name for the solver configuration in the report.")
+    parser.add_argument("--json", type=str, default=None,
+                        help="Write the report as JSON to this file.")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="A JSON report to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="The slowdown counted as a regression, as a fraction.")
+    parser.add_argument("--startup-runs", type=int, default=10,
+                        help="The number of runs timing the startup of battle.py "
+                             "(0: do not measure it).")
+    parser.add_argument("--startup-budget", type=float, default=None, metavar="MS",
+                        help="Count it as a regression if battle.py takes more than "
+                             "this many milliseconds over the interpreter's own "
+                             "startup to solve input_easy1.")
+    args = parser.parse_args()
+
+    puzzles = corpus() + generated(args.sizes, args.reveal, args.seed)
+    puzzles = [puzzle for puzzle in puzzles if args.match in puzzle[0]]
+
+    report = {
+        "meta": {
+            "label": args.label or git_commit(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "heuristic": args.heuristic,
+            "algorithm": args.algorithm,
+            "repeat": args.repeat,
+            "reveal": args.reveal,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+
+    print("{:<22} {:>5} {:>10} {:>10} {:>8} {:>8} {:>10} {}".format(
+        "puzzle", "size", "min (s)", "mean (s)", "nodes", "props",
+        "peak (KiB)", "status"))
+    for (name, text, expected) in puzzles:
+        result = benchmark(name, text, expected, args.repeat, args.heuristic,
+                           args.instrument, args.algorithm)
+        report["results"].append(result)
+        print("{:<22} {:>5} {:>10.3f} {:>10.3f} {:>8} {:>8} {:>10} {}".format(
+            name, result["size"], result["min"], result["mean"],
+            result["nodes"], result["propagations"],
+            result["peak_memory"] // 1024, result["status"]))
+
+    regressions = []
+    if args.startup_runs:
+        report["startup"] = startup(args.startup_runs)
+        print_startup(report["startup"])
+        overhead = 1e3 * report["startup"]["overhead"]
+        if args.startup_budget is not None and overhead > args.startup_budget:
+            print("startup over budget: {:.1f} ms > {:.1f} ms".format(
+                overhead, args.startup_budget))
+            regressions.append(("startup", ["over budget"]))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions += compare(report, baseline, args.threshold)
+    if regressions:
+        print("\n{} regression(s)".format(len(regressions)))
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
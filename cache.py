@@ -0,0 +1,147 @@
+'''On-disk cache of solved puzzles.
+
+Puzzles are identified by a hash of their content (row counts, column
+counts, fleet and hint grid), so the same puzzle submitted again, from any
+file, is answered from the cache without building the CSP. Entries hold the
+rendered solution and the stats of the solve that produced it, and are
+evicted least recently used first once the cache grows past its size bound.
+'''
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import instrument
+
+#bump when the rendering of solutions changes, so old entries are not reused
+CACHE_VERSION = 1
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "battleship",
+                            "solutions.sqlite3")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def puzzle_key(row_constraint, col_constraint, ship_count, hints):
+    '''return the hash identifying a puzzle. Ship types with no ships at the
+       end of the fleet do not change the puzzle and are ignored'''
+    fleet = list(ship_count)
+    while fleet and fleet[-1] == 0:
+        fleet.pop()
+    text = json.dumps([CACHE_VERSION, list(row_constraint), list(col_constraint),
+                       fleet, list(hints)], separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class SolutionCache:
+    '''SQLite cache mapping puzzle keys to rendered solutions.
+
+       The total size of the stored solutions is kept under max_bytes by
+       evicting the least recently used entries. Hits and misses are counted
+       in the database, so they add up across runs.
+    '''
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._max_bytes = max_bytes
+        self._db = sqlite3.connect(path, timeout=30)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                             "key TEXT PRIMARY KEY, solution TEXT NOT NULL, "
+                             "stats TEXT NOT NULL, bytes INTEGER NOT NULL, "
+                             "last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS solutions_last_used "
+                             "ON solutions (last_used)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS counters ("
+                             "name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _count(self, name):
+        self._db.execute("INSERT INTO counters VALUES (?, 1) ON CONFLICT(name) "
+                         "DO UPDATE SET value = value + 1", (name,))
+        if instrument.enabled:
+            instrument.count("cache." + name)
+
+    def get(self, key):
+        '''return (solution, stats) stored for key, None on a miss'''
+        with self._db:
+            row = self._db.execute("SELECT solution, stats FROM solutions "
+                                   "WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("miss")
+                return None
+            self._db.execute("UPDATE solutions SET last_used = ? WHERE key = ?",
+                             (time.time(), key))
+            self._count("hit")
+        return row[0], json.loads(row[1])
+
+    def put(self, key, solution, stats):
+        '''store the rendered solution of key and the stats of its solve'''
+        size = len(solution.encode())
+        if size > self._max_bytes:
+            return
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?)",
+                             (key, solution, json.dumps(stats), size, time.time()))
+            self._evict()
+
+    def _evict(self):
+        '''delete least recently used entries until the cache fits'''
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM solutions").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        evicted = 0
+        for key, size in self._db.execute("SELECT key, bytes FROM solutions "
+                                          "ORDER BY last_used").fetchall():
+            if total <= self._max_bytes:
+                break
+            self._db.execute("DELETE FROM solutions WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        self._db.execute("INSERT INTO counters VALUES ('evicted', ?) ON CONFLICT(name) "
+                         "DO UPDATE SET value = value + ?", (evicted, evicted))
+
+    def stats(self):
+        '''return the number of entries, their size and the hit/miss counters'''
+        entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) "
+                                         "FROM solutions").fetchone()
+        counters = dict(self._db.execute("SELECT name, value FROM counters"))
+        return {
+            "path": self._path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self._max_bytes,
+            "hits": counters.get("hit", 0),
+            "misses": counters.get("miss", 0),
+            "evicted": counters.get("evicted", 0),
+        }
+
+    def clear(self):
+        '''delete every entry and reset the counters'''
+        with self._db:
+            self._db.execute("DELETE FROM solutions")
+            self._db.execute("DELETE FROM counters")
+
+    def close(self):
+        self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the solution cache.")
+    parser.add_argument("--cache", type=str, default=DEFAULT_PATH,
+                        help="The cache database.")
+    parser.add_argument("--clear", action="store_true",
+                        help="Delete every entry and reset the counters.")
+    args = parser.parse_args()
+    cache = SolutionCache(args.cache)
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Client of the battleship solving service (server.py)
+
+Sends puzzle files to the server in one request and prints each solution
+as it arrives, or writes it next to the other outputs with --outdir.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix socket
+    """
+
+    def __init__(self, path, timeout=None):
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def connect(host="127.0.0.1", port=8384, unix=None, timeout=None):
+    if unix:
+        return UnixHTTPConnection(unix, timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def solve(connection, puzzles, deadline=None):
+    """
+    Send the puzzles (texts in the format battle.py reads) in one request
+    Yield the result of each puzzle as the server sends it, a dict with its
+    index, status, solution and solve time
+    Raise RuntimeError if the server rejects the request
+    """
+    headers = {"Content-Type": "text/plain"}
+    if deadline is not None:
+        headers["X-Deadline"] = str(deadline)
+    body = "\n".join(puzzle.strip() + "\n" for puzzle in puzzles)
+    connection.request("POST", "/solve", body.encode(), headers)
+    response = connection.getresponse()
+    if response.status != 200:
+        raise RuntimeError("{} {}: {}".format(response.status, response.reason,
+                                              response.read().decode().strip()))
+    while True:
+        line = response.readline()
+        if not line:
+            break
+        yield json.loads(line)
+
+
+def status(connection):
+    """
+    Return the counters of the server
+    """
+    connection.request("GET", "/status")
+    return json.loads(connection.getresponse().read())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Solve puzzles with a running solver server.")
+    parser.add_argument("inputfiles", nargs="*",
+                        help="The puzzle files, each holding one puzzle.")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="The address of the server.")
+    parser.add_argument("--port", type=int, default=8384,
+                        help="The port of the server.")
+    parser.add_argument("--unix", type=str, default=None,
+                        help="The Unix socket of the server, instead of TCP.")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="Seconds the server may spend on the request.")
+    parser.add_argument("--outdir", type=str, default=None,
+                        help="Write the solution of <name>.txt to "
+                             "solution_<name>.txt in this directory.")
+    parser.add_argument("--status", action="store_true",
+                        help="Print the counters of the server and exit.")
+    args = parser.parse_args()
+
+    connection = connect(args.host, args.port, args.unix)
+    if args.status:
+        print(json.dumps(status(connection), indent=2))
+        return
+    puzzles = []
+    for path in args.inputfiles:
+        with open(path) as file:
+            puzzles.append(file.read())
+    if not puzzles:
+        parser.error("no input file")
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    failed = False
+    try:
+        for result in solve(connection, puzzles, args.deadline):
+            path = args.inputfiles[result["index"]]
+            print("{}: {}".format(path, result["status"]), file=sys.stderr)
+            if result["status"] not in ("solved", "no solution"):
+                failed = True
+            if result["status"] == "error":
+                print(result["solution"], file=sys.stderr)
+            # a timed out puzzle comes with the cells known so far, if any
+            elif result["status"] == "timeout" and not result["solution"]:
+                continue
+            elif args.outdir:
+                name = os.path.basename(path)
+                with open(os.path.join(args.outdir, "solution_" + name), "w") as out:
+                    out.write(result["solution"])
+            else:
+                sys.stdout.write(result["solution"])
+                sys.stdout.flush()
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        sys.exit(2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from csp import Constraint, Variable
+import instrument
 
 
 class TableConstraint(Constraint):
@@ -51,6 +52,8 @@ class TableConstraint(Constraint):
         '''check if var=val has an extension to an assignment of all variables in
            constraint's scope that satisfies the constraint. Important only to
            examine values in the variable's current domain as possible extensions'''
+        if instrument.enabled:
+            instrument.count("hasSupport " + self._name)
         if var not in self.scope():
             return True   #var=val has support on any constraint it does not participate in
         # index of the variable in the scope
@@ -104,6 +107,9 @@ def findvals(remainingVars, assignment, finalTestfn, partialTestfn=lambda x: Tru
 def findvals_(remainingVars, assignment, finalTestfn, partialTestfn):
     '''findvals_ internal function with remainingVars sorted by the size of
        their current domain'''
+    if instrument.enabled:
+        instrument.count("findvals_.calls")
+        instrument.maximum("findvals_.depth", len(assignment))
     if len(remainingVars) == 0:
         return finalTestfn(assignment)
     var = remainingVars.pop()
@@ -139,6 +145,36 @@ class NValuesConstraint(Constraint):
         self._required = required_values
         self._lb = lower_bound
         self._ub = upper_bound
+        #counts of the scope cached at Variable.stamp and at the version of
+        #the scope, see counts()
+        self._stamp = None
+        self._version = None
+        self._counts = (0, 0)
+
+    def __setstate__(self, state):
+        #the cached counts belong to the Variable.stamp of another process
+        Constraint.__setstate__(self, state)
+        self._stamp = None
+        self._version = None
+
+    def setBounds(self, lower_bound, upper_bound):
+        '''change the range of the number of required values, so the
+           constraint can be reused by puzzles that only differ in it. The
+           results cached for the old range are dropped, the domains of
+           the scope may not have changed since they were computed'''
+        self._lb = lower_bound
+        self._ub = upper_bound
+        self.clearSupportCache()
+        self._stamp = None
+        self._version = None
+
+    def requiredValues(self):
+        '''return the values counted by the constraint'''
+        return self._required
+
+    def bounds(self):
+        '''return the range (lower_bound, upper_bound) of the count'''
+        return (self._lb, self._ub)
 
     def check(self):
         assignments = []
@@ -160,33 +196,60 @@ class NValuesConstraint(Constraint):
 
         return self._lb <= rv_count and self._ub >= rv_count
 
+    def varCounts(self, var):
+        '''return (must, can): must is 1 if every value in var's current
+           domain is a required value, can is 1 if any of them is'''
+        dom = var.curDomain()
+        hits = 0
+        for d in dom:
+            if d in self._required:
+                hits += 1
+        return (1 if hits == len(dom) and hits > 0 else 0, 1 if hits > 0 else 0)
+
+    def counts(self):
+        '''return the number of scope variables that must / can be assigned
+           a required value. The counts are recomputed only when some
+           variable of the scope has changed since they were last computed:
+           Variable.stamp tells if any variable has, then the version of
+           the scope if one of the scope has'''
+        if self._stamp != Variable.stamp:
+            version = self.scopeVersion()
+            if version != self._version:
+                if instrument.enabled:
+                    instrument.count("counts.recomputed " + self._name)
+                must = 0
+                can = 0
+                for v in self._scope:
+                    m, c = self.varCounts(v)
+                    must += m
+                    can += c
+                self._counts = (must, can)
+                self._version = version
+            self._stamp = Variable.stamp
+        return self._counts
+
     def hasSupport(self, var, val):
         '''check if var=val has an extension to an assignment of the
            other variable in the constraint that satisfies the constraint
 
-           HINT: check the implementation of AllDiffConstraint.hasSupport
-                 a similar approach is applicable here (but of course
-                 there are other ways as well)
+           Each of the other variables can be given a value independently,
+           so it is enough to count how many of them must take a required
+           value and how many of them can take one. With the counts cached
+           this is constant time for every value of the scope, which keeps
+           row and column constraints on large boards cheap.
         '''
-        if var not in self.scope():
+        if instrument.enabled:
+            instrument.count("hasSupport " + self._name)
+        if var not in self._scope:
             return True   #var=val has support on any constraint it does not participate in
 
-        #define the test functions for findvals
-        def valsOK(l):
-            '''tests a list of assignments which are pairs (var,val)
-               to see if they can satisfy this sum constraint'''
-            rv_count = 0
-            vals = [val for (var, val) in l]
-            for v in vals:
-                if v in self._required:
-                    rv_count += 1
-            least = rv_count + self.arity() - len(vals)
-            most =  rv_count
-            return self._lb <= least and self._ub >= most
-        varsToAssign = self.scope()
-        varsToAssign.remove(var)
-        x = findvals(varsToAssign, [(var, val)], valsOK, valsOK)
-        return x
+        #counts over the other variables of the scope
+        must, can = self.counts()
+        m, c = self.varCounts(var)
+        must -= m
+        can -= c
+        own = 1 if val in self._required else 0
+        return self._lb <= can + own and self._ub >= must + own
 
 
 class IfAllThenOneConstraint(Constraint):
@@ -202,6 +265,166 @@ class IfAllThenOneConstraint(Constraint):
         self._rv = right_values
 
 
+
+class ShipHintConstraint(Constraint):
+    '''A hint giving the ship part in one cell of the board. The ship
+       through the cell must be placed in one of a list of shapes: its
+       cells are ship parts, and every cell around it (diagonals included)
+       is water. The shapes come from the subclasses, one per kind of
+       ship part, and only use the lengths of the ships in the fleet, so
+       the hint also tells how far the ship can reach.
+
+       Each shape is a tuple of (index in the scope, value) pairs; a
+       variable of the scope that a shape does not mention can take any
+       value. Like the counts of NValuesConstraint, the values still
+       supported by some shape are cached until a variable changes.'''
+
+    def __init__(self, name, varlist, size, i, j, placements):
+        '''varlist: the variables of the board, cell (i, j) is
+           varlist[i * size + j]
+           i, j: the cell of the hint
+           placements: the (cells, water) of each way the ship can be
+           placed, lists of (row, col) cells of the board'''
+        # the cell of the hint comes first, so a hint with no placement
+        # leaves it without support
+        cells = [(i, j)]
+        index = {(i, j): 0}
+        shapes = []
+        for ship, water in placements:
+            shape = []
+            for cell, val in [(cell, 1) for cell in ship] + [(cell, 0) for cell in water]:
+                if cell not in index:
+                    index[cell] = len(cells)
+                    cells.append(cell)
+                shape.append((index[cell], val))
+            shapes.append(tuple(shape))
+        Constraint.__init__(self, name, [varlist[i * size + j] for (i, j) in cells])
+        self._name = "Hint_" + name
+        self._shapes = shapes
+        #position of each variable in the scope
+        self._position = {var: k for k, var in enumerate(self._scope)}
+        self._stamp = None
+        self._version = None
+        self._supported = []
+
+    def shapes(self):
+        '''return the shapes the ship through the hint can take'''
+        return self._shapes
+
+    def check(self):
+        for v in self._scope:
+            if not v.isAssigned():
+                return True
+        for shape in self._shapes:
+            if all(self._scope[k].getValue() == val for k, val in shape):
+                return True
+        return False
+
+    def supported(self):
+        '''return, for each variable of the scope, the set of its values
+           used by some shape that fits the current domains, None if some
+           such shape leaves the variable free. Recomputed only when some
+           variable of the scope has changed, as the counts of
+           NValuesConstraint'''
+        if self._stamp != Variable.stamp:
+            version = self.scopeVersion()
+            if version != self._version:
+                if instrument.enabled:
+                    instrument.count("supported.recomputed " + self._name)
+                supported = [set() for v in self._scope]
+                for shape in self._shapes:
+                    if not all(self._scope[k].inCurDomain(val) for k, val in shape):
+                        continue
+                    free = [True] * len(self._scope)
+                    for k, val in shape:
+                        free[k] = False
+                        if supported[k] is not None:
+                            supported[k].add(val)
+                    for k in range(len(self._scope)):
+                        if free[k]:
+                            supported[k] = None
+                self._supported = supported
+                self._version = version
+            self._stamp = Variable.stamp
+        return self._supported
+
+    def hasSupport(self, var, val):
+        '''check if var=val is part of some shape that fits the current
+           domains of the other variables'''
+        if instrument.enabled:
+            instrument.count("hasSupport " + self._name)
+        k = self._position.get(var)
+        if k is None:
+            return True   #var=val has support on any constraint it does not participate in
+        values = self.supported()[k]
+        return values is None or val in values
+
+
+def ship_placement(size, start, dir, length):
+    '''The (cells, water) of a ship of the given length starting at cell
+       start and going in the direction dir: its cells and the cells of the
+       board around it. None if the ship does not fit on the board'''
+    cells = [(start[0] + dir[0] * k, start[1] + dir[1] * k) for k in range(length)]
+    if not all(0 <= i < size and 0 <= j < size for (i, j) in cells):
+        return None
+    water = []
+    for (i, j) in cells:
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                cell = (i + di, j + dj)
+                if 0 <= cell[0] < size and 0 <= cell[1] < size \
+                        and cell not in cells and cell not in water:
+                    water.append(cell)
+    return cells, water
+
+
+class SubmarineHintConstraint(ShipHintConstraint):
+    ''''S': a ship of length 1, water all around'''
+
+    def __init__(self, varlist, size, i, j, lengths):
+        placements = [ship_placement(size, (i, j), (0, 1), 1)] if 1 in lengths else []
+        ShipHintConstraint.__init__(self, "S", varlist, size, i, j, placements)
+
+
+class ShipEndHintConstraint(ShipHintConstraint):
+    ''''<', '>', '^' or 'v': an end of a ship of length 2 or more, the
+       ship going right, left, down or up from the cell'''
+
+    # symbol -> direction the rest of the ship goes in
+    DIRECTIONS = {'<': (0, 1), '>': (0, -1), '^': (1, 0), 'v': (-1, 0)}
+
+    def __init__(self, varlist, size, i, j, symbol, lengths):
+        dir = self.DIRECTIONS[symbol]
+        placements = []
+        for length in sorted(lengths):
+            if length < 2:
+                continue
+            # the cells are listed from the top left, the start is the
+            # other end when the ship goes left or up
+            back = length - 1 if dir[0] + dir[1] < 0 else 0
+            start = (i + dir[0] * back, j + dir[1] * back)
+            placement = ship_placement(size, start, (abs(dir[0]), abs(dir[1])), length)
+            if placement is not None:
+                placements.append(placement)
+        ShipHintConstraint.__init__(self, symbol, varlist, size, i, j, placements)
+
+
+class MiddleHintConstraint(ShipHintConstraint):
+    ''''M': a part of a ship of length 3 or more other than its ends, the
+       ship being horizontal or vertical'''
+
+    def __init__(self, varlist, size, i, j, lengths):
+        placements = []
+        for dir in [(0, 1), (1, 0)]:
+            for length in sorted(lengths):
+                # the cell is the k-th part of the ship
+                for k in range(1, length - 1):
+                    placement = ship_placement(size, (i - dir[0] * k, j - dir[1] * k),
+                                               dir, length)
+                    if placement is not None:
+                        placements.append(placement)
+        ShipHintConstraint.__init__(self, "M", varlist, size, i, j, placements)
+
 def get_orientation(orientation):
     """
     Get the direction the ship would be oriented in
@@ -222,6 +445,13 @@ def get_orientation(orientation):
     return dir
 
 
+class UndeterminedShip(Exception):
+    """
+    Raised by ShipCountConstraint.usage for a ship whose extent depends on
+    cells that are not known
+    """
+
+
 class ShipCountConstraint:
     """
     Constraints on the number of each type of ship on the board.
@@ -229,7 +459,8 @@ class ShipCountConstraint:
     """
 
     def __init__(self, ship_count, size):
-        # a list of the total number of each type of ship on the board
+        # a list of the total number of each type of ship on the board,
+        # ship_count[k] is the number of ships of length k + 1
         self.ship_count = ship_count
         # size of the board
         self.size = size
@@ -244,150 +475,22 @@ class ShipCountConstraint:
         else:
             return False
 
-    def check_carrier(self, i, j, board, orient):
-        """
-        Check whether the cell (i, j) is part of a 1 x 5 ship
-        """
-        check_vars = []
-        # vertical: check value of i
-        if orient[0] == 1 or orient[0] == -1:
-            if (i + (orient[0] * 4)) > self.size - 1 \
-                    or (i + (orient[0] * 4)) < 1 \
-                    or board[-1 - ((i + (orient[0] * 4)) * self.size + j)] == 0:
-                return []
-            # if cell 5 above or below i is in the board and not water
-            else:
-                # check 5 cells to the direction to see if they are all ship parts
-                # use variable names to check
-                check_vars.append(-1 - (i * self.size + j))
-                check_vars.append(-1 - ((i + (orient[0] * 1)) * self.size + j))
-                check_vars.append(-1 - ((i + (orient[0] * 2)) * self.size + j))
-                check_vars.append(-1 - ((i + (orient[0] * 3)) * self.size + j))
-                check_vars.append(-1 - ((i + (orient[0] * 4)) * self.size + j))
-
-        # horizontal: check value of j
-        else:
-            if (j + (orient[1] * 4)) > self.size - 1 or (j + (orient[1] * 4)) < 1 or board[-1 - (i * self.size + j + (orient[1] * 4))] == 0:
-                return []
-            # if cell 5 right or left of j is in the board and not water
-            else:
-                # check all 5 cells to the direction to see if they are all ship parts
-                # use variable names to check
-                check_vars.append(-1 - (i * self.size + j))
-                check_vars.append(-1 - (i * self.size + j + (orient[1] * 1)))
-                check_vars.append(-1 - (i * self.size + j + (orient[1] * 2)))
-                check_vars.append(-1 - (i * self.size + j + (orient[1] * 3)))
-                check_vars.append(-1 - (i * self.size + j + (orient[1] * 4)))
-
-        # if all consecutive cells are ship parts, return list of checked variable names
-        if self.check_val(check_vars[0], board) and self.check_val(check_vars[1], board) and self.check_val(check_vars[2], board) and self.check_val(check_vars[3], board) and self.check_val(check_vars[4], board):
-            return check_vars
-        else:
-            return []
-
-    def check_battleship(self, i, j, board, orient):
-        """
-        Check whether the cell is part of a 1 x 4 ship
-        """
-        check_vals = []
-        # vertical: check value of i
-        if orient[0] == 1 or orient[0] == -1:
-            if (i + (orient[0] * 3)) > self.size - 1 or (i + (orient[0] * 3)) < 1 or board[-1 - ((i + (orient[0] * 3)) * self.size + j)] == 0:
-                return []
-            # if cell 4 above or below i is in the board and not water
-            else:
-                # check all 4 cells to the direction to see if they are all ship parts
-                # use variable names to check
-                check_vals.append(-1 - (i * self.size + j))
-                check_vals.append(-1 - ((i + (orient[0] * 1)) * self.size + j))
-                check_vals.append(-1 - ((i + (orient[0] * 2)) * self.size + j))
-                check_vals.append(-1 - ((i + (orient[0] * 3)) * self.size + j))
-
-        # horizontal: check value of j
-        else:
-            if (j + (orient[1] * 3)) > self.size - 1 or (j + (orient[1] * 3)) < 1 or board[-1 - (i * self.size + j + (orient[1] * 3))] == 0:
-                return []
-            # if cell 4 right or left of j is in the board and not water
-            else:
-                # check all 4 cells to the direction to see if they are all ship parts
-                # use variable names to check
-                check_vals.append(-1 - (i * self.size + j))
-                check_vals.append(-1 - (i * self.size + j + (orient[1] * 1)))
-                check_vals.append(-1 - (i * self.size + j + (orient[1] * 2)))
-                check_vals.append(-1 - (i * self.size + j + (orient[1] * 3)))
-
-        # if all consecutive cells are ship parts, return list of checked variables names
-        if self.check_val(check_vals[0], board) and self.check_val(check_vals[1], board) and self.check_val(check_vals[2], board) and self.check_val(check_vals[3], board):
-            return check_vals
-        else:
-            return []
-
-    def check_cruiser(self, i, j, board, orient):
-        """
-        Check whether the cell is part of a 1 x 3 cruiser ship
-        """
-        check_vals = []
-        # vertical: check value of i
-        if orient[0] == 1 or orient[0] == -1:
-            if (i + (orient[0] * 2)) > self.size - 1 or (i + (orient[0] * 2)) < 1 or board[-1 - ((i + (orient[0] * 2)) * self.size + j)] == 0:
-                return []
-            # if cell 3 above or below i is in the board and not water
-            else:
-                # check all 3 cells to the direction to see if they are all ship parts
-                # use variable names to check
-                check_vals.append(-1 - (i * self.size + j))
-                check_vals.append(-1 - ((i + (orient[0] * 1)) * self.size + j))
-                check_vals.append(-1 - ((i + (orient[0] * 2)) * self.size + j))
-
-        # horizontal: check value of j
-        else:
-            if (j + (orient[1] * 2)) > self.size - 1 or (j + (orient[1] * 2)) < 1 or board[-1 - (i * self.size + j + (orient[1] * 2))] == 0:
-                return []
-            # if cell 3 right or left of j is in the board and not water
-            else:
-                # check all 3 cells to the direction to see if they are all ship parts
-                check_vals.append(-1 - (i * self.size + j))
-                check_vals.append(-1 - (i * self.size + j + (orient[1] * 1)))
-                check_vals.append(-1 - (i * self.size + j + (orient[1] * 2)))
-
-        # if all consecutive cells are ship parts, return list of checked variable names
-        if self.check_val(check_vals[0], board) and self.check_val(check_vals[1], board) and self.check_val(check_vals[2], board):
-            return check_vals
-        else:
-            return []
-
-    def check_destroyer(self, i, j, board, orient):
+    def check_ship(self, i, j, board, orient):
         """
-        Check whether the cell is part of a 1 x 2 destroyer ship
+        Walk from cell (i, j) in the direction orient while the cells are
+        ship parts. Return the list of indices of the variables that make up
+        the ship
         """
-        check_vals = []
-        # vertical: check value of i
-        if orient[0] == 1 or orient[0] == -1:
-            # if cell 2 above or below i is in the board and not water
-            if (i + (orient[0] * 1)) > self.size - 1 or (i + (orient[0] * 1)) < 1 or board[-1 - ((i + (orient[0] * 1)) * self.size + j)] == 0:
-                return []
-            else:
-                # check all 2 cells to the direction to see if they are all ship parts
-                # use variable names to check
-                check_vals.append(-1 - (i * self.size + j))
-                check_vals.append(-1 - ((i + (orient[0] * 1)) * self.size + j))
-
-        # horizontal: check value of j
-        else:
-            if (j + (orient[1] * 1)) > self.size - 1 or (j + (orient[1] * 1)) < 1 or board[-1 - (i * self.size + j + (orient[1] * 1))] == 0:
-                return []
-            # if cell 2 right or left of j is in the board and not water
-            else:
-                # check all 2 cells to the direction to see if they are all ship parts
-                # use variable names to check
-                check_vals.append(-1 - (i * self.size + j))
-                check_vals.append(-1 - (i * self.size + j + (orient[1] * 1)))
-
-        # if all consecutive cells are ship parts, return list of checked variable names
-        if self.check_val(check_vals[0], board) and self.check_val(check_vals[1], board):
-            return check_vals
-        else:
-            return []
+        check_vars = [i * self.size + j]
+        i += orient[0]
+        j += orient[1]
+        # stop at the edge of the board or at the first water cell
+        while 0 <= i < self.size and 0 <= j < self.size \
+                and self.check_val(i * self.size + j, board):
+            check_vars.append(i * self.size + j)
+            i += orient[0]
+            j += orient[1]
+        return check_vars
 
     def get_type(self, i, j, board):
         """
@@ -400,85 +503,251 @@ class ShipCountConstraint:
 
         # find the possible orientation
         # check up
-        if i - 1 < 1 or board[-1 - ((i-1) * self.size + j)] == 0:
+        if i - 1 < 0 or board[(i-1) * self.size + j] == 0:
             orientation[0] = 0
         # check down
-        if i + 1 > self.size - 1 or board[-1 - ((i+1) * self.size + j)] == 0:
+        if i + 1 > self.size - 1 or board[(i+1) * self.size + j] == 0:
             orientation[1] = 0
         # check right
-        if j + 1 > self.size - 1 or board[-1 - (i * self.size + (j+1))] == 0:
+        if j + 1 > self.size - 1 or board[i * self.size + (j+1)] == 0:
             orientation[2] = 0
         # check left
-        if j - 1 < 1 or board[-1 - (i * self.size + (j-1))] == 0:
+        if j - 1 < 0 or board[i * self.size + (j-1)] == 0:
             orientation[3] = 0
 
         # get the orientation of the ship
         dir = get_orientation(orientation)
         # if there is no direction the ship is facing, 1 x 1 submarine
         if dir == (0, 0):
-            return [-1 - (i * self.size + j)], 0, dir
-        # check if the ship are any of the other types
-        else:
-            # check if carrier
-            type = self.check_carrier(i, j, board, dir)
-            if type:
-                return type, 4, dir
-            # check if battleship
-            type = self.check_battleship(i, j, board, dir)
-            if type:
-                return type, 3, dir
-            # check if cruiser
-            type = self.check_cruiser(i, j, board, dir)
-            if type:
-                return type, 2, dir
-            # check if destroyer
-            type = self.check_destroyer(i, j, board, dir)
-            if type:
-                return type, 1, dir
-        return [], -1
+            return [i * self.size + j], 0, dir
+        # the type of the ship is its length - 1
+        ship = self.check_ship(i, j, board, dir)
+        return ship, len(ship) - 1, dir
+
+    def check_partial(self, variables):
+        """
+        Check whether the ships that are already complete on a partially
+        assigned board fit in the fleet, so the search can backtrack before
+        reaching a full board with too many ships of a type
+        variables: the variables of the board, a cell is known once its
+        current domain has a single value
+        """
+        # value of each known variable, None if unknown, on the board
+        # surrounded by a border of water so the walks below stop at the
+        # edges: cell (i, j) is board[(i + 1) * size + j + 1]
+        size = self.size + 2
+        board = [0] * size
+        for i in range(self.size):
+            board.append(0)
+            for var in variables[i * self.size:(i + 1) * self.size]:
+                dom = var.curDomain()
+                board.append(dom[0] if len(dom) == 1 else None)
+            board.append(0)
+        board.extend([0] * size)
+        # number of complete ships of each type
+        count = [0] * len(self.ship_count)
+
+        for i in range(1, size - 1):
+            for j in range(1, size - 1):
+                if board[i * size + j] != 1:
+                    continue
+                # horizontal ships start at a cell with water on the left,
+                # vertical ones at a cell with water above
+                for dir in [(0, 1), (1, 0)]:
+                    if board[(i - dir[0]) * size + j - dir[1]] != 0:
+                        continue
+                    length = 0
+                    while board[(i + dir[0] * length) * size + j + dir[1] * length] == 1:
+                        length += 1
+                    # the ship is not complete yet
+                    if board[(i + dir[0] * length) * size + j + dir[1] * length] != 0:
+                        continue
+                    # a submarine is counted once, when it has water on all sides
+                    if length == 1 and (dir == (1, 0) or
+                                        board[(i - 1) * size + j] != 0 or
+                                        board[(i + 1) * size + j] != 0):
+                        continue
+                    # a ship longer than any ship in the fleet
+                    if length > len(count):
+                        if instrument.enabled:
+                            instrument.count("fleet.check_partial.fail")
+                        return False
+                    count[length - 1] += 1
+                    if count[length - 1] > self.ship_count[length - 1]:
+                        if instrument.enabled:
+                            instrument.count("fleet.check_partial.fail")
+                        return False
+        if instrument.enabled:
+            instrument.count("fleet.check_partial.pass")
+        return True
+
+    def residual_key(self, variables, assigned):
+        """
+        Key of the subproblem that is left once the first `assigned`
+        variables of the board (row by row) have been assigned. Two partial
+        assignments ending on the same row with equal keys have the same
+        number of solutions, so the count of one can be reused for the
+        other
+        The key is made of the last assigned row and its values, the number
+        of ship parts used in each column, the length of the vertical ships
+        still open on the last row, the number of complete ships of each
+        type and the current domains of the unassigned variables
+        Return None if `assigned` does not end a row
+        """
+        if assigned == 0 or assigned % self.size != 0:
+            return None
+        row = assigned // self.size - 1
+        # values of the assigned rows, with a column of water on the right
+        board = [[variables[i * self.size + j].getValue() for j in range(self.size)] + [0]
+                 for i in range(row + 1)]
+
+        # ship parts used in each column
+        used = [sum(board[i][j] for i in range(row + 1)) for j in range(self.size)]
+        # length of the vertical ship (or submarine) ending on the last row
+        open = [0] * self.size
+        # number of complete ships of each type
+        count = [0] * len(self.ship_count)
+        for i in range(0, row + 1):
+            for j in range(0, self.size):
+                # only look at the top left cell of each ship
+                if board[i][j] != 1 or (i > 0 and board[i - 1][j] == 1) \
+                        or (j > 0 and board[i][j - 1] == 1):
+                    continue
+                length = 1
+                # horizontal ship, it is complete
+                if board[i][j + 1] == 1:
+                    while board[i][j + length] == 1:
+                        length += 1
+                # vertical ship or submarine, complete unless it reaches the last row
+                else:
+                    while i + length <= row and board[i + length][j] == 1:
+                        length += 1
+                    if i + length > row:
+                        open[j] = length
+                        continue
+                while len(count) < length:
+                    count.append(0)
+                count[length - 1] += 1
+
+        future = tuple(tuple(var.curDomain()) for var in variables[assigned:])
+        return row, tuple(board[row][:self.size]), tuple(used), tuple(open), tuple(count), future
 
     def check(self, solution):
         """
         Check whether the given solution is a valid board
         given the number of ships the board should have
+        solution: the value of each variable, indexed by variable
         """
-        # dictionary containing values of each variable
-        board = {}
-        # contain variable names that have already been checked
-        checked = []
-        # keep track of the number of each type of ships
-        # submarine, destroyer, cruiser, battleship, carrier
-        count = [0, 0, 0, 0, 0]
+        # contain indices of the variables that have already been checked
+        checked = set()
+        # keep track of the number of each type of ships,
+        # count[k] is the number of ships of length k + 1
+        count = [0] * len(self.ship_count)
 
         # store possible solution and the direction each ship is oriented
-        # 0 = submarine, 1 = destroyer, 2 = cruiser, 3 = battleship, 4 = carrier
-        pos_sol = {0: [], 1: [], 2: [], 3: [], 4: []}
-        sol_dir = {0: [], 1: [], 2: [], 3: [], 4: []}
+        # 0 = submarine, 1 = destroyer, 2 = cruiser, 3 = battleship, 4 = carrier, ...
+        pos_sol = {type: [] for type in range(len(self.ship_count))}
+        sol_dir = {type: [] for type in range(len(self.ship_count))}
 
-        # store the value of each variable in dictionary
-        for var, val in solution:
-            board[int(var.name())] = val
+        board = solution
 
         # iterate through the board
-        for i in range(1, self.size - 1):
-            for j in range(1, self.size - 1):
+        for i in range(0, self.size):
+            for j in range(0, self.size):
                 # if the cell contains a part of the ship that has not been checked yet
-                if board[-1 - (i * self.size + j)] == 1 and -1 - (i * self.size + j) not in checked:
+                if board[i * self.size + j] == 1 and i * self.size + j not in checked:
                     # check the neighbouring cells to find the type of ship
                     checked_vars, type, dir = self.get_type(i, j, board)
-                    # store the variable names that have already been checked
-                    checked.extend(checked_vars)
+                    # a ship longer than any ship in the fleet
+                    if type >= len(self.ship_count):
+                        if instrument.enabled:
+                            instrument.count("fleet.check.fail (ship too long)")
+                        return False, pos_sol, sol_dir
+                    # store the indices of the variables that have already been checked
+                    checked.update(checked_vars)
                     # increase the number of ships of type
                     count[type] += 1
-                    # store the top left variable name of the ship
+                    # store the index of the top left variable of the ship
                     pos_sol[type].append(checked_vars[0])
                     # store the orientation of the ship
                     sol_dir[type].append(dir)
 
         # if the number of each ship matches the given amount,
-        # return true, the top left variable names for each ship, orientation of each ship
-        if count[0] == self.ship_count[0] and count[1] == self.ship_count[1] and count[2] == self.ship_count[2] and count[3] == self.ship_count[3] and count[4] == self.ship_count[4]:
+        # return true, the indices of the top left variables for each ship, orientation of each ship
+        if count == list(self.ship_count):
+            if instrument.enabled:
+                instrument.count("fleet.check.pass")
             return True, pos_sol, sol_dir
         else:
+            if instrument.enabled:
+                instrument.count("fleet.check.fail (wrong count)")
             return False, pos_sol, sol_dir
 
+    def usage(self, board, cells, strict=True):
+        """
+        Count the ships of a partially known board that have a part in, or
+        next to, the given cells, so the fleet can be split between parts
+        of the board solved separately
+        A ship is known once its cells and the cells next to them (not
+        diagonally) are
+        board: the value of each cell, None if unknown
+        cells: indices of cells of the board
+        strict: raise UndeterminedShip for a ship that is not known, else
+        leave it out
+        Return the number of ships of each type, None if some ship is
+        longer than any ship in the fleet or is not straight
+        """
+        size = self.size
+
+        def at(i, j):
+            # water beyond the edges
+            if 0 <= i < size and 0 <= j < size:
+                return board[i * size + j]
+            return 0
+
+        count = [0] * len(self.ship_count)
+        # the top left cell of each ship counted
+        starts = set()
+        for index in cells:
+            i, j = divmod(index, size)
+            for (a, b) in [(i, j), (i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)]:
+                if at(a, b) != 1:
+                    continue
+                horizontal = at(a, b - 1) == 1 or at(a, b + 1) == 1
+                vertical = at(a - 1, b) == 1 or at(a + 1, b) == 1
+                if horizontal and vertical:
+                    return None
+                dir = (0, 1) if horizontal else (1, 0)
+                # walk back to the top left cell, then along the ship
+                while at(a - dir[0], b - dir[1]) == 1:
+                    a, b = a - dir[0], b - dir[1]
+                if (a, b) in starts:
+                    continue
+                length = 0
+                known = True
+                while at(a + dir[0] * length, b + dir[1] * length) == 1:
+                    c, d = a + dir[0] * length, b + dir[1] * length
+                    if None in (at(c - 1, d), at(c + 1, d), at(c, d - 1), at(c, d + 1)):
+                        known = False
+                    length += 1
+                if not known:
+                    if strict:
+                        raise UndeterminedShip((a, b))
+                    continue
+                starts.add((a, b))
+                if length > len(count):
+                    return None
+                count[length - 1] += 1
+        return count
+
+    def compact(self, solution, pos_sol, sol_dir):
+        """
+        The solution in the form the search keeps it until it is printed:
+        the values of the cells as bytes, row by row, and the top left cells
+        and orientations of the ships of each type as tuples
+        solution, pos_sol, sol_dir: a board and what check returned for it
+        """
+        board = bytes(solution)
+        coord = tuple(tuple(pos_sol[type]) for type in range(len(self.ship_count)))
+        dir = tuple(tuple(sol_dir[type]) for type in range(len(self.ship_count)))
+        return board, coord, dir
@@ -16,18 +16,45 @@ class Variable:
 
     undoDict = dict()             #stores pruned values indexed by a
                                         #(variable,value) reason pair
-    def __init__(self, name, domain):
+    stamp = 0                     #incremented whenever any variable's value
+                                        #or current domain changes, so
+                                        #constraints can cache what they
+                                        #compute from the current domains
+                                        #(see also version())
+    def __init__(self, name, domain, index=None, coord=None):
         '''Create a variable object, specifying its name (a
-        string) and domain of values.
+        string) and domain of values. Optionally give it an integer
+        index (its position in the list of variables of the CSP, so
+        solutions can be flat lists of values) and the (row, col)
+        coordinates of the cell it stands for.
         '''
         self._name = name                #text name for variable
         self._dom = list(domain)         #Make a copy of passed domain
         self._curdom = list(domain)      #using list
         self._value = None
+        self._index = index
+        self._coord = coord
+        self._version = 0                #incremented whenever curDomain()
+                                         #of this variable changes
 
     def __str__(self):
         return "Variable {}".format(self._name)
 
+    def index(self):
+        '''return the integer index of the variable, None if it has none'''
+        return self._index
+
+    def coord(self):
+        '''return the (row, col) coordinates of the variable, None if it
+           has none'''
+        return self._coord
+
+    def version(self):
+        '''return the number of times curDomain() of the variable has
+           changed, by pruning or assigning values. It only grows,
+           restoring pruned values on backtrack changes it too'''
+        return self._version
+
     def domain(self):
         '''return copy of variable domain'''
         return(list(self._dom))
@@ -47,7 +74,15 @@ class Variable:
         if value != None and not value in self._dom:
             print("Error: tried to assign value {} to variable {} that is not in {}'s domain".format(value,self._name,self._name))
         else:
+            #assigning the only value left in the current domain, or
+            #unassigning it, leaves curDomain() as it was: the version
+            #only changes with what constraints can see
+            before = [self._value] if self._value is not None else self._curdom
+            after = [value] if value is not None else self._curdom
+            if before != after:
+                self._version += 1
             self._value = value
+            Variable.stamp += 1
 
     def unAssign(self):
         self.setValue(None)
@@ -83,6 +118,8 @@ class Variable:
             self._curdom.remove(value)
         except:
             print("Error: tried to prune value {} from variable {}'s domain, but value not present!".format(value, self._name))
+        self._version += 1
+        Variable.stamp += 1
         dkey = (reasonVar, reasonVal)
         if not dkey in Variable.undoDict:
             Variable.undoDict[dkey] = []
@@ -90,9 +127,13 @@ class Variable:
 
     def restoreVal(self, value):
         self._curdom.append(value)
+        self._version += 1
+        Variable.stamp += 1
 
     def restoreCurDomain(self):
         self._curdom = self.domain()
+        self._version += 1
+        Variable.stamp += 1
 
     def reset(self):
         self.restoreCurDomain()
@@ -103,7 +144,7 @@ class Variable:
 
     @staticmethod
     def clearUndoDict():
-        undoDict = dict()
+        Variable.undoDict = dict()
 
     @staticmethod
     def restoreValues(reasonVar, reasonVal):
@@ -138,10 +179,51 @@ class Constraint:
         objects).'''
         self._scope = list(scope)
         self._name = "baseClass_" + name  #override in subconstraint types!
+        #hasSupport results for the current domains of the scope, see
+        #supportCache()
+        self._cacheStamp = None
+        self._cacheVersion = None
+        self._supportCache = {}
+
+    def __setstate__(self, state):
+        #the cached results belong to the Variable.stamp of another process
+        self.__dict__.update(state)
+        self.clearSupportCache()
+
+    def clearSupportCache(self):
+        '''forget the cached hasSupport results, for when the constraint
+           itself changes rather than the domains of its scope'''
+        self._cacheStamp = None
+        self._cacheVersion = None
+        self._supportCache = {}
 
     def scope(self):
         return list(self._scope)
 
+    def scopeVersion(self):
+        '''return the sum of the versions of the scope variables. Versions
+           only grow, so the sum changes exactly when some variable of the
+           scope has changed'''
+        version = 0
+        for var in self._scope:
+            version += var._version
+        return version
+
+    def supportCache(self):
+        '''return a dict to cache hasSupport results in, keyed by
+           (var, val), and under None whether every value of the scope
+           is supported. It is emptied once a variable of the scope changes,
+           including values restored on backtrack; changes to variables
+           outside the scope keep it. Variable.stamp is checked first so
+           the scope is only summed after some variable has changed'''
+        if self._cacheStamp != Variable.stamp:
+            version = self.scopeVersion()
+            if version != self._cacheVersion:
+                self._supportCache = {}
+                self._cacheVersion = version
+            self._cacheStamp = Variable.stamp
+        return self._supportCache
+
     def arity(self):
         return len(self._scope)
 
@@ -185,23 +267,53 @@ class CSP:
         # constraint for ship count
         self._ship_count_constraint = ship_constraint
 
+        #index of each variable, so lookups do not scan the variable list
+        self._var_index = dict()
+        for i, v in enumerate(variables):
+            self._var_index[v] = i
+
         #some sanity checks
         varsInCnst = set()
         for c in constraints:
-            varsInCnst = varsInCnst.union(c.scope())
+            varsInCnst.update(c.scope())
         for v in variables:
             if v not in varsInCnst:
                 print("Warning: variable {} is not in any constraint of the CSP {}".format(v.name(), self.name()))
         for v in varsInCnst:
-            if v not in variables:
+            if v not in self._var_index:
                 print("Error: variable {} appears in constraint but specified as one of the variables of the CSP {}".format(v.name(), self.name()))
 
         self.constraints_of = [[] for i in range(len(variables))]
         for c in constraints:
             for v in c.scope():
-                i = variables.index(v)
+                i = self._var_index[v]
                 self.constraints_of[i].append(c)
 
+    def extend(self, constraints, ship_constraint):
+        '''return a CSP over the same variables with the given constraints
+           added in front of this CSP's constraints. Only the new
+           constraints are checked, this CSP was checked when it was made'''
+        csp = CSP.__new__(CSP)
+        csp.__dict__.update(self.__dict__)
+        csp._constraints = list(constraints) + self._constraints
+        csp._ship_count_constraint = ship_constraint
+
+        #lists of the variables not in a new constraint are shared
+        csp.constraints_of = list(self.constraints_of)
+        added = dict()
+        for c in constraints:
+            for v in c.scope():
+                if v not in self._var_index:
+                    print("Error: variable {} appears in constraint but specified as one of the variables of the CSP {}".format(v.name(), self.name()))
+                    continue
+                i = self._var_index[v]
+                if i not in added:
+                    added[i] = []
+                added[i].append(c)
+        for i in added:
+            csp.constraints_of[i] = added[i] + self.constraints_of[i]
+        return csp
+
     def name(self):
         return self._name
 
@@ -218,11 +330,15 @@ class CSP:
     def constraintsOf(self, var):
         '''return constraints with var in their scope'''
         try:
-            i = self.variables().index(var)
+            i = self._var_index[var]
             return list(self.constraints_of[i])
         except:
             print("Error: tried to find constraint of variable {} that isn't in this CSP {}".format(var, self.name()))
 
+    def hasVariable(self, var):
+        '''return True if var is one of the variables of this CSP'''
+        return var in self._var_index
+
     def unAssignAllVars(self):
         '''unassign all variables'''
         for v in self.variables():
@@ -0,0 +1,453 @@
+"""
+Batch solving spread over several machines
+
+A coordinator splits a corpus of puzzles into work units of a few
+puzzles each and hands them out over TCP to workers, which may run on any
+machine that reaches it. Each worker solves its units in a local pool of
+processes and sends the results back. The coordinator writes one JSON
+object per puzzle, in the order of the corpus, as in server.py:
+{"index": k, "status": "solved" | "no solution" | "timeout" | "error",
+"solution": the boards as battle.py writes them, "seconds": solve time}.
+
+The protocol is one JSON object per line each way, every request of a
+worker answered by one reply:
+- {"op": "get", "max": k}: lease at most k units. The reply holds the
+  units ({"unit": id, "puzzles": [texts]}), the timeout of a puzzle and
+  the lease time, or "wait" (seconds) if every unit left is leased, or
+  "done" once every unit has its results
+- {"op": "put", "unit": id, "results": [...]}: the results of a unit, in
+  the order of its puzzles
+- {"op": "renew"}: keep the leases of the worker
+Any request renews the leases of the worker. A unit goes back to the queue
+when its worker disconnects or its lease runs out, and is given up with an
+error after --retries such retries. A unit finished by two workers keeps
+the first results.
+
+python3 distribute.py coordinator corpus.bsa --host 0.0.0.0 --output results.jsonl
+python3 distribute.py worker --host coordinator.example --jobs 8   # on each node
+python3 distribute.py run inputs/*.txt --workers 3 --jobs 2        # all on one machine
+"""
+from battle import split_puzzles, format_puzzle, ARCHIVE_MAGIC
+from server import solve_text
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import socket
+import sys
+import time
+
+# longest line of the protocol, a unit's puzzles or results
+MAX_LINE = 64 * 1024 * 1024
+
+# seconds a worker waits before asking again when every unit is leased
+WAIT = 0.5
+
+# seconds the workers have to learn that every unit is done and
+# disconnect, before the coordinator closes their connections
+GRACE = 2.0
+
+
+def load_puzzles(paths):
+    """
+    The texts of the puzzles of the given files, in order: puzzle files
+    holding one or more puzzles separated by blank lines, or archives
+    (archive.py)
+    """
+    puzzles = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            data = file.read()
+        if data.startswith(ARCHIVE_MAGIC):
+            from archive import Archive
+            with Archive(path) as archive:
+                puzzles.extend(format_puzzle(*puzzle) for puzzle in archive)
+        else:
+            puzzles.extend(split_puzzles(data.decode()))
+    return puzzles
+
+
+def solve_unit(puzzles, timeout):
+    """
+    Solve the puzzles of a unit in a worker process, each with its own
+    timeout in seconds (None for none)
+    Return the result of each puzzle
+    """
+    results = []
+    for text in puzzles:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            status, solution, seconds = solve_text(text, deadline)
+        except Exception as error:
+            status, solution, seconds = "error", repr(error), None
+        results.append({"status": status, "solution": solution, "seconds": seconds})
+    return results
+
+
+class Coordinator:
+    """
+    Leases the units of a corpus to workers and collects their results
+    """
+
+    def __init__(self, puzzles, output, unit_size, lease, retries, timeout):
+        """
+        puzzles: the texts of the puzzles
+        output: a text stream the results are written to, in order
+        unit_size: the number of puzzles of a unit
+        lease: seconds a worker keeps a unit without a request
+        retries: the number of times a unit is leased again after its
+        worker disconnected or its lease ran out
+        timeout: seconds the workers spend on a puzzle, None for no limit
+        """
+        self.puzzles = puzzles
+        self.output = output
+        self.lease = lease
+        self.retries = retries
+        self.timeout = timeout
+        # first and last + 1 puzzle of each unit
+        self.units = [(start, min(start + unit_size, len(puzzles)))
+                      for start in range(0, len(puzzles), unit_size)]
+        # units to lease, retried ones first
+        self.waiting = collections.deque(range(len(self.units)))
+        # the worker holding each leased unit, and when its lease runs out
+        self.holder = {}
+        self.expiry = {}
+        # units leased by each connected worker, and its connection
+        self.held = {}
+        self.writers = {}
+        self.attempts = [0] * len(self.units)
+        self.results = [None] * len(puzzles)
+        # units without results, and the next result to write
+        self.left = len(self.units)
+        self.written = 0
+        self.finished = asyncio.Event()
+        self.counters = {"leased": 0, "retried": 0, "given up": 0,
+                         "duplicate": 0, "workers": 0}
+        if not self.left:
+            self.finished.set()
+
+    def get(self, worker, count):
+        units = []
+        while self.waiting and len(units) < count:
+            unit = self.waiting.popleft()
+            self.attempts[unit] += 1
+            self.holder[unit] = worker
+            self.expiry[unit] = time.monotonic() + self.lease
+            self.held[worker].add(unit)
+            self.counters["leased"] += 1
+            start, end = self.units[unit]
+            units.append({"unit": unit, "puzzles": self.puzzles[start:end]})
+        if units:
+            return {"units": units, "timeout": self.timeout, "lease": self.lease}
+        if not self.left:
+            return {"done": True}
+        return {"units": [], "wait": WAIT, "lease": self.lease}
+
+    def put(self, worker, unit, results):
+        start, end = self.units[unit]
+        if len(results) != end - start:
+            raise ValueError("unit {} has {} puzzles, not {}".format(
+                unit, end - start, len(results)))
+        if self.results[start] is not None:
+            # leased again after its lease ran out, and finished twice
+            self.counters["duplicate"] += 1
+            return
+        self._drop(unit)
+        if unit in self.waiting:
+            self.waiting.remove(unit)
+        for k, result in enumerate(results):
+            self.results[start + k] = dict(index=start + k, **result)
+        self._done()
+
+    def renew(self, worker):
+        expiry = time.monotonic() + self.lease
+        for unit in self.held[worker]:
+            self.expiry[unit] = expiry
+
+    def _drop(self, unit):
+        worker = self.holder.pop(unit, None)
+        self.expiry.pop(unit, None)
+        if worker is not None:
+            self.held[worker].discard(unit)
+
+    def release(self, unit, reason):
+        """
+        Put back a unit whose worker is gone, or give it up once it was
+        retried too often
+        """
+        self._drop(unit)
+        start, end = self.units[unit]
+        if self.results[start] is not None:
+            return
+        if self.attempts[unit] > self.retries:
+            self.counters["given up"] += 1
+            for k in range(start, end):
+                self.results[k] = {"index": k, "status": "error", "seconds": None,
+                                   "solution": "gave up after {} attempts: {}".format(
+                                       self.attempts[unit], reason)}
+            self._done()
+        else:
+            self.counters["retried"] += 1
+            self.waiting.appendleft(unit)
+
+    def _done(self):
+        self.left -= 1
+        while self.written < len(self.results) and self.results[self.written] is not None:
+            self.output.write(json.dumps(self.results[self.written]) + "\n")
+            self.written += 1
+        self.output.flush()
+        if not self.left:
+            self.finished.set()
+
+    async def expire(self):
+        """
+        Put back the units whose lease ran out, checking a few times per
+        lease
+        """
+        while True:
+            await asyncio.sleep(self.lease / 4)
+            now = time.monotonic()
+            for unit in [unit for unit, expiry in self.expiry.items() if expiry < now]:
+                self.release(unit, "lease expired")
+
+    async def handle(self, reader, writer):
+        """
+        Serve one worker, until it disconnects
+        """
+        worker = object()
+        self.held[worker] = set()
+        self.writers[worker] = writer
+        self.counters["workers"] += 1
+        reason = "worker disconnected"
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.dispatch(worker, json.loads(line))
+                except (ValueError, KeyError, TypeError, IndexError) as error:
+                    reply = {"error": str(error)}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as error:
+            reason = "worker connection failed: {}".format(error)
+        finally:
+            for unit in list(self.held[worker]):
+                self.release(unit, reason)
+            del self.held[worker]
+            del self.writers[worker]
+            writer.close()
+
+    def dispatch(self, worker, message):
+        if not self.left:
+            # a worker still solving a unit finished by another one
+            return {"done": True}
+        self.renew(worker)
+        op = message["op"]
+        if op == "get":
+            return self.get(worker, int(message.get("max", 1)))
+        if op == "put":
+            self.put(worker, int(message["unit"]), message["results"])
+            return {"ok": True}
+        if op == "renew":
+            return {"ok": True}
+        raise ValueError("unknown op {!r}".format(op))
+
+    def summary(self):
+        statuses = collections.Counter(result["status"] for result in self.results
+                                       if result is not None)
+        return dict(self.counters, **statuses)
+
+
+async def coordinate(coordinator, host, port, started=None):
+    """
+    Serve workers until every unit has its results
+    started: called with the port listened on, once listening
+    """
+    listener = await asyncio.start_server(coordinator.handle, host, port, limit=MAX_LINE)
+    port = listener.sockets[0].getsockname()[1]
+    print("coordinating {} puzzles in {} units on {}:{}".format(
+        len(coordinator.puzzles), len(coordinator.units), host, port),
+        file=sys.stderr, flush=True)
+    expire = asyncio.ensure_future(coordinator.expire())
+    try:
+        async with listener:
+            if started is not None:
+                await started(port)
+            await coordinator.finished.wait()
+            # the workers learn there is nothing left on their next
+            # request, the ones still busy are disconnected
+            limit = time.monotonic() + GRACE
+            while coordinator.writers and time.monotonic() < limit:
+                await asyncio.sleep(0.05)
+            for writer in list(coordinator.writers.values()):
+                writer.close()
+            while coordinator.writers:
+                await asyncio.sleep(0.01)
+    finally:
+        expire.cancel()
+
+
+def work(host, port, jobs):
+    """
+    Lease units from the coordinator and solve them in a pool of jobs
+    processes until the coordinator has no unit left
+    Return the number of units solved
+    """
+    connection = socket.create_connection((host, port))
+    stream = connection.makefile("rwb")
+
+    def call(message):
+        stream.write((json.dumps(message) + "\n").encode())
+        stream.flush()
+        line = stream.readline()
+        if not line:
+            raise ConnectionError("the coordinator closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError("coordinator: " + reply["error"])
+        return reply
+
+    solved = 0
+    # the unit each running future solves
+    running = {}
+    done = False
+    # renew the leases a few times per lease while solving
+    heartbeat = 5.0
+    try:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+            while running or not done:
+                wait = None
+                if not done and len(running) < jobs:
+                    reply = call({"op": "get", "max": jobs - len(running)})
+                    done = reply.get("done", False)
+                    wait = reply.get("wait")
+                    heartbeat = reply.get("lease", 3 * heartbeat) / 3
+                    for unit in reply.get("units", []):
+                        future = pool.submit(solve_unit, unit["puzzles"], reply["timeout"])
+                        running[future] = unit["unit"]
+                if not running:
+                    if wait:
+                        time.sleep(wait)
+                    continue
+                finished, pending = concurrent.futures.wait(
+                    running, timeout=wait or heartbeat,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                if not finished:
+                    done = call({"op": "renew"}).get("done", False)
+                for future in finished:
+                    unit = running.pop(future)
+                    reply = call({"op": "put", "unit": unit, "results": future.result()})
+                    done = reply.get("done", False)
+                    solved += 1
+                if done:
+                    # every unit has its results, drop the ones running
+                    for future in running:
+                        future.cancel()
+                    running.clear()
+    finally:
+        stream.close()
+        connection.close()
+    return solved
+
+
+async def run_local(coordinator, workers, jobs):
+    """
+    Coordinate with workers processes started on this machine, each with a
+    pool of jobs processes
+    """
+    processes = []
+
+    async def start(port):
+        for k in range(workers):
+            processes.append(await asyncio.create_subprocess_exec(
+                sys.executable, __file__, "worker", "--host", "127.0.0.1",
+                "--port", str(port), "--jobs", str(jobs)))
+
+    try:
+        await coordinate(coordinator, "127.0.0.1", 0, start)
+        await asyncio.wait_for(asyncio.gather(*(p.wait() for p in processes)), 10)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for process in processes:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Solve a corpus of puzzles with workers on several machines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    coordinator = commands.add_parser(
+        "coordinator", help="Hand out the puzzles of a corpus to workers.")
+    run = commands.add_parser(
+        "run", help="Coordinate workers started on this machine.")
+    for command in (coordinator, run):
+        command.add_argument("inputs", nargs="+",
+                             help="Puzzle files, several puzzles in a file separated "
+                                  "by blank lines, or archives.")
+        command.add_argument("--output", type=str, default="-",
+                             help="The file the results are written to, as JSON "
+                                  "lines (default: stdout).")
+        command.add_argument("--unit-size", type=int, default=16,
+                             help="The number of puzzles of a work unit.")
+        command.add_argument("--lease", type=float, default=30.0,
+                             help="Seconds a unit stays with a worker that sends "
+                                  "nothing; workers renew their leases while solving.")
+        command.add_argument("--retries", type=int, default=2,
+                             help="Times a unit is leased again after its worker "
+                                  "died, before it is given up.")
+        command.add_argument("--timeout", type=float, default=None,
+                             help="Seconds the workers spend on a puzzle.")
+    coordinator.add_argument("--host", type=str, default="127.0.0.1",
+                             help="The address to listen on (0.0.0.0 for workers "
+                                  "on other machines).")
+    coordinator.add_argument("--port", type=int, default=8385,
+                             help="The port to listen on (0: any free port).")
+    run.add_argument("--workers", type=int, default=2,
+                     help="The number of worker processes, standing for nodes.")
+    run.add_argument("--jobs", type=int, default=1,
+                     help="The size of the process pool of each worker.")
+    worker = commands.add_parser("worker", help="Solve units of a coordinator.")
+    worker.add_argument("--host", type=str, default="127.0.0.1",
+                        help="The address of the coordinator.")
+    worker.add_argument("--port", type=int, default=8385,
+                        help="The port of the coordinator.")
+    worker.add_argument("--jobs", type=int, default=1,
+                        help="The number of processes solving units.")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        try:
+            work(args.host, args.port, args.jobs)
+        except (ConnectionError, RuntimeError) as error:
+            print(error, file=sys.stderr)
+            sys.exit(1)
+        return
+
+    if args.unit_size < 1:
+        parser.error("--unit-size must be at least 1")
+    output = sys.stdout if args.output == '-' else open(args.output, "w")
+    try:
+        coordinator = Coordinator(load_puzzles(args.inputs), output, args.unit_size,
+                                  args.lease, args.retries, args.timeout)
+        if args.command == "run":
+            asyncio.run(run_local(coordinator, args.workers, args.jobs))
+        else:
+            asyncio.run(coordinate(coordinator, args.host, args.port))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    summary = coordinator.summary()
+    print(json.dumps(summary), file=sys.stderr)
+    sys.exit(0 if summary.get("timeout", 0) + summary.get("error", 0) == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
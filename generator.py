@@ -0,0 +1,230 @@
+from battle import format_puzzle, build_csp
+from backtracking import bt_search
+from constraints import NValuesConstraint
+from csp import CSP
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+
+
+def random_fleet_board(size, ship_count, rng, attempts=1000):
+    """
+    Place the fleet at random on a size x size board so that no two ships
+    touch, not even diagonally
+    ship_count: ship_count[k] is the number of ships of length k + 1
+    Return the board as a list of rows of ship symbols and '.' for water
+    """
+    for attempt in range(attempts):
+        board = [['.'] * size for i in range(size)]
+        placed = True
+        # place the longest ships first, they are the hardest to fit
+        for type in reversed(range(len(ship_count))):
+            for k in range(ship_count[type]):
+                if not place_ship(board, type + 1, rng, attempts):
+                    placed = False
+                    break
+            if not placed:
+                break
+        if placed:
+            return board
+    raise ValueError("could not place the fleet on a {0}x{0} board".format(size))
+
+
+def place_ship(board, length, rng, attempts):
+    """
+    Place a ship of the given length on the board at a random free position
+    Return False if no free position was found
+    """
+    size = len(board)
+    for attempt in range(attempts):
+        # orientation of the ship, down or right
+        dir = rng.choice([(1, 0), (0, 1)])
+        i = rng.randrange(size - dir[0] * (length - 1))
+        j = rng.randrange(size - dir[1] * (length - 1))
+        cells = [(i + dir[0] * k, j + dir[1] * k) for k in range(length)]
+        # every cell of the ship and its neighbours must be water
+        free = True
+        for (ci, cj) in cells:
+            for ni in range(max(ci - 1, 0), min(ci + 2, size)):
+                for nj in range(max(cj - 1, 0), min(cj + 2, size)):
+                    if board[ni][nj] != '.':
+                        free = False
+        if not free:
+            continue
+        if length == 1:
+            board[i][j] = 'S'
+        else:
+            for (ci, cj) in cells:
+                board[ci][cj] = 'M'
+            board[i][j] = '^' if dir[0] else '<'
+            board[cells[-1][0]][cells[-1][1]] = 'v' if dir[0] else '>'
+        return True
+    return False
+
+
+def scaled_fleet(size):
+    """
+    The fleet of a 10x10 puzzle (4 submarines, 3 destroyers, 2 cruisers,
+    1 battleship) scaled to the area of the board at half the density
+    """
+    return [max(1, round(count * size * size / 200)) for count in [4, 3, 2, 1]]
+
+
+def ship_cells(solution, size):
+    """
+    The set of (row, column) cells of the board that are ship parts in a
+    solution returned by the solver
+    size: the size of the board
+    """
+    cells = set()
+    for index in range(len(solution)):
+        if solution[index] == 1:
+            cells.add((index // size, index % size))
+    return cells
+
+
+def other_solution(row_constraint, col_constraint, ship_count, hints, ships):
+    """
+    Look for a solution of the puzzle other than the one with the given
+    ship cells. Every solution has the same number of ship parts (the sum
+    of the row counts), so any other solution has water on at least one of
+    these cells
+    Return the ship cells of the other solution, None if the given one is
+    the only solution
+    """
+    csp, size = build_csp(row_constraint, col_constraint, ship_count, hints)
+    variables = csp.variables()
+    scope = [variables[i * size + j] for (i, j) in sorted(ships)]
+    other = NValuesConstraint('other', scope, [1], 0, len(scope) - 1)
+    csp = CSP(csp.name(), variables, csp.constraints() + [other],
+              csp.ship_count_constraint())
+    solutions = bt_search('GAC', csp, 'mrv', False, False).solutions
+    if not solutions:
+        return None
+    return ship_cells(solutions[0][0], size)
+
+
+def make_puzzle(size, ship_count, hints, seed, unique=False):
+    """
+    Make a random puzzle
+    size: the size of the board
+    ship_count: ship_count[k] is the number of ships of length k + 1
+    hints: the number of cells given as hints, fewer hints make a harder
+    puzzle
+    seed: the seed of the puzzle, the same seed always gives the same puzzle
+    unique: if True, more hints are given until the puzzle has exactly one
+    solution, each one chosen where the solutions found so far differ
+    Return the puzzle in the format battle.py parses
+    """
+    rng = random.Random("{}:{}:{}:{}".format(seed, size, ship_count, hints))
+    board = random_fleet_board(size, ship_count, rng)
+    row_constraint = [sum(cell != '.' for cell in row) for row in board]
+    col_constraint = [sum(board[i][j] != '.' for i in range(size))
+                      for j in range(size)]
+    grid = [['0'] * size for i in range(size)]
+    cells = [(i, j) for i in range(size) for j in range(size)]
+    for (i, j) in rng.sample(cells, min(hints, len(cells))):
+        grid[i][j] = board[i][j]
+
+    if unique:
+        ships = set((i, j) for (i, j) in cells if board[i][j] != '.')
+        while True:
+            other = other_solution(row_constraint, col_constraint, ship_count,
+                                   ["".join(row) for row in grid], ships)
+            if other is None:
+                break
+            # reveal a cell that tells the two solutions apart
+            (i, j) = rng.choice(sorted(ships ^ other))
+            grid[i][j] = board[i][j]
+
+    return format_puzzle(row_constraint, col_constraint, ship_count,
+                         ["".join(row) for row in grid])
+
+
+def random_puzzle(size, ship_count, reveal, rng):
+    """
+    Make a random puzzle with the given fraction of cells revealed as hints
+    """
+    return make_puzzle(size, ship_count, int(reveal * size * size),
+                       rng.randrange(2 ** 32))
+
+
+def _make(job):
+    # multiprocessing needs a module level function
+    return make_puzzle(*job)
+
+
+def generate(size, ship_count, hints, seed, count, unique=False, jobs=1):
+    """
+    Yield count puzzles in order. Puzzle k is made from the seed (seed, k),
+    so the output does not depend on the number of worker processes
+    """
+    work = [(size, ship_count, hints, "{}-{}".format(seed, k), unique)
+            for k in range(count)]
+    if jobs == 1:
+        for job in work:
+            yield _make(job)
+    else:
+        chunksize = max(1, min(64, count // (4 * jobs)))
+        with multiprocessing.Pool(jobs) as pool:
+            for puzzle in pool.imap(_make, work, chunksize):
+                yield puzzle
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate random battleship puzzles.")
+    parser.add_argument("--size", type=int, default=10,
+                        help="The size of the board.")
+    parser.add_argument("--fleet", type=int, nargs="+", default=None,
+                        help="The number of ships of length 1, 2, 3, ... "
+                             "(default: scaled to the size of the board).")
+    parser.add_argument("--hints", type=int, default=None,
+                        help="The number of cells given as hints "
+                             "(default: a fifth of the board).")
+    parser.add_argument("--unique", action="store_true",
+                        help="Add hints until the puzzle has a unique solution.")
+    parser.add_argument("--count", type=int, default=1,
+                        help="The number of puzzles.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="The seed of the puzzles.")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="The number of worker processes (0: one per CPU).")
+    parser.add_argument("--outdir", type=str, default=None,
+                        help="Write each puzzle to input<k>.txt in this directory "
+                             "instead of streaming them to stdout separated by "
+                             "blank lines.")
+    parser.add_argument("--archive", type=str, default=None,
+                        help="Write the puzzles to this indexed archive (see "
+                             "archive.py) instead of text.")
+    args = parser.parse_args()
+
+    fleet = args.fleet or scaled_fleet(args.size)
+    hints = args.hints if args.hints is not None else args.size * args.size // 5
+    jobs = args.jobs or os.cpu_count()
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    puzzles = generate(args.size, fleet, hints, args.seed, args.count,
+                       args.unique, jobs)
+    if args.archive:
+        from archive import ArchiveWriter
+        with ArchiveWriter(args.archive) as out:
+            for puzzle in puzzles:
+                out.add_text(puzzle)
+        return
+    for k, puzzle in enumerate(puzzles):
+        if args.outdir:
+            with open(os.path.join(args.outdir, "input{}.txt".format(k)), "w") as file:
+                file.write(puzzle)
+        else:
+            if k:
+                sys.stdout.write("\n")
+            sys.stdout.write(puzzle)
+            sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+'''Optional counters and timers for the hot paths of the solver.
+
+Instrumentation is off by default. Every call site tests the module level
+flag `enabled` before recording anything, so while it is off an event costs
+one attribute lookup. Turn it on with enable(), solve, and read the results
+with report() (a JSON friendly dict) or summary() (a text table).
+
+Counters are named "<area>.<event>" and, where it matters, suffixed with the
+name of the constraint involved, e.g. "gac.prune NValues_row".
+'''
+import time
+
+enabled = False
+
+#name -> number of events
+counters = dict()
+#name -> largest value seen
+maxima = dict()
+#name -> [number of timed calls, total seconds]
+timers = dict()
+
+
+def enable():
+    '''reset all counters and start recording'''
+    global enabled
+    reset()
+    enabled = True
+
+
+def disable():
+    '''stop recording, the results so far are kept'''
+    global enabled
+    enabled = False
+
+
+def reset():
+    counters.clear()
+    maxima.clear()
+    timers.clear()
+
+
+def count(name, n=1):
+    counters[name] = counters.get(name, 0) + n
+
+
+def maximum(name, value):
+    if value > maxima.get(name, value - 1):
+        maxima[name] = value
+
+
+def add_time(name, seconds):
+    timer = timers.get(name)
+    if timer is None:
+        timers[name] = [1, seconds]
+    else:
+        timer[0] += 1
+        timer[1] += seconds
+
+
+def clock():
+    return time.perf_counter()
+
+
+def report():
+    '''return the recorded counters, maxima and timers as a dict'''
+    return {
+        "counters": dict(sorted(counters.items())),
+        "maxima": dict(sorted(maxima.items())),
+        "timers": {name: {"calls": calls, "seconds": seconds}
+                   for name, (calls, seconds) in sorted(timers.items())},
+    }
+
+
+def summary():
+    '''return the recorded counters, maxima and timers as a text table'''
+    lines = ["{:<44} {:>12}".format("counter", "value")]
+    for name, value in sorted(counters.items()):
+        lines.append("{:<44} {:>12}".format(name, value))
+    for name, value in sorted(maxima.items()):
+        lines.append("{:<44} {:>12}".format(name + " (max)", value))
+    if timers:
+        lines.append("")
+        lines.append("{:<32} {:>10} {:>12} {:>10}".format(
+            "timer", "calls", "total (s)", "mean (us)"))
+        for name, (calls, seconds) in sorted(timers.items()):
+            lines.append("{:<32} {:>10} {:>12.4f} {:>10.2f}".format(
+                name, calls, seconds, 1e6 * seconds / calls))
+    return "\n".join(lines)
+
+
+def dump(path):
+    '''write report() as JSON to path'''
+    #json is only needed here, keep it out of the solver's startup
+    import json
+    with open(path, "w") as file:
+        json.dump(report(), file, indent=2)
@@ -0,0 +1,501 @@
+"""
+SAT backend of the solver
+
+The 0/1 cell model of battle.py is compiled into CNF: every cell is a
+boolean variable, the count constraints become sequential counters, the
+hints and the fleet become clauses over the cells and over one auxiliary
+variable per possible ship placement. The CNF is solved by a small
+conflict-driven clause learning (CDCL) solver: two watched literals per
+clause, first-UIP learning with backjumping, VSIDS decisions with phase
+saving, and Luby restarts.
+
+bt_search('SAT', ...) uses this module; the solutions are checked by the
+ship count constraint like the ones of GAC.
+"""
+import heapq
+import itertools
+
+from constraints import (TableConstraint, NValuesConstraint, ShipHintConstraint)
+
+
+class CNF:
+    """
+    A formula in conjunctive normal form. Variables are numbered from 1, a
+    literal is a variable (true) or its negation (false), a clause is a
+    list of literals
+    """
+
+    def __init__(self, nvars=0):
+        self.nvars = nvars
+        self.clauses = []
+
+    def new_var(self):
+        self.nvars += 1
+        return self.nvars
+
+    def add(self, clause):
+        self.clauses.append(list(clause))
+
+    def cardinality(self, lits, lower, upper):
+        """
+        Between lower and upper of the literals are true
+        The common cases are single clauses; the others use a sequential
+        counter, r[i][j] being true exactly when at least j + 1 of the
+        first i + 1 literals are true. It counts up to upper + 1 (or lower,
+        without an upper bound), so its size is the number of literals
+        times the bound
+        """
+        n = len(lits)
+        lower = max(lower, 0)
+        upper = min(upper, n)
+        if lower > upper:
+            self.add([])
+            return
+        if lower == 0 and upper == n:
+            return
+        if upper == 0:
+            for lit in lits:
+                self.add([-lit])
+            return
+        if lower == n:
+            for lit in lits:
+                self.add([lit])
+            return
+        if lower == 0 and upper == n - 1:
+            self.add([-lit for lit in lits])
+            return
+        if lower == 1 and upper == n:
+            self.add(lits)
+            return
+
+        width = upper + 1 if upper < n else lower
+        # the counter of the literals seen so far, None for counts that
+        # cannot be reached yet
+        prev = []
+        for i, x in enumerate(lits):
+            cur = [self.new_var() for j in range(min(i + 1, width))]
+            for j in range(len(cur)):
+                below = prev[j] if j < len(prev) else None
+                carry = prev[j - 1] if j > 0 else None
+                # at least j + 1 before, or x and at least j before
+                if below is not None:
+                    self.add([-below, cur[j]])
+                if j == 0:
+                    self.add([-x, cur[j]])
+                elif carry is not None:
+                    self.add([-x, -carry, cur[j]])
+                # and only then
+                if below is not None:
+                    self.add([-cur[j], below, x])
+                else:
+                    self.add([-cur[j], x])
+                if j > 0:
+                    if below is not None:
+                        self.add([-cur[j], below, carry])
+                    else:
+                        self.add([-cur[j], carry])
+            prev = cur
+        if upper < n:
+            self.add([-prev[upper]])
+        if lower > 0:
+            self.add([prev[lower - 1]])
+
+
+def encode(csp):
+    """
+    Compile the CSP of a puzzle into CNF. Variable k + 1 stands for
+    csp.variables()[k] having the value 1
+    Raise ValueError for a variable that is not 0/1 or a constraint that
+    cannot be compiled
+    """
+    variables = csp.variables()
+    cnf = CNF(len(variables))
+    lit = {}
+    for k, var in enumerate(variables):
+        if not set(var.domain()) <= {0, 1}:
+            raise ValueError("{} is not a 0/1 variable".format(var.name()))
+        lit[var] = k + 1
+        # the values pruned before the search, e.g. by a Session
+        dom = var.curDomain()
+        if len(dom) == 1:
+            cnf.add([lit[var] if dom[0] == 1 else -lit[var]])
+
+    for c in csp.constraints():
+        if isinstance(c, NValuesConstraint):
+            required = c.requiredValues()
+            lower, upper = c.bounds()
+            lits = []
+            # variables whose every value is required are counted already
+            always = 0
+            for var in c.scope():
+                if 0 in required and 1 in required:
+                    always += 1
+                elif 1 in required:
+                    lits.append(lit[var])
+                elif 0 in required:
+                    lits.append(-lit[var])
+            cnf.cardinality(lits, lower - always, upper - always)
+        elif isinstance(c, TableConstraint):
+            scope = c.scope()
+            # forbid every assignment of the scope that is not in the table
+            for values in itertools.product([0, 1], repeat=len(scope)):
+                if list(values) not in c.satAssignments:
+                    cnf.add([-lit[var] if val == 1 else lit[var]
+                             for var, val in zip(scope, values)])
+        elif isinstance(c, ShipHintConstraint):
+            scope = c.scope()
+            # one selector per shape, some shape is used
+            selectors = []
+            for shape in c.shapes():
+                s = cnf.new_var()
+                selectors.append(s)
+                for k, val in shape:
+                    cnf.add([-s, lit[scope[k]] if val == 1 else -lit[scope[k]]])
+            cnf.add(selectors)
+        else:
+            raise ValueError("cannot compile {} to CNF".format(c.name()))
+
+    fleet = csp.ship_count_constraint()
+    if fleet is not None:
+        cells = {var.coord(): lit[var] for var in variables}
+        encode_fleet(cnf, fleet.ship_count, fleet.size, lambda i, j: cells[(i, j)])
+    return cnf
+
+
+def encode_fleet(cnf, ship_count, size, cell):
+    """
+    The number of ships of each length. Ships do not touch, even
+    diagonally (the diagonal constraints), so every group of ship parts is
+    a straight run. Each place a run of a length can be found at gets a
+    variable, true exactly when the run is there; the number of true ones
+    is the number of ships of that length
+    cell: the literal of cell (i, j)
+    """
+    for length in range(1, len(ship_count) + 1):
+        placements = []
+        # a submarine has water on all four sides, a longer ship is counted
+        # along its direction
+        dirs = [(0, 1)] if length == 1 else [(0, 1), (1, 0)]
+        for (di, dj) in dirs:
+            for i in range(size - di * (length - 1)):
+                for j in range(size - dj * (length - 1)):
+                    parts = [cell(i + di * k, j + dj * k) for k in range(length)]
+                    ends = [(i - di, j - dj), (i + di * length, j + dj * length)]
+                    if length == 1:
+                        ends = [(i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)]
+                    water = [-cell(a, b) for (a, b) in ends
+                             if 0 <= a < size and 0 <= b < size]
+                    p = cnf.new_var()
+                    for x in parts + water:
+                        cnf.add([-p, x])
+                    cnf.add([p] + [-x for x in parts + water])
+                    placements.append(p)
+        count = ship_count[length - 1]
+        cnf.cardinality(placements, count, count)
+
+
+def luby(i):
+    """
+    The i-th term (from 0) of the Luby sequence 1 1 2 1 1 2 4 1 1 2 ...
+    """
+    size, seq = 1, 0
+    while size < i + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) // 2
+        seq -= 1
+        i = i % size
+    return 2 ** seq
+
+
+class SatSolver:
+    """
+    CDCL SAT solver. Internally literal 2v stands for variable v being
+    true and 2v + 1 for it being false, so the negation of l is l ^ 1
+    Clauses are added with add_clause, in the signed form of CNF, between
+    calls to solve
+    """
+
+    # conflicts before the first restart, multiplied by the Luby sequence
+    RESTART_BASE = 100
+    # decay of the VSIDS activities
+    DECAY = 0.95
+
+    def __init__(self, nvars):
+        self.nvars = nvars
+        # value of each literal: True, False or None when unassigned
+        self.value = [None] * (2 * nvars + 2)
+        self.level = [0] * (nvars + 1)
+        # the clause that implied each variable, None for decisions
+        self.reason = [None] * (nvars + 1)
+        # watches[l]: the clauses watching literal l, visited when l
+        # becomes false
+        self.watches = [[] for l in range(2 * nvars + 2)]
+        self.trail = []
+        # position in the trail where each decision level starts
+        self.trail_lim = []
+        self.qhead = 0
+        self.activity = [0.0] * (nvars + 1)
+        self.var_inc = 1.0
+        # sign of the last value of each variable, water first
+        self.polarity = [1] * (nvars + 1)
+        self.heap = [(0.0, v) for v in range(1, nvars + 1)]
+        self.seen = [False] * (nvars + 1)
+        # False once the clauses are known to be unsatisfiable
+        self.ok = True
+        self.learnts = 0
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+        self.model = None
+
+    def lit_value(self, x):
+        """
+        The value of the signed literal x, None if it is not assigned
+        """
+        return self.value[2 * x if x > 0 else -2 * x + 1]
+
+    def add_clause(self, clause):
+        """
+        Add a clause, given in the signed form, at decision level 0
+        Return False if the clauses became unsatisfiable
+        """
+        if not self.ok:
+            return False
+        self.cancel_until(0)
+        lits = []
+        for x in clause:
+            l = 2 * x if x > 0 else -2 * x + 1
+            if self.value[l] is True or l ^ 1 in lits:
+                return True
+            if self.value[l] is None and l not in lits:
+                lits.append(l)
+        if not lits:
+            self.ok = False
+        elif len(lits) == 1:
+            self.enqueue(lits[0], None)
+            self.ok = self.propagate() is None
+        else:
+            self.attach(lits)
+        return self.ok
+
+    def attach(self, c):
+        self.watches[c[0]].append(c)
+        self.watches[c[1]].append(c)
+
+    def enqueue(self, l, reason):
+        v = l >> 1
+        self.value[l] = True
+        self.value[l ^ 1] = False
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.trail.append(l)
+
+    def propagate(self):
+        """
+        Unit propagation of the literals on the trail not yet propagated
+        Return the conflicting clause, None if there is none
+        """
+        value = self.value
+        watches = self.watches
+        trail = self.trail
+        while self.qhead < len(trail):
+            p = trail[self.qhead]
+            self.qhead += 1
+            self.propagations += 1
+            false = p ^ 1
+            ws = watches[false]
+            i = j = 0
+            n = len(ws)
+            while i < n:
+                c = ws[i]
+                i += 1
+                # keep the false literal second
+                if c[0] == false:
+                    c[0] = c[1]
+                    c[1] = false
+                first = c[0]
+                if value[first] is True:
+                    ws[j] = c
+                    j += 1
+                    continue
+                # look for another literal to watch
+                for k in range(2, len(c)):
+                    if value[c[k]] is not False:
+                        c[1] = c[k]
+                        c[k] = false
+                        watches[c[1]].append(c)
+                        break
+                else:
+                    ws[j] = c
+                    j += 1
+                    if value[first] is False:
+                        # conflict, keep the clauses not visited
+                        while i < n:
+                            ws[j] = ws[i]
+                            j += 1
+                            i += 1
+                        del ws[j:]
+                        self.qhead = len(trail)
+                        return c
+                    self.enqueue(first, c)
+            del ws[j:]
+        return None
+
+    def bump(self, v):
+        self.activity[v] += self.var_inc
+        if self.activity[v] > 1e100:
+            # rescale every activity, the order stays the same
+            self.activity = [a * 1e-100 for a in self.activity]
+            self.var_inc *= 1e-100
+            self.heap = [(-self.activity[u], u) for u in range(1, self.nvars + 1)
+                         if self.value[2 * u] is None]
+            heapq.heapify(self.heap)
+        heapq.heappush(self.heap, (-self.activity[v], v))
+
+    def analyze(self, confl):
+        """
+        Learn the first UIP clause of the conflict
+        Return the clause, its asserting literal first, and the level to
+        backjump to
+        """
+        seen = self.seen
+        level = self.level
+        trail = self.trail
+        current = len(self.trail_lim)
+        learnt = [None]
+        pending = 0
+        p = None
+        index = len(trail) - 1
+        while True:
+            # the implied literal of a reason is its first one
+            for q in (confl if p is None else confl[1:]):
+                v = q >> 1
+                if not seen[v] and level[v] > 0:
+                    self.bump(v)
+                    seen[v] = True
+                    if level[v] >= current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while not seen[trail[index] >> 1]:
+                index -= 1
+            p = trail[index]
+            index -= 1
+            confl = self.reason[p >> 1]
+            seen[p >> 1] = False
+            pending -= 1
+            if pending == 0:
+                break
+        learnt[0] = p ^ 1
+
+        # drop the literals implied by the others of the clause
+        kept = [learnt[0]]
+        for q in learnt[1:]:
+            r = self.reason[q >> 1]
+            if r is None or not all(seen[x >> 1] or level[x >> 1] == 0 for x in r[1:]):
+                kept.append(q)
+        for q in learnt[1:]:
+            seen[q >> 1] = False
+
+        if len(kept) == 1:
+            return kept, 0
+        # watch the literal of the highest level after the asserting one
+        best = max(range(1, len(kept)), key=lambda k: level[kept[k] >> 1])
+        kept[1], kept[best] = kept[best], kept[1]
+        return kept, level[kept[1] >> 1]
+
+    def cancel_until(self, target):
+        """
+        Undo the assignments of the decision levels above target
+        """
+        if len(self.trail_lim) <= target:
+            return
+        value = self.value
+        start = self.trail_lim[target]
+        for l in reversed(self.trail[start:]):
+            v = l >> 1
+            value[l] = None
+            value[l ^ 1] = None
+            self.reason[v] = None
+            self.polarity[v] = l & 1
+            heapq.heappush(self.heap, (-self.activity[v], v))
+        del self.trail[start:]
+        del self.trail_lim[target:]
+        self.qhead = len(self.trail)
+        # stale entries pile up on the heap, rebuild it now and then
+        if len(self.heap) > 4 * self.nvars + 100:
+            self.heap = [(-self.activity[u], u) for u in range(1, self.nvars + 1)
+                         if value[2 * u] is None]
+            heapq.heapify(self.heap)
+
+    def pick(self):
+        """
+        The unassigned variable of highest activity, None if all are
+        assigned
+        """
+        heap = self.heap
+        while heap:
+            a, v = heapq.heappop(heap)
+            if self.value[2 * v] is None and -a == self.activity[v]:
+                return v
+        return None
+
+    def solve(self, on_decision=None):
+        """
+        Look for an assignment satisfying the clauses
+        on_decision: called before each decision, it may raise to stop
+        the search
+        Return True and leave the assignment in self.model (the value of
+        each variable, indexed from 1) or return False
+        """
+        if not self.ok:
+            return False
+        self.cancel_until(0)
+        if self.propagate() is not None:
+            self.ok = False
+            return False
+        restarts = 0
+        while True:
+            result = self.search(self.RESTART_BASE * luby(restarts), on_decision)
+            if result is not None:
+                return result
+            restarts += 1
+
+    def search(self, budget, on_decision):
+        """
+        Search until budget conflicts
+        Return True or False when the search is over, None to restart
+        """
+        conflicts = 0
+        while True:
+            confl = self.propagate()
+            if confl is not None:
+                self.conflicts += 1
+                conflicts += 1
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learnt, back = self.analyze(confl)
+                self.cancel_until(back)
+                if len(learnt) == 1:
+                    self.enqueue(learnt[0], None)
+                else:
+                    self.attach(learnt)
+                    self.learnts += 1
+                    self.enqueue(learnt[0], learnt)
+                self.var_inc /= self.DECAY
+                continue
+            if conflicts >= budget:
+                self.cancel_until(0)
+                return None
+            v = self.pick()
+            if v is None:
+                self.model = [None] + [self.value[2 * u] for u in range(1, self.nvars + 1)]
+                return True
+            if on_decision is not None:
+                on_decision()
+            self.decisions += 1
+            self.trail_lim.append(len(self.trail))
+            self.enqueue(2 * v + self.polarity[v], None)
@@ -0,0 +1,278 @@
+"""
+Battleship solving service
+
+An asyncio HTTP server, on localhost or on a Unix socket, that solves
+puzzles in the format battle.py reads. The solves are CPU bound and run in
+a pool of worker processes; the event loop only parses requests and
+streams the results back.
+
+POST /solve takes one or more puzzles separated by blank lines and answers
+with one JSON object per line, sent as each puzzle is solved:
+{"index": k, "status": "solved" | "no solution" | "timeout" | "error",
+"solution": the boards as battle.py writes them, "seconds": solve time}.
+The X-Deadline header gives the number of seconds the whole request may
+take; the workers stop searching at the deadline and report the puzzles
+not solved by then as timed out, with the cells known so far ('?' for the
+others) as their solution.
+At most --queue puzzles are admitted at a time (running or waiting for a
+worker); a request that would go past that is rejected with 429 and a
+Retry-After header, and a request with more puzzles than --queue, which
+would never fit, with 413.
+GET /status returns the server's counters as JSON.
+"""
+from battle import (read_puzzle, split_puzzles, build_csp, solve,
+                    render_solutions, render_partial)
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import signal
+import time
+
+# requests larger than this are rejected with 413
+MAX_BODY = 16 * 1024 * 1024
+
+# seconds past the deadline the server waits for the workers to report
+# their partial boards, before giving up on them
+GRACE = 1.0
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 411: "Length Required",
+           413: "Payload Too Large", 429: "Too Many Requests"}
+
+
+def solve_text(text, deadline):
+    """
+    Solve a puzzle in a worker process
+    deadline: the time.monotonic() value the search stops at, the clock is
+    shared by the processes of the machine
+    Return (status, rendered solution, seconds)
+    """
+    t0 = time.perf_counter()
+    try:
+        csp, size = build_csp(*read_puzzle(text))
+    except ValueError as error:
+        return "error", str(error), 0.0
+    result = solve(csp, False, deadline)
+    if result.status == 'timeout':
+        return "timeout", render_partial(result.partial, size), time.perf_counter() - t0
+    text = render_solutions(result.solutions, size)
+    return ("solved" if result.solutions else "no solution"), text, time.perf_counter() - t0
+
+
+class SolverServer:
+    """
+    Admits requests, dispatches their puzzles to the worker processes and
+    streams the results back
+    """
+
+    def __init__(self, jobs, queue, timeout):
+        # jobs: number of worker processes
+        # queue: number of puzzles admitted at a time
+        # timeout: deadline of requests without an X-Deadline header
+        self.pool = concurrent.futures.ProcessPoolExecutor(jobs)
+        self.jobs = jobs
+        self.queue = queue
+        self.timeout = timeout
+        # puzzles admitted and not finished, running or waiting for a worker
+        self.pending = 0
+        self.counters = {"requests": 0, "rejected": 0, "solved": 0,
+                         "no solution": 0, "timeout": 0, "error": 0}
+
+    def status(self):
+        return dict(self.counters, pending=self.pending, queue=self.queue,
+                    jobs=self.jobs)
+
+    def submit(self, text, deadline):
+        """
+        Start solving a puzzle. The puzzle counts as pending until its worker
+        is done with it, even after the request stopped waiting for it
+        Return an asyncio future of solve_text's result
+        """
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = self.pool.submit(solve_text, text, deadline)
+
+        def release(future):
+            loop.call_soon_threadsafe(self._release)
+
+        future.add_done_callback(release)
+        return asyncio.wrap_future(future)
+
+    def _release(self):
+        self.pending -= 1
+
+    async def handle(self, reader, writer):
+        """
+        Serve one connection, a single request
+        """
+        try:
+            await self._handle(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        request = await reader.readline()
+        parts = request.decode("latin-1").split()
+        if len(parts) != 3:
+            return await respond(writer, 400, "malformed request line\n")
+        method, path, version = parts
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if path == "/status":
+            if method != "GET":
+                return await respond(writer, 405, "use GET\n")
+            return await respond(writer, 200, json.dumps(self.status()) + "\n",
+                                 "application/json")
+        if path != "/solve":
+            return await respond(writer, 404, "unknown path {}\n".format(path))
+        if method != "POST":
+            return await respond(writer, 405, "use POST\n")
+        if "content-length" not in headers:
+            return await respond(writer, 411, "Content-Length is required\n")
+        try:
+            length = int(headers["content-length"])
+            deadline = float(headers.get("x-deadline", self.timeout))
+        except ValueError:
+            return await respond(writer, 400, "bad Content-Length or X-Deadline\n")
+        if length > MAX_BODY:
+            return await respond(writer, 413, "at most {} bytes\n".format(MAX_BODY))
+        body = await reader.readexactly(length)
+        self.counters["requests"] += 1
+
+        puzzles = split_puzzles(body.decode())
+        if not puzzles:
+            return await respond(writer, 400, "no puzzle in the request\n")
+        if len(puzzles) > self.queue:
+            self.counters["rejected"] += 1
+            return await respond(writer, 413, "at most {} puzzles per request\n".format(
+                self.queue))
+        # backpressure: reject what does not fit in the queue right away
+        # rather than letting requests wait for an unbounded time
+        if self.pending + len(puzzles) > self.queue:
+            self.counters["rejected"] += 1
+            return await respond(writer, 429, "queue full, retry later\n",
+                                 extra={"Retry-After": "1"})
+        await self.stream(writer, puzzles, time.monotonic() + deadline)
+
+    async def stream(self, writer, puzzles, deadline):
+        """
+        Solve the puzzles and send each result as soon as it is known, as
+        a chunk of a chunked response
+        """
+        tasks = {self.submit(text, deadline): k for k, text in enumerate(puzzles)}
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        try:
+            while tasks:
+                remaining = deadline + GRACE - time.monotonic()
+                done = set()
+                if remaining > 0:
+                    done, running = await asyncio.wait(
+                        tasks, timeout=remaining,
+                        return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # the workers did not report in time (a puzzle still
+                    # waiting for a worker, or a long propagation), the
+                    # puzzles left are timed out without a partial board
+                    for task, k in sorted(tasks.items(), key=lambda item: item[1]):
+                        task.cancel()
+                        await send_chunk(writer, self.record(k, "timeout", "", None))
+                    tasks.clear()
+                    break
+                for task in sorted(done, key=lambda task: tasks[task]):
+                    k = tasks.pop(task)
+                    try:
+                        status, text, seconds = task.result()
+                    except Exception as error:
+                        status, text, seconds = "error", repr(error), None
+                    await send_chunk(writer, self.record(k, status, text, seconds))
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            # the client went away, stop what has not started yet
+            for task in tasks:
+                task.cancel()
+
+    def record(self, index, status, solution, seconds):
+        self.counters[status] += 1
+        return {"index": index, "status": status, "solution": solution,
+                "seconds": seconds}
+
+
+async def send_chunk(writer, record):
+    data = (json.dumps(record) + "\n").encode()
+    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+    await writer.drain()
+
+
+async def respond(writer, code, text, content_type="text/plain", extra=None):
+    """
+    Send a complete (not streamed) response
+    """
+    data = text.encode()
+    head = ["HTTP/1.1 {} {}".format(code, REASONS[code]),
+            "Content-Type: " + content_type,
+            "Content-Length: {}".format(len(data)),
+            "Connection: close"]
+    for name, value in (extra or {}).items():
+        head.append("{}: {}".format(name, value))
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+    await writer.drain()
+
+
+async def serve(args):
+    server = SolverServer(args.jobs or os.cpu_count(), args.queue, args.timeout)
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle, path=args.unix)
+        where = args.unix
+    else:
+        listener = await asyncio.start_server(server.handle, args.host, args.port)
+        where = "http://{}:{}".format(args.host, listener.sockets[0].getsockname()[1])
+    print("serving on {}".format(where), flush=True)
+    # shut down cleanly on SIGTERM too, removing the socket file
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM,
+                                                  asyncio.current_task().cancel)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.pool.shutdown(wait=False, cancel_futures=True)
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the battleship solver.")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="The address to listen on.")
+    parser.add_argument("--port", type=int, default=8384,
+                        help="The port to listen on (0: any free port).")
+    parser.add_argument("--unix", type=str, default=None,
+                        help="Listen on this Unix socket instead of TCP.")
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="The number of worker processes (0: one per CPU).")
+    parser.add_argument("--queue", type=int, default=64,
+                        help="The number of puzzles admitted at a time, "
+                             "more are rejected with 429.")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="The deadline in seconds of requests without an "
+                             "X-Deadline header.")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Incremental solving of a puzzle whose hints change one at a time
+
+A Session keeps the CSP of a puzzle propagated to GAC between edits.
+Adding a hint adds its constraints and propagates from them only; removing
+one undoes, through the undo trail, the prunings of that hint and of the
+hints added after it, then propagates those again. Solving searches from
+the propagated domains instead of starting from scratch, and is skipped
+when the last solution found still holds: removing a hint keeps every
+solution, and adding one keeps the solutions that agree with it.
+"""
+from battle import (ModelTemplate, hint_constraints, fleet_lengths,
+                    render_solutions, render_partial, ship_types)
+from backtracking import bt_search, GacEnforce
+from constraints import ShipCountConstraint
+from csp import Variable
+
+
+class Layer:
+    """
+    The constraints of one hint and the prunings they caused
+    """
+
+    def __init__(self, cell, symbol, constraints):
+        # cell: (row, col) of the hint
+        self.cell = cell
+        self.symbol = symbol
+        self.constraints = constraints
+        # (variable, value) pairs pruned when the layer was propagated
+        self.pruned = []
+        # True if propagating the layer wiped out a domain
+        self.dwo = False
+
+
+class Session:
+    """
+    A puzzle being edited. The session has its own variables and
+    constraints (not the shared model template of build_csp), so several
+    sessions and ordinary solves can be used at the same time
+    """
+
+    def __init__(self, row_constraint, col_constraint, ship_count, hints=None):
+        """
+        hints: the rows of the hint grid as battle.py reads them, '0' for
+        no hint; None for no hints at all
+        """
+        n = len(row_constraint)
+        self.n = n
+        self.ship_count = list(ship_count)
+        self.lengths = fleet_lengths(ship_count)
+        longest = max(self.lengths, default=0)
+        self.template = ModelTemplate(n)
+        self.base = self.template.base(longest)
+        for k in range(self.n):
+            self.template.rows[k].setBounds(row_constraint[k], row_constraint[k])
+            self.template.cols[k].setBounds(col_constraint[k], col_constraint[k])
+
+        # the first layer holds the prunings of the row, column, diagonal
+        # and length constraints, the others one hint each, in the order
+        # they were added
+        root = Layer(None, None, [])
+        self.layers = [root]
+        # the last solution found as battle.py writes it, None if it was
+        # invalidated by an edit or there is none
+        self.solution = None
+        self._rebuild()
+        for v in self.base.variables():
+            v.reset()
+        self._propagate(root, self.base.constraints())
+
+        if hints is not None:
+            for i in range(n):
+                for j in range(n):
+                    if hints[i][j] != '0':
+                        self.add_hint(i, j, hints[i][j])
+
+    def _propagate(self, layer, constraints):
+        """
+        Enforce GAC from the given constraints, recording the prunings in
+        the layer. Once some layer wiped out a domain the puzzle has no
+        solution, and the layers after it are not propagated
+        """
+        if any(other.dwo for other in self.layers if other is not layer):
+            return
+        # the prunings are recorded under (layer, None) in the undo trail
+        # and moved to the layer right away, so the searches in between,
+        # which clear the trail, do not lose them
+        layer.dwo = GacEnforce(list(constraints), self.csp, layer, None) == "DWO"
+        layer.pruned = Variable.undoDict.pop((layer, None), [])
+
+    def _rollback(self, layer):
+        for (var, val) in reversed(layer.pruned):
+            var.restoreVal(val)
+        layer.pruned = []
+        layer.dwo = False
+
+    def _rebuild(self):
+        hints = []
+        for layer in self.layers[1:]:
+            hints.extend(layer.constraints)
+        self.csp = self.base.extend(hints, ShipCountConstraint(self.ship_count, self.n))
+
+    def hints(self):
+        """
+        The rows of the hint grid, '0' for no hint
+        """
+        grid = [['0'] * self.n for i in range(self.n)]
+        for layer in self.layers[1:]:
+            grid[layer.cell[0]][layer.cell[1]] = layer.symbol
+        return ["".join(row) for row in grid]
+
+    def add_hint(self, i, j, symbol):
+        """
+        Give cell (i, j) of the board as a hint: '.' for water or one of
+        ship_types. Only the new constraints are propagated
+        """
+        if not (0 <= i < self.n and 0 <= j < self.n):
+            raise ValueError("cell ({}, {}) is not on the board".format(i, j))
+        if symbol != '.' and symbol not in ship_types:
+            raise ValueError("unknown hint {!r}".format(symbol))
+        if any(layer.cell == (i, j) for layer in self.layers[1:]):
+            raise ValueError("cell ({}, {}) already has a hint".format(i, j))
+        constraints = hint_constraints(self.template.varlist, self.n,
+                                       i, j, symbol, self.lengths)
+        layer = Layer((i, j), symbol, constraints)
+        self.layers.append(layer)
+        self._rebuild()
+        self._propagate(layer, constraints)
+        # the hint constraints hold exactly when the cell of the solution
+        # shows the hint's symbol
+        if self.solution is not None and self.solution.split()[i][j] != symbol:
+            self.solution = None
+
+    def remove_hint(self, i, j):
+        """
+        Remove the hint of cell (i, j). The prunings of the hints added
+        after it may depend on it: they are undone too, back to the last
+        state that does not depend on the hint, and propagated again
+        """
+        for k in range(1, len(self.layers)):
+            if self.layers[k].cell == (i, j):
+                break
+        else:
+            raise ValueError("cell ({}, {}) has no hint".format(i, j))
+        later = self.layers[k + 1:]
+        for layer in reversed(self.layers[k:]):
+            self._rollback(layer)
+        del self.layers[k:]
+        self.layers.extend(later)
+        self._rebuild()
+        for layer in later:
+            self._propagate(layer, layer.constraints)
+
+    def consistent(self):
+        """
+        False if propagation already showed the puzzle has no solution
+        """
+        return not any(layer.dwo for layer in self.layers)
+
+    def solve(self, deadline=None, max_nodes=None):
+        """
+        Search for a solution from the propagated domains
+        deadline, max_nodes: limits of the search, see bt_search
+        Return the status of the search ('solved', 'unsat' or 'timeout')
+        and the solution as battle.py writes it, the cells known so far
+        if the search timed out
+        """
+        if not self.consistent():
+            return 'unsat', ""
+        if self.solution is not None:
+            return 'solved', self.solution
+        result = bt_search('GAC', self.csp, 'mrv', False, False,
+                           deadline, max_nodes, keepDomains=True)
+        if result.status == 'timeout':
+            return 'timeout', render_partial(result.partial, self.n)
+        if result.status == 'solved':
+            self.solution = render_solutions(result.solutions, self.n)
+            return 'solved', self.solution
+        return 'unsat', ""
@@ -0,0 +1,94 @@
+"""
+Symmetries of battleship puzzles
+
+A puzzle mirrored left to right or top to bottom, or transposed, is the same
+problem: the row and column counts are reversed or swapped and the ship end
+symbols are remapped. Each of the 8 symmetries of the square is written as
+(transpose, flip_rows, flip_cols), applied in that order: first transpose the
+board, then reverse the order of the rows, then reverse each row.
+"""
+
+# every symmetry of the square, the identity first
+SYMMETRIES = [(transpose, flip_rows, flip_cols)
+              for transpose in (False, True)
+              for flip_rows in (False, True)
+              for flip_cols in (False, True)]
+
+# how each symbol changes under each elementary transformation
+TRANSPOSE_SYMBOLS = {'<': '^', '^': '<', '>': 'v', 'v': '>'}
+FLIP_ROWS_SYMBOLS = {'^': 'v', 'v': '^'}
+FLIP_COLS_SYMBOLS = {'<': '>', '>': '<'}
+
+
+def transform_grid(grid, symmetry):
+    """
+    Apply the symmetry to a square grid of symbols (hints or a solution)
+    grid: list of strings, one per row
+    """
+    transpose, flip_rows, flip_cols = symmetry
+    rows = [list(row) for row in grid]
+    if transpose:
+        rows = [[TRANSPOSE_SYMBOLS.get(rows[i][j], rows[i][j])
+                 for i in range(len(rows))] for j in range(len(rows))]
+    if flip_rows:
+        rows = [[FLIP_ROWS_SYMBOLS.get(c, c) for c in row] for row in reversed(rows)]
+    if flip_cols:
+        rows = [[FLIP_COLS_SYMBOLS.get(c, c) for c in reversed(row)] for row in rows]
+    return ["".join(row) for row in rows]
+
+
+def transform_puzzle(row_constraint, col_constraint, ship_count, hints, symmetry):
+    """
+    Apply the symmetry to a puzzle
+    Return the transformed (row_constraint, col_constraint, ship_count, hints)
+    """
+    transpose, flip_rows, flip_cols = symmetry
+    rows, cols = list(row_constraint), list(col_constraint)
+    if transpose:
+        rows, cols = cols, rows
+    if flip_rows:
+        rows.reverse()
+    if flip_cols:
+        cols.reverse()
+    return rows, cols, list(ship_count), transform_grid(hints, symmetry)
+
+
+def inverse(symmetry):
+    """
+    The symmetry that undoes the given one
+    Flips commute with each other, and flipping the rows before a transpose
+    is the same as flipping the columns after it
+    """
+    transpose, flip_rows, flip_cols = symmetry
+    if transpose:
+        return transpose, flip_cols, flip_rows
+    return symmetry
+
+
+def canonical(row_constraint, col_constraint, ship_count, hints):
+    """
+    Map the puzzle to the canonical form shared by all of its 8 variants,
+    the smallest of them in (rows, columns, hints) order
+    Return the canonical puzzle and the symmetry that maps the given puzzle
+    to it
+    """
+    best = None
+    for symmetry in SYMMETRIES:
+        puzzle = transform_puzzle(row_constraint, col_constraint, ship_count,
+                                  hints, symmetry)
+        order = (puzzle[0], puzzle[1], puzzle[3])
+        if best is None or order < best[0]:
+            best = (order, puzzle, symmetry)
+    return best[1], best[2]
+
+
+def transform_boards(text, size, symmetry):
+    """
+    Apply the symmetry to rendered solutions, boards of size lines printed
+    one after the other
+    """
+    lines = text.split()
+    boards = []
+    for k in range(0, len(lines), size):
+        boards.extend(transform_grid(lines[k:k + size], symmetry))
+    return "".join(line + "\n" for line in boards)
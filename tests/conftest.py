@@ -0,0 +1,8 @@
+"""
+The modules of the solver live at the top of the repository
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
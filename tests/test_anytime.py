@@ -0,0 +1,101 @@
+"""
+Searches stopped by a deadline or a node budget, and their partial boards
+"""
+import subprocess
+import sys
+import time
+
+import pytest
+
+from battle import read_puzzle, build_csp, render_partial, render_solutions
+from backtracking import bt_search
+from benchmark import expected_output
+
+from conftest import ROOT
+from test_solver import read
+
+
+def golden(path):
+    with open(expected_output(path)) as file:
+        return file.read().split()
+
+
+def check_partial(board, solution):
+    """
+    The known cells of the partial board are those of the solution, 'X'
+    standing for any ship part
+    """
+    assert len(board) == len(solution)
+    for row, expected in zip(board, solution):
+        for cell, symbol in zip(row, expected):
+            if cell == 'X':
+                assert symbol != '.'
+            elif cell != '?':
+                assert cell == symbol
+
+
+@pytest.mark.parametrize("algorithm", ["GAC", "FC", "SAT"])
+def test_max_nodes(algorithm):
+    # GAC explores a few hundred nodes on hard3
+    path, text = read("hard3")
+    csp, size = build_csp(*read_puzzle(text))
+    result = bt_search(algorithm, csp, 'mrv', False, False, maxNodes=1)
+    assert result.status == 'timeout'
+    assert result.solutions == []
+    assert result.nodes == 1
+    board = render_partial(result.partial, size).split()
+    assert '?' in "".join(board)
+    check_partial(board, golden(path))
+
+
+def test_deadline():
+    path, text = read("hard3")
+    csp, size = build_csp(*read_puzzle(text))
+    result = bt_search('GAC', csp, 'mrv', False, False, deadline=time.monotonic())
+    assert (result.status, result.solutions, result.nodes) == ('timeout', [], 0)
+    check_partial(render_partial(result.partial, size).split(), golden(path))
+
+
+def test_no_limit():
+    path, text = read("easy1")
+    csp, size = build_csp(*read_puzzle(text))
+    result = bt_search('GAC', csp, 'mrv', False, False, maxNodes=1000)
+    assert result.status == 'solved'
+    assert render_solutions(result.solutions, size).split() == golden(path)
+    # without a limit there is no partial board
+    assert bt_search('GAC', csp, 'mrv', False, False).partial is None
+
+
+def test_results_independent():
+    # a search keeps nothing outside its result: the searches run after it
+    # do not change it
+    hard, easy = read("hard3"), read("easy1")
+    csp, size = build_csp(*read_puzzle(hard[1]))
+    stopped = bt_search('GAC', csp, 'mrv', False, False, maxNodes=3)
+    other, other_size = build_csp(*read_puzzle(easy[1]))
+    solved = bt_search('SAT', other, 'mrv', False, False)
+    assert solved.status == 'solved'
+    assert (stopped.status, stopped.nodes) == ('timeout', 3)
+    check_partial(render_partial(stopped.partial, size).split(), golden(hard[0]))
+
+
+def test_render_partial():
+    values = [1, 1, None,
+              0, 0, 0,
+              0, 1, 0]
+    # the end of the ship in the first row is not known yet
+    assert render_partial(values, 3) == "<X?\n...\n.S.\n"
+
+
+@pytest.mark.parametrize("limit", [["--max-nodes", "1"], ["--timeout", "0"]])
+def test_command_line(tmp_path, limit):
+    path, text = read("hard3")
+    output = tmp_path / "partial.txt"
+    process = subprocess.run(
+        [sys.executable, "battle.py", "--inputfile", path, "--outputfile", str(output),
+         "--no-cache"] + limit, cwd=ROOT, capture_output=True, text=True)
+    assert process.returncode == 3
+    assert "the board is partial" in process.stderr
+    board = output.read_text().split()
+    assert '?' in "".join(board)
+    check_partial(board, golden(path))
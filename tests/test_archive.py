@@ -0,0 +1,59 @@
+"""
+Packing puzzles into an archive and reading them back
+"""
+import glob
+import os
+
+import pytest
+
+from archive import ArchiveWriter, Archive, pack_hints, unpack_hints
+from battle import read_puzzle, format_puzzle
+
+from conftest import ROOT
+
+
+def corpus():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "inputs", "input*.txt"))):
+        with open(path) as file:
+            texts.append(file.read())
+    return texts
+
+
+def test_round_trip(tmp_path):
+    texts = corpus()
+    path = str(tmp_path / "corpus.bsa")
+    with ArchiveWriter(path) as out:
+        out.add_text("\n\n".join(text.strip() for text in texts))
+    with Archive(path) as archive:
+        assert len(archive) == len(texts)
+        for k, text in enumerate(texts):
+            assert list(archive[k]) == list(read_puzzle(text))
+        # puzzle k is read without the ones before it
+        assert format_puzzle(*archive[len(texts) - 1]) == format_puzzle(*read_puzzle(texts[-1]))
+        with pytest.raises(IndexError):
+            archive.record(len(texts))
+
+
+def test_wide_counts(tmp_path):
+    # counts past 255 are stored on 16 bits
+    puzzle = ([1, 0, 0], [1, 0, 0], [300], ["S00", "000", "0.0"])
+    path = str(tmp_path / "wide.bsa")
+    with ArchiveWriter(path) as out:
+        out.add(*puzzle)
+    with Archive(path) as archive:
+        assert archive[0] == tuple(list(part) for part in puzzle)
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 8, 9, 17])
+def test_hints(size):
+    symbols = "0.S<>^vM"
+    hints = ["".join(symbols[(i * size + j) % 8] for j in range(size)) for i in range(size)]
+    assert unpack_hints(pack_hints(hints), size) == hints
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "puzzle.txt"
+    path.write_text(corpus()[0])
+    with pytest.raises(ValueError):
+        Archive(str(path))
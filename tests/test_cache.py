@@ -0,0 +1,113 @@
+"""
+The on-disk cache of solved puzzles
+"""
+import json
+import subprocess
+import sys
+
+import pytest
+
+import cache
+from cache import SolutionCache, puzzle_key
+
+from conftest import ROOT
+from test_solver import read
+
+PUZZLE = ([1, 0, 1], [1, 0, 1], [2], ["S00", "000", "00S"])
+
+
+class Clock:
+    """
+    A clock for last_used that ticks once per call, so the order of the
+    entries does not depend on the resolution of time.time()
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(cache, "time", Clock())
+
+
+def test_puzzle_key():
+    rows, cols, fleet, hints = PUZZLE
+    key = puzzle_key(rows, cols, fleet, hints)
+    # trailing ship types with no ships are not part of the puzzle
+    assert puzzle_key(rows, cols, [2, 0, 0], hints) == key
+    assert puzzle_key(tuple(rows), tuple(cols), (2, 0), tuple(hints)) == key
+    # other zeros are
+    assert puzzle_key(rows, cols, [0, 2], hints) != key
+    assert puzzle_key(rows, cols, fleet, ["S00", "0.0", "00S"]) != key
+
+
+def test_hit_miss(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    store = SolutionCache(path)
+    assert store.get("a") is None
+    store.put("a", "S.\n..\n", {"nodes": 3})
+    assert store.get("a") == ("S.\n..\n", {"nodes": 3})
+    assert store.get("b") is None
+    store.close()
+    # the counters add up across runs
+    store = SolutionCache(path)
+    store.get("a")
+    stats = store.stats()
+    assert (stats["entries"], stats["bytes"]) == (1, 6)
+    assert (stats["hits"], stats["misses"], stats["evicted"]) == (2, 2, 0)
+    store.clear()
+    assert store.stats()["entries"] == store.stats()["hits"] == 0
+    store.close()
+
+
+def test_lru_eviction(tmp_path, clock):
+    store = SolutionCache(str(tmp_path / "cache.sqlite3"), max_bytes=30)
+    for key in "abc":
+        store.put(key, key * 10, {})
+    # a is used again, so b is now the least recently used
+    assert store.get("a") is not None
+    store.put("d", "d" * 10, {})
+    assert store.get("b") is None
+    assert [store.get(key)[0] for key in "acd"] == ["a" * 10, "c" * 10, "d" * 10]
+    # two entries make room for one of 20 bytes
+    store.put("e", "e" * 20, {})
+    assert [store.get(key) is None for key in "acde"] == [True, True, False, False]
+    # an entry larger than the whole cache is not stored, nor evicts any
+    store.put("f", "f" * 31, {})
+    assert store.get("f") is None
+    stats = store.stats()
+    assert (stats["entries"], stats["bytes"], stats["evicted"]) == (2, 30, 3)
+    store.close()
+
+
+def battle(path, *flags):
+    process = subprocess.run([sys.executable, "battle.py", "--inputfile", path,
+                              "--outputfile", "-"] + list(flags),
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+    return process.stdout
+
+
+def cache_stats(path):
+    process = subprocess.run([sys.executable, "cache.py", "--cache", path],
+                             cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout)
+
+
+def test_command_line(tmp_path):
+    path, text = read("medium1")
+    database = str(tmp_path / "cache.sqlite3")
+    solved = battle(path, "--cache", database)
+    assert battle(path, "--cache", database) == solved
+    stats = cache_stats(database)
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 1)
+    # --cache-size 0 keeps nothing
+    small = str(tmp_path / "small.sqlite3")
+    assert battle(path, "--cache", small, "--cache-size", "0") == solved
+    assert battle(path, "--cache", small, "--cache-size", "0") == solved
+    stats = cache_stats(small)
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (0, 0, 2)
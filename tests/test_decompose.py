@@ -0,0 +1,65 @@
+"""
+Boards whose undecided cells split into independent components
+"""
+import pytest
+
+import instrument
+from battle import build_csp, render_solutions
+from backtracking import bt_search, components, count_solutions, rootEnforce
+from csp import Variable
+
+# after GAC at the root, the 2x3 blocks in the top left and bottom right
+# corners are undecided; no row or column holds cells of both. Each block
+# has 2 solutions, a submarine in opposite corners of each of its rows
+COUNTS = [1, 1, 0, 1, 1, 0], [1, 0, 1, 1, 0, 1]
+HINTS = ["000...",
+         "000...",
+         "000000",
+         "...000",
+         "...000",
+         "000000"]
+
+
+@pytest.fixture
+def counters():
+    instrument.enable()
+    yield instrument.counters
+    instrument.disable()
+    instrument.reset()
+
+
+def boards(solutions, size):
+    return sorted(render_solutions([solution], size) for solution in solutions)
+
+
+def test_components():
+    csp, size = build_csp(*COUNTS, [4], HINTS)
+    Variable.clearUndoDict()
+    for var in csp.variables():
+        var.reset()
+    rootEnforce(csp, None, None)
+    assert sorted(len(part) for part in components(csp)) == [4, 4]
+
+
+@pytest.mark.parametrize("fleet, count", [([4], 4), ([3], 0), ([2, 1], 0)])
+def test_all_solutions(counters, fleet, count):
+    csp, size = build_csp(*COUNTS, fleet, HINTS)
+    result = bt_search('GAC', csp, 'mrv', True, False)
+    assert counters["decompose.components"] == 2
+    assert "decompose.fallback" not in counters
+    assert len(result.solutions) == count_solutions(csp) == count
+    sat = bt_search('SAT', csp, 'mrv', True, False)
+    assert boards(result.solutions, size) == boards(sat.solutions, size)
+
+
+@pytest.mark.parametrize("fleet, count", [([4], 4), ([3], 0)])
+def test_one_solution(counters, fleet, count):
+    csp, size = build_csp(*COUNTS, fleet, HINTS)
+    every = bt_search('GAC', csp, 'mrv', True, False)
+    result = bt_search('GAC', csp, 'mrv', False, False)
+    assert counters["decompose.components"] == 4
+    assert len(result.solutions) == min(count, 1)
+    assert set(boards(result.solutions, size)) <= set(boards(every.solutions, size))
+    # the search stops at the first combination, it does not enumerate
+    # the solutions of each component
+    assert result.nodes < every.nodes
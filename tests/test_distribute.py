@@ -0,0 +1,124 @@
+"""
+The coordinator of distribute.py handing units of dead workers to others
+"""
+import asyncio
+import io
+import json
+import sys
+
+from distribute import Coordinator, coordinate, load_puzzles, MAX_LINE
+from server import solve_text
+
+from conftest import ROOT
+from test_solver import read
+
+NAMES = ["easy1", "easy2", "medium1", "medium2", "hard4", "1"]
+
+
+def corpus():
+    return load_puzzles([read(name)[0] for name in NAMES])
+
+
+async def lease(port, count):
+    """
+    Connect as a worker and lease at most count units
+    Return the connection and the ids of the units
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=MAX_LINE)
+    writer.write((json.dumps({"op": "get", "max": count}) + "\n").encode())
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    return writer, [unit["unit"] for unit in reply["units"]]
+
+
+def run(coordinator, client, connections=()):
+    """
+    Coordinate, with client called once listening; then wait for the
+    worker processes it returns and close the connections it left open
+    """
+    processes = []
+
+    async def started(port):
+        processes.extend(await client(port))
+
+    async def main():
+        await asyncio.wait_for(coordinate(coordinator, "127.0.0.1", 0, started), 120)
+        for process in processes:
+            assert await process.wait() == 0
+        for writer in connections:
+            writer.close()
+
+    asyncio.run(main())
+
+
+async def worker(port):
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "distribute.py", "worker", "--host", "127.0.0.1",
+        "--port", str(port), "--jobs", "2", cwd=ROOT)
+
+
+def check(output, puzzles):
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [line["index"] for line in lines] == list(range(len(puzzles)))
+    for line, text in zip(lines, puzzles):
+        status, solution, seconds = solve_text(text, None)
+        assert (line["status"], line["solution"]) == (status, solution)
+
+
+def test_worker_dies():
+    puzzles = corpus()
+    output = io.StringIO()
+    coordinator = Coordinator(puzzles, output, 2, 30.0, 2, None)
+
+    async def client(port):
+        # a worker leases two units and dies before sending results
+        writer, units = await lease(port, 2)
+        assert units == [0, 1]
+        writer.close()
+        await writer.wait_closed()
+        return [await worker(port)]
+
+    run(coordinator, client)
+    summary = coordinator.summary()
+    assert summary["retried"] == 2
+    assert summary["given up"] == 0
+    assert summary["solved"] == len(puzzles)
+    check(output, puzzles)
+
+
+def test_lease_expires():
+    puzzles = corpus()
+    output = io.StringIO()
+    coordinator = Coordinator(puzzles, output, 3, 0.5, 2, None)
+    writers = []
+
+    async def client(port):
+        # a worker leases a unit and hangs, still connected
+        writer, units = await lease(port, 1)
+        writers.append(writer)
+        return [await worker(port)]
+
+    run(coordinator, client, writers)
+    assert coordinator.summary()["retried"] >= 1
+    check(output, puzzles)
+
+
+def test_give_up():
+    puzzles = corpus()
+    output = io.StringIO()
+    coordinator = Coordinator(puzzles, output, 4, 30.0, 0, None)
+
+    async def client(port):
+        writer, units = await lease(port, 10)
+        assert units == [0, 1]
+        writer.close()
+        return []
+
+    run(coordinator, client)
+    summary = coordinator.summary()
+    assert summary["given up"] == 2
+    assert summary["error"] == len(puzzles)
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [line["index"] for line in lines] == list(range(len(puzzles)))
+    assert all(line["solution"].startswith("gave up after 1 attempts")
+               for line in lines)
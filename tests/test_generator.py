@@ -0,0 +1,41 @@
+"""
+Puzzles made by generator.py
+"""
+import pytest
+
+from battle import read_puzzle, build_csp
+from backtracking import count_solutions
+from generator import make_puzzle, generate, scaled_fleet
+from verify import verify
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("size", [6, 10])
+def test_unique(size, seed):
+    # no hints to start from, so every hint comes from the --unique loop
+    text = make_puzzle(size, scaled_fleet(size), 0, seed, unique=True)
+    csp, n = build_csp(*read_puzzle(text))
+    assert count_solutions(csp, 2) == 1
+    assert count_solutions(csp, 2, cache=False) == 1
+
+
+def test_hidden_board():
+    # every cell revealed: the puzzle is its own solution
+    size = 8
+    text = make_puzzle(size, scaled_fleet(size), size * size, 7)
+    rows, cols, fleet, hints = read_puzzle(text)
+    assert '0' not in "".join(hints)
+    assert verify(text, "\n".join(hints)) == []
+
+
+def test_seeded():
+    assert make_puzzle(10, [4, 3, 2, 1], 10, 3) == make_puzzle(10, [4, 3, 2, 1], 10, 3)
+    assert make_puzzle(10, [4, 3, 2, 1], 10, 3) != make_puzzle(10, [4, 3, 2, 1], 10, 4)
+    # puzzle k of a run only depends on the seed and k
+    assert list(generate(8, [3, 2, 1], 5, 11, 4, jobs=2)) == \
+        list(generate(8, [3, 2, 1], 5, 11, 4))
+
+
+def test_fleet_too_large():
+    with pytest.raises(ValueError):
+        make_puzzle(4, [0, 0, 0, 0, 3], 0, 0)
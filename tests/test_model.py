@@ -0,0 +1,63 @@
+"""
+The model templates shared by the puzzles of a size
+"""
+import pytest
+
+from battle import read_puzzle, build_csp, render_solutions, get_template, model_templates
+from backtracking import bt_search, GacEnforce
+from benchmark import expected_output
+from csp import Variable
+
+from test_solver import read, FAST
+
+
+def test_rebound_row():
+    # row 0 of a 3x3 board holds one ship part, then none; the domains are
+    # not reset in between, so only setBounds can tell GAC the row changed
+    csp, size = build_csp([1, 0, 1], [1, 0, 1], [2], ["000", "000", "000"])
+    row = get_template(3).rows[0]
+    Variable.clearUndoDict()
+    for var in row.scope():
+        var.reset()
+    assert GacEnforce([row], csp, None, None) == "OK"
+    assert [var.curDomain() for var in row.scope()] == [[0, 1]] * 3
+
+    csp, size = build_csp([0, 1, 1], [1, 0, 1], [2], ["000", "000", "000"])
+    assert row is get_template(3).rows[0]
+    assert GacEnforce([row], csp, None, None) == "OK"
+    assert [var.curDomain() for var in row.scope()] == [[0]] * 3
+
+
+def test_shared_template():
+    # the 10x10 puzzles of the corpus share one template, solved in turn
+    # and again in the other order
+    names = [name for name in FAST if len(read_puzzle(read(name)[1])[0]) == 10]
+    assert len(names) > 2
+    for order in (names, names[::-1]):
+        for name in order:
+            path, text = read(name)
+            csp, size = build_csp(*read_puzzle(text))
+            result = bt_search('GAC', csp, 'mrv', False, False)
+            with open(expected_output(path)) as file:
+                assert render_solutions(result.solutions, size).split() == file.read().split()
+
+
+@pytest.fixture
+def no_templates():
+    saved = dict(model_templates)
+    model_templates.clear()
+    yield
+    model_templates.clear()
+    model_templates.update(saved)
+
+
+def test_pickled_template(tmp_path, no_templates):
+    path, text = read("easy1")
+    puzzle = read_puzzle(text)
+    csp, size = build_csp(*puzzle, template_dir=str(tmp_path))
+    expected = render_solutions(bt_search('GAC', csp, 'mrv', False, False).solutions, size)
+    assert len(list(tmp_path.iterdir())) == 1
+    # a later run loads the template instead of building it
+    model_templates.clear()
+    csp, size = build_csp(*puzzle, template_dir=str(tmp_path))
+    assert render_solutions(bt_search('GAC', csp, 'mrv', False, False).solutions, size) == expected
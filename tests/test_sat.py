@@ -0,0 +1,60 @@
+"""
+The CNF encoding and the CDCL solver of sat.py
+"""
+import itertools
+
+import pytest
+
+from sat import CNF, SatSolver, luby
+
+
+def models(cnf, n):
+    """
+    The assignments of variables 1..n that extend to a model of cnf
+    """
+    solver = SatSolver(cnf.nvars)
+    for clause in cnf.clauses:
+        solver.add_clause(clause)
+    found = set()
+    while solver.solve():
+        values = tuple(bool(solver.model[v]) for v in range(1, n + 1))
+        found.add(values)
+        solver.add_clause([-v if values[v - 1] else v for v in range(1, n + 1)])
+    return found
+
+
+@pytest.mark.parametrize("n", [1, 3, 5])
+def test_cardinality(n):
+    for lower in range(-1, n + 2):
+        for upper in range(-1, n + 2):
+            cnf = CNF(n)
+            cnf.cardinality(list(range(1, n + 1)), lower, upper)
+            expected = set(values for values in itertools.product([False, True], repeat=n)
+                           if lower <= sum(values) <= upper)
+            assert models(cnf, n) == expected, (lower, upper)
+
+
+def test_negated_literals():
+    # exactly two of x1, not x2, x3
+    cnf = CNF(3)
+    cnf.cardinality([1, -2, 3], 2, 2)
+    assert models(cnf, 3) == {(True, True, True), (True, False, False),
+                              (False, False, True)}
+
+
+def test_pigeonhole():
+    # 4 pigeons in 3 holes: variable 3p + h + 1 puts pigeon p in hole h
+    cnf = CNF(12)
+    for p in range(4):
+        cnf.add([3 * p + h + 1 for h in range(3)])
+    for h in range(3):
+        cnf.cardinality([3 * p + h + 1 for p in range(4)], 0, 1)
+    solver = SatSolver(cnf.nvars)
+    for clause in cnf.clauses:
+        solver.add_clause(clause)
+    assert not solver.solve()
+    assert solver.conflicts > 0
+
+
+def test_luby():
+    assert [luby(i) for i in range(15)] == [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
@@ -0,0 +1,125 @@
+"""
+server.py and client.py end to end, on a local port and a Unix socket
+"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import client
+
+from conftest import ROOT
+from test_solver import read
+
+
+def start(*flags):
+    """
+    Start a server with 2 workers; return its process and where it listens
+    """
+    process = subprocess.Popen([sys.executable, "server.py", "--jobs", "2"] + list(flags),
+                               cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    # serving on http://127.0.0.1:PORT, or on the socket path
+    line = process.stdout.readline()
+    assert line.startswith("serving on "), line
+    return process, line.split()[-1]
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def port():
+    process, where = start("--port", "0", "--queue", "3")
+    yield where.rsplit(":", 1)[1]
+    stop(process)
+
+
+def run_client(port, *args):
+    return subprocess.run([sys.executable, "client.py", "--port", port] + list(args),
+                          cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+
+def golden(name):
+    with open(os.path.join(ROOT, "outputs", "solution_{}.txt".format(name))) as file:
+        return file.read()
+
+
+def test_solve(port, tmp_path):
+    paths = [read(name)[0] for name in ["easy1", "medium1", ""]]
+    process = run_client(port, "--outdir", str(tmp_path), *paths)
+    assert process.returncode == 0, process.stderr
+    statuses = dict(line.rsplit(": ", 1) for line in process.stderr.splitlines())
+    assert statuses == {paths[0]: "solved", paths[1]: "solved", paths[2]: "no solution"}
+    for name in ["easy1", "medium1"]:
+        written = (tmp_path / "solution_input_{}.txt".format(name)).read_text()
+        assert written.split() == golden(name).split()
+
+    connection = client.connect(port=int(port))
+    counters = client.status(connection)
+    assert (counters["requests"], counters["solved"], counters["no solution"]) == (1, 2, 1)
+    assert counters["pending"] == 0
+
+
+def test_deadline(port, tmp_path):
+    # GAC takes seconds on hard5: half a second gives a partial board
+    path = read("hard5")[0]
+    process = run_client(port, "--deadline", "0.5", "--outdir", str(tmp_path), path)
+    assert process.returncode == 1
+    assert process.stderr.strip() == path + ": timeout"
+    board = (tmp_path / "solution_input_hard5.txt").read_text().split()
+    assert len(board) == 15 and '?' in "".join(board)
+
+
+def test_queue_full(port):
+    # a puzzle of another request holds one of the 3 places for 2 seconds
+    busy = subprocess.Popen([sys.executable, "client.py", "--port", port, "--deadline", "2",
+                             read("hard5")[0]], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        connection = client.connect(port=int(port))
+        limit = time.monotonic() + 10
+        while client.status(connection)["pending"] == 0:
+            assert time.monotonic() < limit
+            time.sleep(0.05)
+        paths = [read(name)[0] for name in ["easy1", "easy2", "medium1"]]
+        process = run_client(port, *paths)
+        assert process.returncode == 2
+        assert "429 Too Many Requests" in process.stderr
+        # two still fit
+        assert run_client(port, *paths[:2]).returncode == 0
+        assert client.status(connection)["rejected"] == 1
+    finally:
+        busy.kill()
+        busy.wait()
+
+
+def test_too_many_puzzles(port):
+    # more puzzles than the queue holds never fit, retrying does not help
+    paths = [read(name)[0] for name in ["easy1", "easy2", "medium1", "medium2"]]
+    process = run_client(port, *paths)
+    assert process.returncode == 2
+    assert "413 Payload Too Large" in process.stderr
+    assert run_client(port, *paths[:3]).returncode == 0
+
+
+def test_unix_socket(tmp_path):
+    socket = str(tmp_path / "solver.sock")
+    server, where = start("--unix", socket)
+    try:
+        assert where == socket
+        connection = client.connect(unix=socket)
+        results = list(client.solve(connection, [read("easy2")[1]]))
+        assert [result["status"] for result in results] == ["solved"]
+        assert results[0]["solution"].split() == golden("easy2").split()
+    finally:
+        stop(server)
+    # the socket file is removed on SIGTERM
+    assert not os.path.exists(socket)
@@ -0,0 +1,100 @@
+"""
+Adding and removing hints of a session, against solving from scratch
+"""
+import pytest
+
+from battle import read_puzzle, format_puzzle, build_csp, render_solutions
+from backtracking import bt_search
+from benchmark import expected_output
+from session import Session
+from verify import verify
+
+from test_solver import read
+
+
+def fresh(rows, cols, fleet, hints):
+    """
+    The status and solution of the puzzle solved from scratch
+    """
+    csp, size = build_csp(rows, cols, fleet, hints)
+    result = bt_search('GAC', csp, 'mrv', False, False)
+    return result.status, render_solutions(result.solutions, size)
+
+
+def check(session, rows, cols, fleet):
+    hints = session.hints()
+    status, board = session.solve()
+    expected, solution = fresh(rows, cols, fleet, hints)
+    assert status == expected
+    if status == 'solved':
+        # the solutions may differ if the hints leave several
+        assert verify(format_puzzle(rows, cols, fleet, hints), board) == []
+    else:
+        assert board == ""
+
+
+@pytest.mark.parametrize("name", ["easy1", "medium1"])
+def test_add_remove(name):
+    path, text = read(name)
+    rows, cols, fleet, hints = read_puzzle(text)
+    with open(expected_output(path)) as file:
+        golden = file.read().split()
+    n = len(rows)
+
+    session = Session(rows, cols, fleet)
+    check(session, rows, cols, fleet)
+    # reveal the golden board one row at a time
+    for i in range(n):
+        for j in range(n):
+            session.add_hint(i, j, golden[i][j])
+        assert session.hints()[:i + 1] == golden[:i + 1]
+        check(session, rows, cols, fleet)
+    status, board = session.solve()
+    assert (status, board.split()) == ('solved', golden)
+
+    # remove hints from the middle, so that later ones are propagated again
+    for i in range(n):
+        session.remove_hint(i, (i * 3) % n)
+        check(session, rows, cols, fleet)
+    assert session.hints() == ["".join('0' if j == (i * 3) % n else golden[i][j]
+                                       for j in range(n)) for i in range(n)]
+
+
+def test_contradiction():
+    path, text = read("easy1")
+    rows, cols, fleet, hints = read_puzzle(text)
+    session = Session(rows, cols, fleet, hints)
+    check(session, rows, cols, fleet)
+    # (1, 4) is a submarine: a ship part next to it cannot be
+    session.add_hint(1, 3, '>')
+    assert not session.consistent()
+    assert session.solve() == ('unsat', "")
+    session.remove_hint(1, 3)
+    assert session.consistent()
+    assert session.hints() == hints
+    check(session, rows, cols, fleet)
+
+
+def test_bad_edits():
+    path, text = read("easy1")
+    session = Session(*read_puzzle(text))
+    with pytest.raises(ValueError):
+        session.add_hint(1, 4, '.')
+    with pytest.raises(ValueError):
+        session.add_hint(6, 0, '.')
+    with pytest.raises(ValueError):
+        session.add_hint(0, 0, 'x')
+    with pytest.raises(ValueError):
+        session.remove_hint(0, 0)
+
+
+def test_limit():
+    # a search stopped by its budget leaves the session as it was
+    path, text = read("hard3")
+    session = Session(*read_puzzle(text))
+    status, board = session.solve(max_nodes=1)
+    assert status == 'timeout'
+    assert '?' in board
+    status, board = session.solve()
+    with open(expected_output(path)) as file:
+        assert (status, board.split()) == ('solved', file.read().split())
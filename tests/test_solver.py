@@ -0,0 +1,191 @@
+"""
+The search algorithms on the inputs/ corpus and on larger boards
+"""
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from battle import read_puzzle, format_puzzle, build_csp, render_solutions
+from backtracking import bt_search, count_solutions, probe, GacEnforce
+from benchmark import expected_output
+from generator import make_puzzle
+from verify import verify
+
+from csp import Variable
+
+from conftest import ROOT
+
+# the corpus puzzles GAC and SAT solve in well under a second, all but hard5
+FAST = ["easy1", "easy2", "medium1", "medium2", "hard1", "hard2", "hard3", "hard4", "1"]
+# FC only solves the easy ones that fast (see README)
+FC_FAST = ["easy1", "easy2", "medium1", "medium2", "hard4", "1"]
+# and these with --probe
+FC_PROBED = ["hard1", "hard2"]
+
+
+def read(name):
+    # inputs/input.txt, input1.txt and input_<name>.txt
+    if name and not name.isdigit():
+        name = "_" + name
+    path = os.path.join(ROOT, "inputs", "input{}.txt".format(name))
+    with open(path) as file:
+        return path, file.read()
+
+
+def solve(text, algorithm, probe=None):
+    """
+    Return the status of the search and the rendered solution
+    """
+    csp, size = build_csp(*read_puzzle(text))
+    result = bt_search(algorithm, csp, 'mrv', False, False, probeBudget=probe)
+    return result.status, render_solutions(result.solutions, size)
+
+
+def check(name, algorithm, probe=None):
+    path, text = read(name)
+    status, output = solve(text, algorithm, probe)
+    assert status == 'solved'
+    assert verify(text, output) == []
+    with open(expected_output(path)) as file:
+        assert file.read().split() == output.split()
+
+
+@pytest.mark.parametrize("name", FAST)
+@pytest.mark.parametrize("algorithm", ["GAC", "SAT"])
+def test_corpus(name, algorithm):
+    check(name, algorithm)
+
+
+@pytest.mark.parametrize("name", FC_FAST)
+def test_corpus_fc(name):
+    check(name, "FC")
+
+
+@pytest.mark.parametrize("name", FC_PROBED)
+@pytest.mark.parametrize("algorithm", ["GAC", "FC"])
+def test_corpus_probe(name, algorithm):
+    check(name, algorithm, probe=5.0)
+
+
+def test_probe_keeps_solution():
+    path, text = read("hard3")
+    with open(expected_output(path)) as file:
+        solution = [int(c != '.') for c in "".join(file.read().split())]
+    csp, size = build_csp(*read_puzzle(text))
+    Variable.clearUndoDict()
+    for var in csp.variables():
+        var.reset()
+    assert GacEnforce(csp.constraints(), csp, None, None) == "OK"
+    # past its deadline, probing prunes nothing
+    assert probe(csp, deadline=0.0) == 0
+    before = sum(var.curDomainSize() for var in csp.variables())
+    pruned = probe(csp)
+    assert pruned > 0
+    assert sum(var.curDomainSize() for var in csp.variables()) <= before - pruned
+    # only values in no solution are pruned
+    for var, val in zip(csp.variables(), solution):
+        assert val in var.curDomain()
+
+
+@pytest.mark.parametrize("algorithm", ["GAC", "FC", "SAT"])
+def test_no_solution(algorithm):
+    # the golden output of input.txt does not match its hints
+    path, text = read("")
+    assert solve(text, algorithm) == ('unsat', "")
+
+
+def lay_out(rows, n):
+    """
+    The n x n board with the ships of rows[k], of the given lengths, laid
+    left to right on row 2k, and water everywhere else
+    """
+    board = []
+    for lengths in rows:
+        row = "".join(("S" if length == 1 else "<" + "M" * (length - 2) + ">") + "."
+                      for length in lengths)
+        board += [row[:n].ljust(n, "."), "." * n]
+    return board[:n]
+
+
+def test_extended_format():
+    # 21x21 with rows of 11 to 18 ship parts, 36 submarines and ships of
+    # up to 7 cells
+    n = 21
+    board = lay_out([[7, 6, 5], [1] * 11, [5, 4, 4, 3], [2, 1, 3, 2, 1, 4], [7, 6, 5],
+                     [1] * 11, [6, 7, 5], [3, 3, 3, 3, 3], [4, 4, 4, 4], [1] * 11,
+                     [7, 1, 2, 6]], n)
+    rows = [sum(c != '.' for c in row) for row in board]
+    cols = [sum(row[j] != '.' for row in board) for j in range(n)]
+    fleet = [36, 3, 7, 7, 4, 4, 4]
+    # the first cell of each ship is given
+    hints = ["".join(c if c in "<S" else "0" for c in row) for row in board]
+
+    text = format_puzzle(rows, cols, fleet, hints)
+    lines = text.splitlines()
+    assert lines[0].split()[:3] == ["18", "0", "11"]
+    assert lines[2] == "36 3 7 7 4 4 4"
+    assert read_puzzle(text) == (rows, cols, fleet, hints)
+
+    csp, size = build_csp(*read_puzzle(text))
+    assert size == n
+    assert count_solutions(csp, 2) == 1
+    for algorithm in ["GAC", "SAT"]:
+        status, output = solve(text, algorithm)
+        assert verify(text, output) == []
+        assert output.split() == board
+
+
+def random_puzzles(seed, count):
+    """
+    Small random puzzles, as texts, with a few hints of their hidden board
+    """
+    rng = random.Random(seed)
+    puzzles = []
+    for k in range(count):
+        # the fleets fit on any of these boards; make_puzzle takes seconds
+        # to give up on one that does not
+        n = rng.choice([5, 6, 7])
+        fleet = [rng.randint(1, 3), rng.randint(0, 2), rng.randint(0, 1)]
+        puzzles.append(make_puzzle(n, fleet, rng.randint(0, 3), rng.randrange(2 ** 32)))
+    return puzzles
+
+
+@pytest.mark.parametrize("text", random_puzzles(2, 20))
+def test_count_solutions(text):
+    csp, size = build_csp(*read_puzzle(text))
+    result = bt_search('GAC', csp, 'mrv', True, False)
+    total = len(result.solutions)
+    # the puzzle was made from a board, so it has a solution
+    assert total >= 1
+    assert count_solutions(csp, cache=True) == total
+    assert count_solutions(csp, cache=False) == total
+    assert count_solutions(csp, limit=2, cache=True) == min(total, 2)
+    assert count_solutions(csp, limit=2, cache=False) == min(total, 2)
+
+
+@pytest.mark.parametrize("name, count, unique", [
+    ("easy1", "1", "unique"), ("", "0", "none")])
+def test_count_command_line(name, count, unique):
+    path, text = read(name)
+    for flag, expected, status in [(["--count", "0"], count, 0),
+                                   (["--unique"], unique, 0 if unique == "unique" else 1)]:
+        process = subprocess.run([sys.executable, "battle.py", "--inputfile", path] + flag,
+                                 cwd=ROOT, capture_output=True, text=True)
+        assert (process.stdout.strip(), process.returncode) == (expected, status)
+
+
+@pytest.mark.parametrize("text", random_puzzles(1, 20))
+def test_algorithms_agree(text):
+    # every solution of the puzzle, found by each algorithm
+    boards = {}
+    for algorithm in ["GAC", "FC", "SAT"]:
+        csp, size = build_csp(*read_puzzle(text))
+        output = render_solutions(bt_search(algorithm, csp, 'mrv', True, False).solutions, size)
+        assert verify(text, output) == []
+        rows = output.split()
+        boards[algorithm] = sorted(tuple(rows[k:k + size]) for k in range(0, len(rows), size))
+    assert boards["GAC"] == boards["FC"] == boards["SAT"]
+    assert boards["GAC"]
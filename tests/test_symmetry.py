@@ -0,0 +1,77 @@
+"""
+The symmetries of puzzles, their inverses and the canonical form
+"""
+import pytest
+
+from battle import read_puzzle, format_puzzle, build_csp, render_solutions
+from backtracking import bt_search
+from symmetry import (SYMMETRIES, transform_grid, transform_puzzle, inverse,
+                      canonical, transform_boards)
+
+from test_cache import battle, cache_stats
+from test_solver import read
+
+BOARD = ["<>....",
+         "....S.",
+         ".^....",
+         ".M...S",
+         ".v.^..",
+         "...v.S"]
+
+
+def solve(puzzle):
+    csp, size = build_csp(*puzzle)
+    return render_solutions(bt_search('GAC', csp, 'mrv', False, False).solutions, size)
+
+
+@pytest.mark.parametrize("symmetry", SYMMETRIES)
+def test_inverse(symmetry):
+    assert transform_grid(transform_grid(BOARD, symmetry), inverse(symmetry)) == BOARD
+    puzzle = read_puzzle(read("medium1")[1])
+    back = transform_puzzle(*transform_puzzle(*puzzle, symmetry), inverse(symmetry))
+    assert back == tuple(puzzle)
+
+
+def test_ship_symbols():
+    # a transposed horizontal ship is vertical, a mirrored one reversed
+    assert transform_grid(["<>", ".."], (True, False, False)) == ["^.", "v."]
+    assert transform_grid(["<M>", "...", "..."], (False, False, True)) == ["<M>", "...", "..."]
+    assert transform_grid(["^..", "v..", "..."], (False, True, False)) == ["...", "^..", "v.."]
+
+
+def test_canonical():
+    puzzle = read_puzzle(read("medium1")[1])
+    forms = set()
+    for symmetry in SYMMETRIES:
+        variant = transform_puzzle(*puzzle, symmetry)
+        form, to_canonical = canonical(*variant)
+        assert transform_puzzle(*variant, to_canonical) == form
+        forms.add(repr(form))
+    # all 8 variants share one canonical form
+    assert len(forms) == 1
+
+
+@pytest.mark.parametrize("name", ["easy1", "medium1"])
+def test_solution_maps_back(name):
+    # the cache stores the solution of the canonical puzzle and maps it back
+    puzzle = read_puzzle(read(name)[1])
+    size = len(puzzle[0])
+    form, symmetry = canonical(*puzzle)
+    mapped = transform_boards(solve(form), size, inverse(symmetry))
+    assert mapped.split() == solve(puzzle).split()
+
+
+def test_cache_shared(tmp_path):
+    # every variant is answered from the entry of the first one solved
+    path, text = read("medium1")
+    puzzle = read_puzzle(text)
+    size = len(puzzle[0])
+    database = str(tmp_path / "cache.sqlite3")
+    solution = battle(path, "--cache", database)
+    for k, symmetry in enumerate(SYMMETRIES):
+        variant = tmp_path / "variant{}.txt".format(k)
+        variant.write_text(format_puzzle(*transform_puzzle(*puzzle, symmetry)))
+        assert battle(str(variant), "--cache", database).split() == \
+            transform_boards(solution, size, symmetry).split()
+    stats = cache_stats(database)
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, len(SYMMETRIES), 1)
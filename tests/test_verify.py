@@ -0,0 +1,63 @@
+"""
+The standalone checker of solved boards
+"""
+import subprocess
+import sys
+
+import pytest
+
+from benchmark import expected_output
+from verify import verify
+
+from conftest import ROOT
+from test_solver import read, FAST
+
+
+def golden(path):
+    with open(expected_output(path)) as file:
+        return file.read().split()
+
+
+@pytest.mark.parametrize("name", FAST)
+def test_corpus(name):
+    path, text = read(name)
+    assert verify(text, "\n".join(golden(path))) == []
+
+
+def test_rejects():
+    path, text = read("easy1")
+    rows = golden(path)
+    assert rows[:2] == ["<>....", "....S."]
+    # the submarine of the second row moved next to the destroyer
+    moved = ["<>S...", "......"] + rows[2:]
+    errors = verify(text, "\n".join(moved))
+    assert "the ships at (0, 1) and (0, 2) touch" in errors
+    assert "row 0 has 3 ship parts, not 2" in errors
+    assert "column 2 has 1 ship parts, not 0" in errors
+    # the fleet is the same
+    assert not any("ships of length" in error for error in errors)
+    # a destroyer without its right end
+    broken = ["<.....", "....S."] + rows[2:]
+    assert "ship starting at (0, 0) does not end with '>'" in verify(text, "\n".join(broken))
+    assert verify(text, "") == ["no board"]
+    assert verify(text, "\n".join(rows[:5])) == ["5 rows is not a number of 6x6 boards"]
+
+
+def test_several_boards():
+    path, text = read("easy1")
+    rows = golden(path)
+    moved = ["<>S...", "......"] + rows[2:]
+    errors = verify(text, "\n".join(rows + moved))
+    assert errors and all(error.startswith("board 1: ") for error in errors)
+
+
+def test_command_line():
+    path, text = read("easy1")
+    good = subprocess.run([sys.executable, "verify.py", path, expected_output(path)],
+                          cwd=ROOT, capture_output=True, text=True)
+    assert good.returncode == 0 and good.stdout.strip().endswith(": ok")
+    # the golden output of input.txt does not match its hints
+    path, text = read("")
+    bad = subprocess.run([sys.executable, "verify.py", path, expected_output(path)],
+                         cwd=ROOT, capture_output=True, text=True)
+    assert bad.returncode == 1 and "the hint is" in bad.stdout
@@ -0,0 +1,97 @@
+"""
+The output formats of writer.py, read back to the text boards
+"""
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from battle import render_partial
+from writer import BoardWriter, read_binary, record_size, HEADER
+
+from conftest import ROOT
+from test_solver import read
+
+OUTPUTS = sorted(glob.glob(os.path.join(ROOT, "outputs", "solution*.txt")))
+
+# 25 cells, the last byte of a board holds a single cell
+SMALL = "<>..S\n.....\n^.<M>\nv....\n..S..\n"
+
+# a partial board: 'X' is a ship part whose shape is not known yet
+PARTIAL = "<X?\n...\n.S.\n"
+
+
+def write(text, format, partial=False):
+    size = len(text.split()[0])
+    stream = io.BytesIO()
+    with BoardWriter(stream, format, size, close=False) as out:
+        out.write(text, partial)
+    return stream.getvalue()
+
+
+def read_back(data, format):
+    """
+    The text of the boards written in format
+    """
+    if format == 'text':
+        return data.decode("ascii")
+    if format == 'json':
+        records = [json.loads(line) for line in data.decode("ascii").splitlines()]
+        return "".join(row + "\n" for record in records for row in record["board"])
+    size, boards = read_binary(data)
+    return "".join(render_partial(values, size) for values in boards)
+
+
+@pytest.mark.parametrize("format", ["text", "json", "binary"])
+@pytest.mark.parametrize("path", OUTPUTS, ids=os.path.basename)
+def test_corpus(path, format):
+    with open(path) as file:
+        text = file.read()
+    assert read_back(write(text, format), format).split() == text.split()
+
+
+@pytest.mark.parametrize("format", ["json", "binary"])
+def test_odd_size(format):
+    data = write(SMALL, format)
+    assert read_back(data, format) == SMALL
+    if format == 'binary':
+        assert len(data) == HEADER.size + record_size(5) == HEADER.size + 7
+
+
+@pytest.mark.parametrize("format", ["json", "binary"])
+def test_several_boards(format):
+    # the boards of an all-solutions run, one after the other
+    text = SMALL + SMALL.replace("S", ".", 1)
+    data = write(text, format)
+    assert read_back(data, format) == text
+    if format == 'binary':
+        assert len(read_binary(data)[1]) == 2
+
+
+def test_partial():
+    assert read_back(write(PARTIAL, 'binary', True), 'binary') == PARTIAL
+    record = json.loads(write(PARTIAL, 'json', True))
+    assert record == {"board": ["<X?", "...", ".S."], "partial": True}
+
+
+def test_not_binary():
+    with pytest.raises(ValueError):
+        read_binary(b"BSB\x02" + bytes(4))
+
+
+@pytest.mark.parametrize("format", ["json", "binary"])
+def test_command_line(tmp_path, format):
+    path, text = read("medium1")
+
+    def battle(output, *flags):
+        subprocess.run([sys.executable, "battle.py", "--inputfile", path, "--outputfile",
+                        str(output), "--no-cache"] + list(flags), cwd=ROOT, check=True)
+        return output.read_bytes()
+
+    solved = battle(tmp_path / "solution.txt").decode("ascii")
+    data = battle(tmp_path / "solution.out", "--format", format)
+    assert read_back(data, format) == solved
@@ -0,0 +1,187 @@
+"""
+Standalone checker of solved boards
+
+Checks a board in the format battle.py writes (outputs/solution_*.txt, a
+line per row) against its puzzle directly, without building the CSP: the
+row and column counts, the hints, the shape of each ship (S alone, < M..M >
+across, ^ M..M v down), that no two ships touch, diagonals included, and
+the number of ships of each length. One pass over the board finds the
+ships and one over their cells checks what touches them, so a board of n
+rows is checked in O(n^2).
+
+python3 verify.py inputs/input_easy1.txt outputs/solution_easy1.txt
+python3 verify.py --list pairs.txt      # a puzzle and a solution per line
+"""
+from battle import read_puzzle
+import argparse
+import sys
+
+SHIP_PARTS = set("S<>^vM")
+
+
+def ships(board, n):
+    """
+    Find the ships of a board, a string of n * n symbols row by row
+    Return the ship each cell belongs to (-1 for water), the length of
+    each ship and the errors found in the shapes
+    """
+    owner = [-1] * (n * n)
+    lengths = []
+    errors = []
+    for k, symbol in enumerate(board):
+        if symbol == '.' or owner[k] != -1:
+            continue
+        i, j = divmod(k, n)
+        if symbol == 'S':
+            cells = [k]
+        elif symbol == '<' or symbol == '^':
+            # walk to the other end of the ship over its middle parts
+            step, end = (1, '>') if symbol == '<' else (n, 'v')
+            cells = [k]
+            last = k
+            # stop at the edge of the board
+            while not ((step == 1 and (last + 1) % n == 0) or last + step >= n * n):
+                last += step
+                if board[last] == 'M':
+                    cells.append(last)
+                    continue
+                if board[last] == end:
+                    cells.append(last)
+                break
+            if board[cells[-1]] != end:
+                errors.append("ship starting at ({}, {}) does not end with {!r}".format(i, j, end))
+        else:
+            errors.append("{!r} at ({}, {}) is not part of a ship starting above or "
+                          "to its left".format(symbol, i, j))
+            cells = [k]
+        for cell in cells:
+            if owner[cell] != -1:
+                errors.append("ships overlap at ({}, {})".format(*divmod(cell, n)))
+            owner[cell] = len(lengths)
+        lengths.append(len(cells))
+    return owner, lengths, errors
+
+
+def verify_board(row_constraint, col_constraint, ship_count, hints, rows):
+    """
+    Check a solved board against its puzzle
+    rows: the rows of the board, as battle.py writes them
+    Return the list of the errors found, empty if the board is a solution
+    """
+    n = len(row_constraint)
+    if len(rows) != n or any(len(row) != n for row in rows):
+        return ["the board is not {0}x{0}".format(n)]
+    board = "".join(rows)
+    unknown = set(board) - SHIP_PARTS - {'.'}
+    if unknown:
+        return ["unknown symbols {}".format("".join(sorted(unknown)))]
+    errors = []
+
+    for i in range(n):
+        count = n - rows[i].count('.')
+        if count != row_constraint[i]:
+            errors.append("row {} has {} ship parts, not {}".format(i, count, row_constraint[i]))
+    for j in range(n):
+        count = n - board[j::n].count('.')
+        if count != col_constraint[j]:
+            errors.append("column {} has {} ship parts, not {}".format(j, count, col_constraint[j]))
+    for i in range(n):
+        if hints[i] == '0' * n:
+            continue
+        for j, hint in enumerate(hints[i]):
+            if hint != '0' and hint != rows[i][j]:
+                errors.append("cell ({}, {}) is {!r}, the hint is {!r}".format(
+                    i, j, rows[i][j], hint))
+
+    owner, lengths, shape_errors = ships(board, n)
+    errors.extend(shape_errors)
+    # each ship part only touches parts of its own ship
+    for k, ship in enumerate(owner):
+        if ship == -1:
+            continue
+        i, j = divmod(k, n)
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                if 0 <= i + di < n and 0 <= j + dj < n:
+                    other = owner[k + di * n + dj]
+                    # the pairs of ships are reported once, from the first
+                    if other != -1 and other > ship:
+                        errors.append("the ships at ({}, {}) and ({}, {}) touch".format(
+                            i, j, i + di, j + dj))
+
+    fleet = [0] * max(len(ship_count), max(lengths, default=0))
+    for length in lengths:
+        fleet[length - 1] += 1
+    expected = list(ship_count) + [0] * (len(fleet) - len(ship_count))
+    for length, (count, wanted) in enumerate(zip(fleet, expected), 1):
+        if count != wanted:
+            errors.append("{} ships of length {}, not {}".format(count, length, wanted))
+    return errors
+
+
+def verify(puzzle_text, solution_text):
+    """
+    Check the boards of a solution file against the puzzle, in the
+    formats battle.py reads and writes. A file with several boards (all
+    the solutions of the puzzle) has every board checked
+    Return the list of the errors found, empty if every board is a
+    solution
+    """
+    puzzle = read_puzzle(puzzle_text)
+    n = len(puzzle[0])
+    rows = solution_text.split()
+    if not rows:
+        return ["no board"]
+    if len(rows) % n:
+        return ["{} rows is not a number of {}x{} boards".format(len(rows), n, n)]
+    errors = []
+    for k in range(0, len(rows), n):
+        prefix = "board {}: ".format(k // n) if len(rows) > n else ""
+        errors.extend(prefix + error for error in verify_board(*puzzle, rows[k:k + n]))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check solved boards against their puzzles.")
+    parser.add_argument("files", nargs="*",
+                        help="Pairs of a puzzle file and its solution file.")
+    parser.add_argument("--list", type=str, default=None,
+                        help="A file with a puzzle file and its solution file on "
+                             "each line, - for stdin.")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Only print the pairs that fail.")
+    args = parser.parse_args()
+    if len(args.files) % 2:
+        parser.error("the files must come in pairs of a puzzle and a solution")
+    pairs = list(zip(args.files[::2], args.files[1::2]))
+    if args.list:
+        lines = sys.stdin if args.list == '-' else open(args.list)
+        pairs.extend(tuple(line.split()) for line in lines if line.strip())
+        if lines is not sys.stdin:
+            lines.close()
+    if not pairs:
+        parser.error("no puzzle and solution to check")
+
+    failed = 0
+    for pair in pairs:
+        if len(pair) != 2:
+            parser.error("expected a puzzle and a solution, got {!r}".format(" ".join(pair)))
+        puzzle_path, solution_path = pair
+        try:
+            with open(puzzle_path) as puzzle, open(solution_path) as solution:
+                errors = verify(puzzle.read(), solution.read())
+        except (OSError, ValueError) as error:
+            errors = [str(error)]
+        if errors:
+            failed += 1
+            print("{}: {}".format(solution_path, "; ".join(errors)))
+        elif not args.quiet:
+            print("{}: ok".format(solution_path))
+    if len(pairs) > 1:
+        print("{} of {} solutions failed".format(failed, len(pairs)), file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Output formats of solved boards
+
+Boards are written through one buffered binary handle, a file or stdout,
+each board in a single write:
+
+- text: the board as battle.py renders it, a line per row
+- json: one JSON object per line, {"board": [rows], "partial": bool}
+- binary: a header (MAGIC, then the size of the boards as a 16 bit
+  integer) followed by the boards, 2 bits per cell, 4 cells per byte, row
+  by row: 0 water, 1 ship part, 2 unknown. The symbols of the ship parts
+  follow from the cells around them and are not stored
+"""
+import json
+import struct
+import sys
+
+FORMATS = ['text', 'json', 'binary']
+
+# start of a binary file of boards, the last byte is the version
+MAGIC = b"BSB\x01"
+HEADER = struct.Struct("<4sH")
+
+# code of each symbol of a rendered board in the binary format
+CODES = bytes.maketrans(b".?SX<>^vM", b"\x00\x02\x01\x01\x01\x01\x01\x01\x01")
+
+
+def record_size(size):
+    """
+    The number of bytes of a board in the binary format
+    """
+    return (size * size + 3) // 4
+
+
+def pack_board(rows):
+    """
+    Pack the rows of a rendered board into the binary format
+    """
+    codes = "".join(rows).encode("ascii").translate(CODES)
+    codes += bytes(-len(codes) % 4)
+    return bytes(codes[k] | codes[k + 1] << 2 | codes[k + 2] << 4 | codes[k + 3] << 6
+                 for k in range(0, len(codes), 4))
+
+
+def unpack_board(data, size):
+    """
+    The values of the cells of a board packed in the binary format, None
+    for the unknown ones
+    """
+    values = []
+    for byte in data:
+        for shift in (0, 2, 4, 6):
+            code = byte >> shift & 3
+            values.append(None if code == 2 else code)
+    return values[:size * size]
+
+
+class BoardWriter:
+    """
+    Write boards in one of FORMATS to a binary stream. Use as a context
+    manager, or call close, so the buffer is flushed
+    """
+
+    def __init__(self, stream, format='text', size=None, close=True):
+        """
+        stream: a binary file object, opened with a large buffer
+        size: the size of the boards, needed by the binary format
+        close: whether closing the writer closes the stream
+        """
+        if format not in FORMATS:
+            raise ValueError("unknown output format {!r}".format(format))
+        if format == 'binary' and size is None:
+            raise ValueError("the binary format needs the size of the boards")
+        self.stream = stream
+        self.format = format
+        self.size = size
+        self.close_stream = close
+        if format == 'binary':
+            self.stream.write(HEADER.pack(MAGIC, size))
+
+    def write(self, text, partial=False):
+        """
+        Write the boards of text, rendered as battle.py renders them, one
+        board after the other
+        partial: the boards are partially solved (see render_partial)
+        """
+        if self.format == 'text':
+            self.stream.write(text.encode("ascii"))
+            return
+        rows = text.split()
+        size = self.size or (len(rows[0]) if rows else 1)
+        for k in range(0, len(rows), size):
+            board = rows[k:k + size]
+            if self.format == 'json':
+                self.stream.write((json.dumps({"board": board, "partial": partial},
+                                              separators=(",", ":")) + "\n").encode("ascii"))
+            else:
+                self.stream.write(pack_board(board))
+
+    def close(self):
+        if self.close_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(path, format='text', size=None, buffering=1 << 16):
+    """
+    A BoardWriter to the file at path, or to stdout if path is '-'
+    """
+    if path == '-':
+        return BoardWriter(sys.stdout.buffer, format, size, close=False)
+    return BoardWriter(open(path, 'wb', buffering=buffering), format, size)
+
+
+def read_binary(data):
+    """
+    The size and the values of the cells of each board of a file in the
+    binary format (see unpack_board)
+    """
+    magic, size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a binary file of boards")
+    step = record_size(size)
+    return size, [unpack_board(data[k:k + step], size)
+                  for k in range(HEADER.size, len(data), step)]